@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, Column, ForeignKey, String
+from sqlalchemy import BigInteger, Column, ForeignKey, Index, String
 from sqlalchemy.orm import relationship
 
 from app.apis.utils.models import CommonModel
@@ -6,6 +6,15 @@ from app.apis.utils.models import CommonModel
 
 class Collection(CommonModel):
     __tablename__ = "collections"
+    __search_columns__ = ("name",)
+    __table_args__ = (
+        Index(
+            "ft_collections_search",
+            *__search_columns__,
+            mysql_prefix="FULLTEXT",
+            mysql_with_parser="ngram",
+        ).ddl_if(dialect="mysql"),
+    )
 
     name = Column(String(50), unique=True, nullable=False)
     collection_image_id = Column(BigInteger(), ForeignKey("document_master.id"))
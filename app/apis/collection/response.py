@@ -4,3 +4,4 @@ from app.apis.utils.response import BaseResponse
 class GetCollectionRespose(BaseResponse):
     name: str
     collection_image: str | None
+    thumbnail_url: str | None
@@ -1,13 +1,22 @@
-from fastapi import APIRouter, Depends, Form, Query, UploadFile, status
-from sqlalchemy.orm import Session
+from fastapi import (
+    APIRouter,
+    Depends,
+    Form,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.apis.collection.response import GetCollectionRespose
 from app.apis.collection.schema import CollectionFilters, CollectionSortEnum
 from app.apis.collection.service import CollectionService
-from app.apis.user.models import User
 from app.apis.user.schema import RoleEnum
-from app.config.database import get_session
-from app.config.security import get_current_user
+from app.apis.utils.schema import BatchRequest, BatchStatusRequest
+from app.config.database import get_async_session
+from app.config.security import Principal, get_current_principal
 from app.utils.utility import has_role
 
 collection_router = APIRouter(prefix="/collections", tags=["Collections"])
@@ -18,10 +27,10 @@ collection_router = APIRouter(prefix="/collections", tags=["Collections"])
     status_code=status.HTTP_201_CREATED,
     dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
 )
-def create_collection(
+async def create_collection(
     name: str = Form(...),
     collection_image: UploadFile | None = None,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Create a new collection endpoint
 
@@ -29,7 +38,7 @@ def create_collection(
         tuple[dict,int]: A dict with msg and a status_code
     """
 
-    return CollectionService.create_collection(name, collection_image, session)
+    return await CollectionService.create_collection(name, collection_image, session)
 
 
 @collection_router.patch(
@@ -37,11 +46,11 @@ def create_collection(
     status_code=status.HTTP_202_ACCEPTED,
     dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
 )
-def update_collection(
+async def update_collection(
     collection_uuid: str,
     name: str | None = Form(None),
     collection_image: UploadFile | None = None,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Update a collection endpoint
 
@@ -49,7 +58,7 @@ def update_collection(
         tuple[dict,int]: A dict with msg and a status_code
     """
 
-    return CollectionService.update_collection(
+    return await CollectionService.update_collection(
         collection_uuid, name, collection_image, session
     )
 
@@ -59,10 +68,12 @@ def update_collection(
     status_code=status.HTTP_200_OK,
     response_model=GetCollectionRespose,
 )
-def get_collection_by_uuid(
+async def get_collection_by_uuid(
     collection_uuid: str,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Get collection by UUID endpoint
 
@@ -70,29 +81,36 @@ def get_collection_by_uuid(
         tuple[dict,int]: A dict with collection data and a status_code
     """
 
-    return CollectionService.get_collection_by_uuid(
-        collection_uuid, current_user, session
+    return await CollectionService.get_collection_by_uuid(
+        collection_uuid, current_user, session, request, response
     )
 
 
 @collection_router.get(
     "/", status_code=status.HTTP_200_OK, response_model=list[GetCollectionRespose]
 )
-def list_collections(
+async def list_collections(
+    response: Response,
+    request: Request,
     filters: CollectionFilters = Depends(),
     sort_by: list[CollectionSortEnum] = Query(
-        default=CollectionSortEnum.desc_created_at
+        default=[CollectionSortEnum.desc_created_at]
     ),
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    current_user: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """List collections endpoint
 
+    Pass the X-Next-Cursor response header back as `cursor` to fetch the
+    next page with keyset pagination instead of `page`.
+
     Returns:
         tuple[dict,int]: A dict with collections data and a status_code
     """
 
-    return CollectionService.list_collections(filters, sort_by, current_user, session)
+    return await CollectionService.list_collections(
+        filters, sort_by, current_user, session, response, request
+    )
 
 
 @collection_router.get(
@@ -100,9 +118,9 @@ def list_collections(
     status_code=status.HTTP_200_OK,
     dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
 )
-def change_collection_status(
+async def change_collection_status(
     collection_uuid: str,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Change collection status endpoint
 
@@ -110,7 +128,7 @@ def change_collection_status(
         tuple[dict,int]: A dict with change status message and a status_code
     """
 
-    return CollectionService.change_collection_status(collection_uuid, session)
+    return await CollectionService.change_collection_status(collection_uuid, session)
 
 
 @collection_router.delete(
@@ -118,9 +136,9 @@ def change_collection_status(
     status_code=status.HTTP_200_OK,
     dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
 )
-def delete_collection(
+async def delete_collection(
     collection_uuid: str,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Change collection status endpoint
 
@@ -128,22 +146,96 @@ def delete_collection(
         tuple[dict,int]: A dict with delete message and a status_code
     """
 
-    return CollectionService.delete_collection(collection_uuid, session)
+    return await CollectionService.delete_collection(collection_uuid, session)
+
+
+@collection_router.patch(
+    "/batch/change-status",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
+)
+async def change_collections_status(
+    data: BatchStatusRequest,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Activate or deactivate collections in bulk endpoint
+
+    The collections are picked by their uuids, or by a filter.
+
+    Returns:
+        tuple[dict,int]: A dict with the counts and the uuids not found, and a status_code
+    """
+
+    return await CollectionService.change_collections_status(data, session)
+
+
+@collection_router.post(
+    "/batch/delete",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
+)
+async def delete_collections(
+    data: BatchRequest,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Delete collections in bulk endpoint
+
+    The collections are picked by their uuids, or by a filter.
+
+    Returns:
+        tuple[dict,int]: A dict with the counts and the uuids not found, and a status_code
+    """
+
+    return await CollectionService.delete_collections(data, session)
 
 
 @collection_router.get(
     "/export",
-    status_code=status.HTTP_200_OK,
+    status_code=status.HTTP_202_ACCEPTED,
     dependencies=[Depends(has_role([RoleEnum.ADMIN, RoleEnum.STAFF]))],
 )
-def export_collection_into_pdf(
+async def export_collection_into_pdf(
     collection_uuid: str = Query(default=None),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
-    """Change collection status endpoint
+    """Export one or all collections into a PDF endpoint
+
+    The PDF is sent right away when nothing changed since it was last
+    rendered. Otherwise a render job is queued, identical exports that are
+    still rendering share the same job.
 
     Returns:
-        tuple[dict,int]: A dict with change status message and a status_code
+        tuple[dict,int]: A dict with the job_id and status, and a status_code
+    """
+
+    return await CollectionService.export_collection_into_pdf(collection_uuid, session)
+
+
+@collection_router.get(
+    "/export/job_id",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(has_role([RoleEnum.ADMIN, RoleEnum.STAFF]))],
+)
+async def get_export_job(job_id: str):
+    """Get the status of a PDF export job endpoint
+
+    Returns:
+        tuple[dict,int]: A dict with the job status and a status_code
+    """
+
+    return await CollectionService.get_export_job(job_id)
+
+
+@collection_router.get(
+    "/export/job_id/download",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(has_role([RoleEnum.ADMIN, RoleEnum.STAFF]))],
+)
+async def download_export(job_id: str):
+    """Download the PDF of a finished export job endpoint
+
+    Returns:
+        FileResponse: The PDF, or a 409 while the job is still rendering
     """
 
-    return CollectionService.export_collection_into_pdf(collection_uuid, session)
+    return await CollectionService.download_export(job_id)
@@ -16,3 +16,4 @@ class CollectionFilters(BaseRequest):
     search_by: str | None = None
     page: int = Field(default=1, ge=1)
     per_page: int = Field(default=10, ge=1)
+    cursor: str | None = None
@@ -1,35 +1,64 @@
-from io import BytesIO
+import hashlib
+import os
+from pathlib import Path
 
-from fastapi import HTTPException, UploadFile, status
-from fastapi.responses import StreamingResponse
-from jinja2 import Environment, FileSystemLoader
-from sqlalchemy import asc, desc, exists
-from sqlalchemy.orm import Query, Session
-from weasyprint import HTML
+from fastapi import HTTPException, Request, Response, UploadFile, status
+from fastapi.responses import FileResponse
+from sqlalchemy import Select, exists, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.apis.collection.models import Collection
 from app.apis.collection.schema import CollectionFilters, CollectionSortEnum
-from app.apis.user.models import User
-from app.apis.user.schema import RoleEnum
+from app.apis.hanger.models import Hanger
 from app.apis.utils.models import DocumentMaster
+from app.apis.utils.schema import BatchRequest, BatchStatusRequest
 from app.config.logger_config import logger
-from app.utils.utility import save_file
+from app.config.security import Principal
+from app.config.templates import templates
+from app.utils.artifacts import (
+    pdf_artifacts,
+    pdf_images,
+    pdf_merge_seconds,
+    pdf_render_seconds,
+)
+from app.utils.batch import batch_update
+from app.utils.conditional import (
+    conditional_response,
+    get_validators,
+    with_modified_at,
+)
+from app.utils.derivatives import outerjoin_rendition
+from app.utils.jobs import Job, JobStatus, export_queue
+from app.utils.pagination import get_next_cursor, get_sort_keys, paginate
+from app.utils.pdf import (
+    PRINT_IMAGE_SIZE,
+    PRINT_IMAGE_VERSION,
+    merge_pdfs,
+    render_pdf,
+    scale_image,
+)
+from app.utils.response_cache import request_signature, response_cache
+from app.utils.search import apply_search, discard_from_search_index
+from app.utils.storage import release_document
+from app.utils.utility import save_file, uuid_id_cache
 
 
 class CollectionService:
     @staticmethod
-    def create_collection(
+    async def create_collection(
         name: str,
         collection_image: UploadFile | None,
-        session: Session,
+        session: AsyncSession,
     ):
         try:
-            collection_exist = session.query(
-                exists().where(
-                    Collection.name == name,
-                    Collection.is_delete == False,
+            collection_exist = await session.scalar(
+                select(
+                    exists().where(
+                        Collection.name == name,
+                        Collection.is_delete == False,
+                    )
                 )
-            ).scalar()
+            )
             if collection_exist:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -38,19 +67,17 @@ class CollectionService:
 
             collection = Collection(name=name)
             session.add(collection)
-            session.flush()
+            await session.flush()
 
             document_id = None
             if collection_image:
-                document_id = save_file(
+                document_id = await save_file(
                     collection_image,
-                    folder_name=f"collections/{collection.id}",
                     entity_type="COLLECTION-IMAGE",
                     session=session,
                 )
                 collection.collection_image_id = document_id
-            session.commit()
-            session.refresh(collection, attribute_names=["uuid"])
+            await session.commit()
             return {
                 "message": "Collection Created Successfully",
                 "collection_uuid": collection.uuid,
@@ -67,19 +94,17 @@ class CollectionService:
             )
 
     @staticmethod
-    def update_collection(
+    async def update_collection(
         collection_uuid: str,
         name: str | None,
         collection_image: UploadFile | None,
-        session: Session,
+        session: AsyncSession,
     ):
         try:
-            collection = (
-                session.query(Collection.id, Collection.name)
-                .filter(
+            collection = await session.scalar(
+                select(Collection).filter(
                     Collection.uuid == collection_uuid, Collection.is_delete == False
                 )
-                .first()
             )
             if not collection:
                 raise HTTPException(
@@ -91,14 +116,14 @@ class CollectionService:
 
             document_id = None
             if collection_image:
-                document_id = save_file(
+                document_id = await save_file(
                     collection_image,
-                    folder_name=f"collections/{collection.id}",
                     entity_type="COLLECTION-IMAGE",
                     session=session,
                 )
+                await release_document(collection.collection_image_id, session)
                 collection.collection_image_id = document_id
-            session.commit()
+            await session.commit()
             return {
                 "message": "Collection Updated Successfully",
                 "collection_uuid": collection_uuid,
@@ -115,15 +140,24 @@ class CollectionService:
             )
 
     @staticmethod
-    def get_collection_by_uuid(
+    async def get_collection_by_uuid(
         collection_uuid: str,
-        current_user: User,
-        session: Session,
+        current_user: Principal,
+        session: AsyncSession,
+        request: Request,
+        response: Response,
     ):
         try:
-            is_admin = any(role.name == RoleEnum.ADMIN for role in current_user.roles)
+            signature = request_signature(
+                "collections:detail", current_user, uuid=collection_uuid
+            )
+            cache_key = response_cache.key(signature, (Collection, DocumentMaster))
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                return conditional_response(request, response, **cached)
+
             query = (
-                session.query(
+                select(
                     Collection.uuid,
                     Collection.name,
                     DocumentMaster.file_path.label("collection_image"),
@@ -138,17 +172,25 @@ class CollectionService:
                 )
             )
 
-            if not is_admin:
+            if not current_user.is_admin:
                 query = query.filter(Collection.is_active == True)
 
-            collection = query.first()
+            query = with_modified_at(query, Collection, DocumentMaster)
+            query = outerjoin_rendition(query, Collection.collection_image_id)
+            collection = (await session.execute(query)).first()
             if not collection:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Collection not found",
                 )
 
-            return collection
+            etag, last_modified = get_validators(collection, signature)
+            response_cache.set(
+                cache_key, collection, etag=etag, last_modified=last_modified
+            )
+            return conditional_response(
+                request, response, collection, etag, last_modified
+            )
 
         except HTTPException as http_exc:
             raise http_exc
@@ -161,15 +203,25 @@ class CollectionService:
             )
 
     @staticmethod
-    def list_collections(
+    async def list_collections(
         filters: CollectionFilters,
         sort_by: list[CollectionSortEnum],
-        current_user: User,
-        session: Session,
+        current_user: Principal,
+        session: AsyncSession,
+        response: Response,
+        request: Request,
     ):
         try:
+            signature = request_signature(
+                "collections:list", current_user, filters=filters, sort_by=sort_by
+            )
+            cache_key = response_cache.key(signature, (Collection, DocumentMaster))
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                return conditional_response(request, response, **cached)
+
             query = (
-                session.query(
+                select(
                     Collection.uuid,
                     Collection.name,
                     DocumentMaster.file_path.label("collection_image"),
@@ -182,11 +234,19 @@ class CollectionService:
                 )
             )
 
-            query = CollectionService.query_criteria(
+            query = with_modified_at(query, Collection, DocumentMaster)
+            query = outerjoin_rendition(query, Collection.collection_image_id)
+
+            query, sort_keys = await CollectionService.query_criteria(
                 query, current_user, filters, sort_by
             )
-            collections = query.all()
-            return collections
+            collections = (await session.execute(query)).all()
+            next_cursor = get_next_cursor(collections, sort_keys, filters.per_page)
+            etag, last_modified = get_validators(collections, signature)
+            response_cache.set(cache_key, collections, next_cursor, etag, last_modified)
+            return conditional_response(
+                request, response, collections, etag, last_modified, next_cursor
+            )
 
         except HTTPException as http_exc:
             raise http_exc
@@ -199,45 +259,34 @@ class CollectionService:
             )
 
     @staticmethod
-    def query_criteria(
-        query: Query,
-        current_user: User,
+    async def query_criteria(
+        query: Select,
+        current_user: Principal,
         filters: CollectionFilters,
         sort_by: list[CollectionSortEnum],
     ):
-        is_admin = any(role.name == RoleEnum.ADMIN for role in current_user.roles)
-        if not is_admin:
+        if not current_user.is_admin:
             query = query.filter(Collection.is_active == True)
 
+        sort_keys = get_sort_keys(Collection, sort_by)
         if filters.search_by:
-            query = query.filter(Collection.name.ilike(f"%{filters.search_by}%"))
-
-        if sort_by:
-            for sort in sort_by:
-                field_name = sort.value.lstrip("-")
-                try:
-                    field = getattr(Collection, field_name)
-                except AttributeError:
-                    raise ValueError(f"Invalid sort field: {field_name}")
-                if sort.value.startswith("-"):
-                    query = query.order_by(desc(field))
-                else:
-                    query = query.order_by(asc(field))
+            # Best matches first, the requested sort only breaks ties
+            query, relevance = await apply_search(query, Collection, filters.search_by)
+            sort_keys.insert(0, ("relevance", relevance, True))
 
-        offset = (filters.page - 1) * filters.per_page
-        query = query.offset(offset).limit(filters.per_page)
+        query = paginate(
+            query, sort_keys, filters.page, filters.per_page, filters.cursor
+        )
 
-        return query
+        return query, sort_keys
 
     @staticmethod
-    def change_collection_status(collection_uuid: str, session: Session):
+    async def change_collection_status(collection_uuid: str, session: AsyncSession):
         try:
-            collection = (
-                session.query(Collection)
-                .filter(
+            collection = await session.scalar(
+                select(Collection).filter(
                     Collection.uuid == collection_uuid, Collection.is_delete == False
                 )
-                .first()
             )
             if not collection:
                 raise HTTPException(
@@ -245,7 +294,7 @@ class CollectionService:
                 )
             msg = "activated" if not collection.is_active else "deactivated"
             collection.is_active = not collection.is_active
-            session.commit()
+            await session.commit()
 
             return {"message": f"Collection  {msg} successfully"}
 
@@ -260,21 +309,19 @@ class CollectionService:
             )
 
     @staticmethod
-    def delete_collection(collection_uuid: str, session: Session):
+    async def delete_collection(collection_uuid: str, session: AsyncSession):
         try:
-            collection = (
-                session.query(Collection)
-                .filter(
+            collection = await session.scalar(
+                select(Collection).filter(
                     Collection.uuid == collection_uuid, Collection.is_delete == False
                 )
-                .first()
             )
             if not collection:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND, detail="Collection not found"
                 )
             collection.is_delete = True
-            session.commit()
+            await session.commit()
 
             return {"message": "Collection deleted successfully"}
 
@@ -288,36 +335,129 @@ class CollectionService:
                 detail="An unexpected error occurred. Please try again later.",
             )
 
-    def export_collection_into_pdf(collection_uuid: str | None, session: Session):
+    @staticmethod
+    async def change_collections_status(
+        data: BatchStatusRequest, session: AsyncSession
+    ):
         try:
-            query = (
-                session.query(Collection.name, DocumentMaster.actual_path)
-                .outerjoin(
-                    DocumentMaster,
-                    DocumentMaster.id == Collection.collection_image_id,
-                )
-                .filter(Collection.is_delete == False)
+            result, _ = await batch_update(
+                Collection, data, {"is_active": data.is_active}, session
+            )
+            await session.commit()
+            msg = "activated" if data.is_active else "deactivated"
+
+            return {"message": f"Collections {msg} successfully", **result}
+
+        except HTTPException as http_exc:
+            raise http_exc
+
+        except Exception as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="An unexpected error occurred. Please try again later.",
+            )
+
+    @staticmethod
+    async def delete_collections(data: BatchRequest, session: AsyncSession):
+        try:
+            result, rows = await batch_update(
+                Collection, data, {"is_delete": True}, session
+            )
+            discard_from_search_index(session, Collection, [row.id for row in rows])
+            await session.commit()
+            uuid_id_cache.invalidate(Collection, [row.uuid for row in rows])
+
+            return {"message": "Collections deleted successfully", **result}
+
+        except HTTPException as http_exc:
+            raise http_exc
+
+        except Exception as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="An unexpected error occurred. Please try again later.",
+            )
+
+    @staticmethod
+    async def export_collection_into_pdf(
+        collection_uuid: str | None, session: AsyncSession
+    ):
+        try:
+            collections = await CollectionService.get_export_versions(
+                collection_uuid, session
             )
-            if collection_uuid:
-                query = query.filter(Collection.uuid == collection_uuid)
-            collections = query.all()
             if not collections:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND, detail="Collection not found"
                 )
 
-            env = Environment(loader=FileSystemLoader("templates"))
-            template = env.get_template("collection_pdf.html")
-            html_content = template.render(collections=collections)
+            if collection_uuid:
+                key = f"collections:{collection_uuid}"
+                version = collections[0]["version"]
+            else:
+                key = "collections:*"
+                version = hashlib.sha256(
+                    "\n".join(
+                        f"{collection['uuid']}={collection['version']}"
+                        for collection in collections
+                    ).encode()
+                ).hexdigest()
+
+            cached_path = pdf_artifacts.get(key, version)
+            if cached_path:
+                return FileResponse(
+                    cached_path,
+                    media_type="application/pdf",
+                    filename="collections.pdf",
+                )
 
-            pdf_buffer = BytesIO()
-            HTML(string=html_content).write_pdf(pdf_buffer)
-            pdf_buffer.seek(0)
-            return StreamingResponse(
-                pdf_buffer,
-                media_type="application/pdf",
-                headers={"Content-Disposition": "attachment; filename=collections.pdf"},
-            )
+            if collection_uuid:
+                job = CollectionService.queue_collection_pdf(collections[0])
+                return {"message": "Export queued", **job.as_dict()}
+
+            # One WeasyPrint pass per collection keeps the memory of a render
+            # bounded, unchanged collections reuse their cached PDF. Only the
+            # first fragment has the title, each later one starts a new page.
+            # Fragments stay pinned in the cache until the merge has read them
+            fragment_paths, fragment_jobs = [], []
+            try:
+                for position, collection in enumerate(collections):
+                    title = position == 0
+                    path = pdf_artifacts.acquire(
+                        CollectionService.collection_pdf_key(collection, title),
+                        collection["version"],
+                    )
+                    if path is None:
+                        fragment_job = CollectionService.queue_collection_pdf(
+                            collection, title
+                        )
+                        fragment_jobs.append(fragment_job)
+                        path = fragment_job.output_path
+                        pdf_artifacts.pin(path)
+                    fragment_paths.append(path)
+
+                on_done = pdf_artifacts.store_when_done(
+                    key, version, release=fragment_paths
+                )
+                job = export_queue.submit(
+                    f"{key}:{version}",
+                    merge_pdfs,
+                    fragment_paths,
+                    output_path=pdf_artifacts.path_for(key, version),
+                    on_done=on_done,
+                    depends_on=fragment_jobs,
+                    timer=pdf_merge_seconds,
+                )
+            except Exception:
+                # No merge job was queued to release the pins taken so far
+                pdf_artifacts.release(fragment_paths)
+                raise
+            if job.on_done is not on_done:
+                # Joined a merge already queued, which pinned the same fragments
+                pdf_artifacts.release(fragment_paths)
+            return {"message": "Export queued", **job.as_dict()}
 
         except HTTPException as http_exc:
             raise http_exc
@@ -328,3 +468,192 @@ class CollectionService:
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="An unexpected error occurred. Please try again later.",
             )
+
+    @staticmethod
+    def collection_pdf_key(collection: dict, title: bool = True) -> str:
+        if title:
+            return f"collections:{collection['uuid']}"
+        return f"collections-fragment:{collection['uuid']}"
+
+    @staticmethod
+    def queue_collection_pdf(collection: dict, title: bool = True) -> Job:
+        """Render the PDF of a single collection into the artifact cache
+
+        The collection image is first scaled to its printed size, and the
+        scaled copy is cached for later exports. Without title the page has
+        no "Collections Overview" heading, for the fragments a merged export
+        appends after the first.
+        """
+
+        key = CollectionService.collection_pdf_key(collection, title)
+        image_url, image_jobs, image_paths = None, [], []
+        if collection["actual_path"]:
+            image_key = collection["checksum"] or collection["actual_path"]
+            image_path = pdf_images.acquire(image_key, PRINT_IMAGE_VERSION)
+            if image_path is None:
+                image_job = export_queue.submit(
+                    f"pdf-image:{image_key}:{PRINT_IMAGE_VERSION}",
+                    scale_image,
+                    collection["actual_path"],
+                    PRINT_IMAGE_SIZE,
+                    output_path=pdf_images.path_for(image_key, PRINT_IMAGE_VERSION),
+                    on_done=pdf_images.store_when_done(image_key, PRINT_IMAGE_VERSION),
+                )
+                image_jobs.append(image_job)
+                image_path = image_job.output_path
+                pdf_images.pin(image_path)
+            image_paths.append(image_path)
+            image_url = Path(image_path).resolve().as_uri()
+
+        store = pdf_artifacts.store_when_done(key, collection["version"])
+
+        def on_done(job: Job):
+            # The scaled image stays pinned until the render has read it
+            store(job)
+            pdf_images.release(image_paths)
+
+        try:
+            html_content = templates.render(
+                "collection_pdf.html" if title else "collection_pdf_fragment.html",
+                collections=[{"name": collection["name"], "image_url": image_url}],
+            )
+            job = export_queue.submit(
+                f"{key}:{collection['version']}",
+                render_pdf,
+                html_content,
+                output_path=pdf_artifacts.path_for(key, collection["version"]),
+                on_done=on_done,
+                depends_on=image_jobs,
+                timer=pdf_render_seconds,
+            )
+        except Exception:
+            pdf_images.release(image_paths)
+            raise
+        if job.on_done is not on_done:
+            # Joined a render already queued, which pinned the same image
+            pdf_images.release(image_paths)
+        return job
+
+    @staticmethod
+    async def get_export_versions(
+        collection_uuid: str | None, session: AsyncSession
+    ) -> list[dict]:
+        """Collections an export covers, each with its content version
+
+        Every update stamps modified_at, soft deletes included, so the latest
+        modified_at and the row counts of a collection, its hangers and its
+        images change whenever its rendered PDF would. Three queries cover
+        any number of collections.
+
+        Returns:
+            list[dict]: uuid, name, actual_path and version of each collection
+        """
+
+        query = (
+            select(
+                Collection.id,
+                Collection.uuid,
+                Collection.name,
+                Collection.modified_at,
+                DocumentMaster.actual_path,
+                DocumentMaster.checksum,
+            )
+            .outerjoin(
+                DocumentMaster,
+                DocumentMaster.id == Collection.collection_image_id,
+            )
+            .filter(Collection.is_delete == False)
+            .order_by(Collection.id)
+        )
+        if collection_uuid:
+            query = query.filter(Collection.uuid == collection_uuid)
+        collections = (await session.execute(query)).all()
+        if not collections:
+            return []
+
+        collection_ids = [collection.id for collection in collections]
+        hangers = {
+            row.collection_id: row
+            for row in await session.execute(
+                select(
+                    Hanger.collection_id,
+                    func.max(Hanger.modified_at).label("modified_at"),
+                    func.count(Hanger.id).label("count"),
+                )
+                .filter(Hanger.collection_id.in_(collection_ids))
+                .group_by(Hanger.collection_id)
+            )
+        }
+        images = {
+            row.id: row
+            for row in await session.execute(
+                select(
+                    Collection.id,
+                    func.max(DocumentMaster.modified_at).label("modified_at"),
+                    func.count(DocumentMaster.id).label("count"),
+                )
+                .join(
+                    DocumentMaster,
+                    or_(
+                        DocumentMaster.id == Collection.collection_image_id,
+                        DocumentMaster.parent_id == Collection.collection_image_id,
+                    ),
+                )
+                .filter(Collection.id.in_(collection_ids))
+                .group_by(Collection.id)
+            )
+        }
+
+        result = []
+        for collection in collections:
+            parts = [collection.modified_at, PRINT_IMAGE_VERSION]
+            for aggregate in (hangers.get(collection.id), images.get(collection.id)):
+                parts += [aggregate.modified_at, aggregate.count] if aggregate else [0]
+            result.append(
+                {
+                    "uuid": collection.uuid,
+                    "name": collection.name,
+                    "actual_path": collection.actual_path,
+                    "checksum": collection.checksum,
+                    "version": ":".join(str(part) for part in parts),
+                }
+            )
+        return result
+
+    @staticmethod
+    async def get_export_job(job_id: str):
+        job = export_queue.get(job_id)
+        if job is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Export job not found"
+            )
+        return job.as_dict()
+
+    @staticmethod
+    async def download_export(job_id: str):
+        job = export_queue.get(job_id)
+        if job is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Export job not found"
+            )
+        if job.status == JobStatus.failed:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="The export failed, please request it again.",
+            )
+        if job.status != JobStatus.done:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="The export is not ready yet",
+                headers={"Retry-After": "2"},
+            )
+        if not os.path.exists(job.output_path):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="The export has expired, please request it again.",
+            )
+        return FileResponse(
+            job.output_path,
+            media_type="application/pdf",
+            filename="collections.pdf",
+        )
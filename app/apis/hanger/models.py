@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, Column, ForeignKey, Integer, String
+from sqlalchemy import BigInteger, Column, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from app.apis.utils.models import CommonModel
@@ -6,6 +6,21 @@ from app.apis.utils.models import CommonModel
 
 class Hanger(CommonModel):
     __tablename__ = "hangers"
+    __search_columns__ = (
+        "name",
+        "code",
+        "mill_reference_number",
+        "composition",
+        "construction",
+    )
+    __table_args__ = (
+        Index(
+            "ft_hangers_search",
+            *__search_columns__,
+            mysql_prefix="FULLTEXT",
+            mysql_with_parser="ngram",
+        ).ddl_if(dialect="mysql"),
+    )
 
     name = Column(String(50), unique=True, nullable=False)
     code = Column(String(50), unique=True, nullable=False)
@@ -13,3 +13,4 @@ class ListHangerRespose(BaseResponse):
     collection_uuid: str | None
     collection_name: str | None
     hanger_image: str | None
+    thumbnail_url: str | None
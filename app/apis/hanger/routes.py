@@ -1,5 +1,14 @@
-from fastapi import APIRouter, Depends, Form, Query, UploadFile, status
-from sqlalchemy.orm import Session
+from fastapi import (
+    APIRouter,
+    Depends,
+    Form,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.apis.hanger.response import ListHangerRespose
 from app.apis.hanger.schema import (
@@ -9,10 +18,10 @@ from app.apis.hanger.schema import (
     HangerUpdateRequest,
 )
 from app.apis.hanger.service import HangerService
-from app.apis.user.models import User
 from app.apis.user.schema import RoleEnum
-from app.config.database import get_session
-from app.config.security import get_current_user
+from app.apis.utils.schema import BatchRequest, BatchStatusRequest
+from app.config.database import get_async_session
+from app.config.security import Principal, get_current_principal
 from app.utils.utility import has_role
 
 hanger_router = APIRouter(prefix="/hangers", tags=["Hangers"])
@@ -23,7 +32,7 @@ hanger_router = APIRouter(prefix="/hangers", tags=["Hangers"])
     status_code=status.HTTP_201_CREATED,
     dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
 )
-def create_hanger(
+async def create_hanger(
     name: str = Form(...),
     code: str = Form(...),
     mill_reference_number: str | None = Form(default=None),
@@ -34,7 +43,7 @@ def create_hanger(
     count: str | None = Form(default=None),
     collection_uuid: str | None = Form(default=None),
     hanger_image: UploadFile | None = None,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Create a new hanger endpoint
 
@@ -54,7 +63,28 @@ def create_hanger(
         collection_uuid=collection_uuid,
     )
 
-    return HangerService.create_hanger(data, hanger_image, session)
+    return await HangerService.create_hanger(data, hanger_image, session)
+
+
+@hanger_router.post(
+    "/import",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
+)
+async def import_hangers(
+    file: UploadFile,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Create hangers in bulk from a CSV or XLSX file endpoint
+
+    The first row names the columns, as in the create hanger form. Valid
+    rows are created and every rejected row is listed with its errors.
+
+    Returns:
+        tuple[dict,int]: A dict with the import counts and row errors, and a status_code
+    """
+
+    return await HangerService.import_hangers(file, session)
 
 
 @hanger_router.patch(
@@ -62,7 +92,7 @@ def create_hanger(
     status_code=status.HTTP_202_ACCEPTED,
     dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
 )
-def update_hanger(
+async def update_hanger(
     hanger_uuid: str,
     name: str | None = Form(default=None),
     code: str | None = Form(default=None),
@@ -74,7 +104,7 @@ def update_hanger(
     count: str | None = Form(default=None),
     collection_uuid: str | None = Form(default=None),
     hanger_image: UploadFile | None = None,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Update hanger endpoint
 
@@ -94,7 +124,7 @@ def update_hanger(
         collection_uuid=collection_uuid,
     )
 
-    return HangerService.update_hanger(hanger_uuid, data, hanger_image, session)
+    return await HangerService.update_hanger(hanger_uuid, data, hanger_image, session)
 
 
 @hanger_router.get(
@@ -102,10 +132,12 @@ def update_hanger(
     status_code=status.HTTP_200_OK,
     response_model=ListHangerRespose,
 )
-def get_hanger_by_uuid(
+async def get_hanger_by_uuid(
     hanger_uuid: str,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Get hanger by UUID endpoint
 
@@ -113,25 +145,34 @@ def get_hanger_by_uuid(
         tuple[dict,int]: A dict with hanger data and a status_code
     """
 
-    return HangerService.get_hanger_by_uuid(hanger_uuid, current_user, session)
+    return await HangerService.get_hanger_by_uuid(
+        hanger_uuid, current_user, session, request, response
+    )
 
 
 @hanger_router.get(
     "/", status_code=status.HTTP_200_OK, response_model=list[ListHangerRespose]
 )
-def list_hangers(
+async def list_hangers(
+    response: Response,
+    request: Request,
     filters: HangerFilters = Depends(),
-    sort_by: list[HangerSortEnum] = Query(default=HangerSortEnum.desc_created_at),
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    sort_by: list[HangerSortEnum] = Query(default=[HangerSortEnum.desc_created_at]),
+    current_user: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """List hangers endpoint
 
+    Pass the X-Next-Cursor response header back as `cursor` to fetch the
+    next page with keyset pagination instead of `page`.
+
     Returns:
         tuple[dict,int]: A dict with hanger data and a status_code
     """
 
-    return HangerService.list_hangers(filters, sort_by, current_user, session)
+    return await HangerService.list_hangers(
+        filters, sort_by, current_user, session, response, request
+    )
 
 
 @hanger_router.get(
@@ -139,9 +180,9 @@ def list_hangers(
     status_code=status.HTTP_200_OK,
     dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
 )
-def change_hanger_status(
+async def change_hanger_status(
     hanger_uuid: str,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Change hanger status endpoint
 
@@ -149,7 +190,7 @@ def change_hanger_status(
         tuple[dict,int]: A dict with change status message and a status_code
     """
 
-    return HangerService.change_hanger_status(hanger_uuid, session)
+    return await HangerService.change_hanger_status(hanger_uuid, session)
 
 
 @hanger_router.delete(
@@ -157,9 +198,9 @@ def change_hanger_status(
     status_code=status.HTTP_200_OK,
     dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
 )
-def delete_hanger(
+async def delete_hanger(
     hanger_uuid: str,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Change hanger status endpoint
 
@@ -167,4 +208,44 @@ def delete_hanger(
         tuple[dict,int]: A dict with delete message and a status_code
     """
 
-    return HangerService.delete_hanger(hanger_uuid, session)
+    return await HangerService.delete_hanger(hanger_uuid, session)
+
+
+@hanger_router.patch(
+    "/batch/change-status",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
+)
+async def change_hangers_status(
+    data: BatchStatusRequest,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Activate or deactivate hangers in bulk endpoint
+
+    The hangers are picked by their uuids, or by a filter.
+
+    Returns:
+        tuple[dict,int]: A dict with the counts and the uuids not found, and a status_code
+    """
+
+    return await HangerService.change_hangers_status(data, session)
+
+
+@hanger_router.post(
+    "/batch/delete",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
+)
+async def delete_hangers(
+    data: BatchRequest,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Delete hangers in bulk endpoint
+
+    The hangers are picked by their uuids, or by a filter.
+
+    Returns:
+        tuple[dict,int]: A dict with the counts and the uuids not found, and a status_code
+    """
+
+    return await HangerService.delete_hangers(data, session)
@@ -40,3 +40,4 @@ class HangerFilters(BaseRequest):
     search_by: str | None = None
     page: int = Field(default=1, ge=1)
     per_page: int = Field(default=10, ge=1)
+    cursor: str | None = None
@@ -1,6 +1,6 @@
-from fastapi import HTTPException, UploadFile, status
-from sqlalchemy import asc, desc, exists, or_
-from sqlalchemy.orm import Query, Session
+from fastapi import HTTPException, Request, Response, UploadFile, status
+from sqlalchemy import Select, exists, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.apis.collection.models import Collection
 from app.apis.hanger.models import Hanger
@@ -10,25 +10,58 @@ from app.apis.hanger.schema import (
     HangerSortEnum,
     HangerUpdateRequest,
 )
-from app.apis.user.models import User
-from app.apis.user.schema import RoleEnum
 from app.apis.utils.models import DocumentMaster
+from app.apis.utils.schema import BatchRequest, BatchStatusRequest
 from app.config.logger_config import logger
-from app.utils.utility import save_file, set_id_if_exists_in_dict
+from app.config.security import Principal
+from app.config.setting import get_settings
+from app.utils.batch import batch_update
+from app.utils.bulk_import import (
+    ImportReport,
+    insert_rows,
+    iter_row_batches,
+    resolve_ids,
+    validate_row,
+)
+from app.utils.conditional import (
+    conditional_response,
+    get_validators,
+    with_modified_at,
+)
+from app.utils.derivatives import outerjoin_rendition
+from app.utils.pagination import get_next_cursor, get_sort_keys, paginate
+from app.utils.response_cache import request_signature, response_cache
+from app.utils.search import (
+    apply_search,
+    discard_from_search_index,
+    reset_search_index,
+)
+from app.utils.storage import release_document
+from app.utils.utility import (
+    save_file,
+    set_id_if_exists_in_dict,
+    uuid_id_cache,
+)
+
+settings = get_settings()
 
 
 class HangerService:
     @staticmethod
-    def create_hanger(
-        data: HangerCreateRequest, hanger_image: UploadFile | None, session=Session
+    async def create_hanger(
+        data: HangerCreateRequest,
+        hanger_image: UploadFile | None,
+        session: AsyncSession,
     ):
         try:
-            hanger_exists = session.query(
-                exists().where(
-                    or_(Hanger.name == data.name, Hanger.code == data.code),
-                    Hanger.is_delete == False,
+            hanger_exists = await session.scalar(
+                select(
+                    exists().where(
+                        or_(Hanger.name == data.name, Hanger.code == data.code),
+                        Hanger.is_delete == False,
+                    )
                 )
-            ).scalar()
+            )
             if hanger_exists:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -39,7 +72,7 @@ class HangerService:
             collection_uuid = hanger_data.pop("collection_uuid", None)
 
             if collection_uuid:
-                if not set_id_if_exists_in_dict(
+                if not await set_id_if_exists_in_dict(
                     collection_uuid,
                     Collection,
                     Collection.id,
@@ -54,20 +87,18 @@ class HangerService:
 
             hanger = Hanger(**hanger_data)
             session.add(hanger)
-            session.flush()
+            await session.flush()
 
             document_id = None
             if hanger_image:
-                document_id = save_file(
+                document_id = await save_file(
                     hanger_image,
-                    folder_name=f"hanger/{hanger.uuid}",
                     entity_type="HANGER-IMAGE",
                     session=session,
                 )
             hanger.hanger_image_id = document_id
             session.add(hanger)
-            session.commit()
-            session.refresh(hanger, attribute_names=["uuid"])
+            await session.commit()
             return {"message": "Hanger Created Sucessfully", "hanger_uuid": hanger.uuid}
 
         except HTTPException as http_exc:
@@ -81,17 +112,17 @@ class HangerService:
             )
 
     @staticmethod
-    def update_hanger(
+    async def update_hanger(
         hanger_uuid: str,
         data: HangerUpdateRequest,
         hanger_image: UploadFile | None,
-        session: Session,
+        session: AsyncSession,
     ):
         try:
-            hanger = (
-                session.query(Hanger)
-                .filter(Hanger.uuid, Hanger.is_delete == False)
-                .first()
+            hanger = await session.scalar(
+                select(Hanger).filter(
+                    Hanger.uuid == hanger_uuid, Hanger.is_delete == False
+                )
             )
             if not hanger:
                 raise HTTPException(
@@ -108,7 +139,7 @@ class HangerService:
             collection_uuid = hanger_data.pop("collection_uuid", None)
 
             if collection_uuid:
-                if not set_id_if_exists_in_dict(
+                if not await set_id_if_exists_in_dict(
                     collection_uuid,
                     Collection,
                     Collection.id,
@@ -129,15 +160,15 @@ class HangerService:
                     setattr(hanger, attr, new_value)
 
             if hanger_image:
-                document_id = save_file(
+                document_id = await save_file(
                     hanger_image,
-                    folder_name=f"hanger/{hanger.uuid}",
                     entity_type="HANGER-IMAGE",
                     session=session,
                 )
+                await release_document(hanger.hanger_image_id, session)
                 hanger.hanger_image_id = document_id
             session.add(hanger)
-            session.commit()
+            await session.commit()
             return {"message": "Hanger Updated Sucessfully", "hanger_uuid": hanger_uuid}
 
         except HTTPException as http_exc:
@@ -151,15 +182,27 @@ class HangerService:
             )
 
     @staticmethod
-    def list_hangers(
+    async def list_hangers(
         filters: HangerFilters,
         sort_by: list[HangerSortEnum],
-        current_user: User,
-        session: Session,
+        current_user: Principal,
+        session: AsyncSession,
+        response: Response,
+        request: Request,
     ):
         try:
+            signature = request_signature(
+                "hangers:list", current_user, filters=filters, sort_by=sort_by
+            )
+            cache_key = response_cache.key(
+                signature, (Hanger, Collection, DocumentMaster)
+            )
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                return conditional_response(request, response, **cached)
+
             query = (
-                session.query(
+                select(
                     Hanger.uuid,
                     Hanger.name,
                     Hanger.code,
@@ -186,10 +229,20 @@ class HangerService:
                 )
             )
 
-            query = HangerService.query_criteria(query, current_user, filters, sort_by)
+            query = with_modified_at(query, Hanger, Collection, DocumentMaster)
+            query = outerjoin_rendition(query, Hanger.hanger_image_id)
 
-            hangers = query.all()
-            return hangers
+            query, sort_keys = await HangerService.query_criteria(
+                query, current_user, filters, sort_by
+            )
+
+            hangers = (await session.execute(query)).all()
+            next_cursor = get_next_cursor(hangers, sort_keys, filters.per_page)
+            etag, last_modified = get_validators(hangers, signature)
+            response_cache.set(cache_key, hangers, next_cursor, etag, last_modified)
+            return conditional_response(
+                request, response, hangers, etag, last_modified, next_cursor
+            )
 
         except HTTPException as http_exc:
             raise http_exc
@@ -202,47 +255,48 @@ class HangerService:
             )
 
     @staticmethod
-    def query_criteria(
-        query: Query,
-        current_user: User,
+    async def query_criteria(
+        query: Select,
+        current_user: Principal,
         filters: HangerFilters,
         sort_by: list[HangerSortEnum],
     ):
-        is_admin = any(role.name == RoleEnum.ADMIN for role in current_user.roles)
-        if not is_admin:
+        if not current_user.is_admin:
             query = query.filter(Hanger.is_active == True)
 
+        sort_keys = get_sort_keys(Hanger, sort_by)
         if filters.search_by:
-            query = query.filter(
-                or_(
-                    Hanger.name.ilike(f"%{filters.search_by}%"),
-                    Hanger.code.ilike(f"%{filters.search_by}%"),
-                )
-            )
+            # Best matches first, the requested sort only breaks ties
+            query, relevance = await apply_search(query, Hanger, filters.search_by)
+            sort_keys.insert(0, ("relevance", relevance, True))
 
-        if sort_by:
-            for sort in sort_by:
-                field_name = sort.value.lstrip("-")
-                try:
-                    field = getattr(Hanger, field_name)
-                except AttributeError:
-                    raise ValueError(f"Invalid sort field: {field_name}")
-                if sort.value.startswith("-"):
-                    query = query.order_by(desc(field))
-                else:
-                    query = query.order_by(asc(field))
+        query = paginate(
+            query, sort_keys, filters.page, filters.per_page, filters.cursor
+        )
 
-        offset = (filters.page - 1) * filters.per_page
-        query = query.offset(offset).limit(filters.per_page)
-
-        return query
+        return query, sort_keys
 
     @staticmethod
-    def get_hanger_by_uuid(hanger_uuid: str, current_user: User, session: Session):
+    async def get_hanger_by_uuid(
+        hanger_uuid: str,
+        current_user: Principal,
+        session: AsyncSession,
+        request: Request,
+        response: Response,
+    ):
         try:
-            is_admin = any(role.name == RoleEnum.ADMIN for role in current_user.roles)
+            signature = request_signature(
+                "hangers:detail", current_user, uuid=hanger_uuid
+            )
+            cache_key = response_cache.key(
+                signature, (Hanger, Collection, DocumentMaster)
+            )
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                return conditional_response(request, response, **cached)
+
             query = (
-                session.query(
+                select(
                     Hanger.uuid,
                     Hanger.name,
                     Hanger.code,
@@ -268,16 +322,22 @@ class HangerService:
                     & (DocumentMaster.is_delete == False),
                 )
             )
-            if not is_admin:
+            if not current_user.is_admin:
                 query = query.filter(Hanger.is_active == True)
-            hanger = query.first()
+            query = with_modified_at(query, Hanger, Collection, DocumentMaster)
+            query = outerjoin_rendition(query, Hanger.hanger_image_id)
+            hanger = (await session.execute(query)).first()
             if not hanger:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Hanger not found",
                 )
 
-            return hanger
+            etag, last_modified = get_validators(hanger, signature)
+            response_cache.set(
+                cache_key, hanger, etag=etag, last_modified=last_modified
+            )
+            return conditional_response(request, response, hanger, etag, last_modified)
 
         except HTTPException as http_exc:
             raise http_exc
@@ -290,12 +350,12 @@ class HangerService:
             )
 
     @staticmethod
-    def change_hanger_status(hanger_uuid: str, session: Session):
+    async def change_hanger_status(hanger_uuid: str, session: AsyncSession):
         try:
-            hanger = (
-                session.query(Hanger)
-                .filter(Hanger.uuid == hanger_uuid, Hanger.is_delete == False)
-                .first()
+            hanger = await session.scalar(
+                select(Hanger).filter(
+                    Hanger.uuid == hanger_uuid, Hanger.is_delete == False
+                )
             )
             if not hanger:
                 raise HTTPException(
@@ -303,7 +363,7 @@ class HangerService:
                 )
             msg = "activated" if not hanger.is_active else "deactivated"
             hanger.is_active = not hanger.is_active
-            session.commit()
+            await session.commit()
 
             return {"message": f"hanger {msg} successfully", "hanger_uuid": hanger_uuid}
 
@@ -318,19 +378,19 @@ class HangerService:
             )
 
     @staticmethod
-    def delete_hanger(hanger_uuid: str, session: Session):
+    async def delete_hanger(hanger_uuid: str, session: AsyncSession):
         try:
-            hanger = (
-                session.query(Hanger)
-                .filter(Hanger.uuid == hanger_uuid, Hanger.is_delete == False)
-                .first()
+            hanger = await session.scalar(
+                select(Hanger).filter(
+                    Hanger.uuid == hanger_uuid, Hanger.is_delete == False
+                )
             )
             if not hanger:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND, detail="hanger not found"
                 )
             hanger.is_delete = True
-            session.commit()
+            await session.commit()
 
             return {"message": "hanger deleted successfully"}
 
@@ -343,3 +403,146 @@ class HangerService:
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="An unexpected error occurred. Please try again later.",
             )
+
+    @staticmethod
+    async def change_hangers_status(data: BatchStatusRequest, session: AsyncSession):
+        try:
+            result, _ = await batch_update(
+                Hanger, data, {"is_active": data.is_active}, session
+            )
+            await session.commit()
+            msg = "activated" if data.is_active else "deactivated"
+
+            return {"message": f"hangers {msg} successfully", **result}
+
+        except HTTPException as http_exc:
+            raise http_exc
+
+        except Exception as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="An unexpected error occurred. Please try again later.",
+            )
+
+    @staticmethod
+    async def delete_hangers(data: BatchRequest, session: AsyncSession):
+        try:
+            result, rows = await batch_update(
+                Hanger, data, {"is_delete": True}, session
+            )
+            discard_from_search_index(session, Hanger, [row.id for row in rows])
+            await session.commit()
+            uuid_id_cache.invalidate(Hanger, [row.uuid for row in rows])
+
+            return {"message": "hangers deleted successfully", **result}
+
+        except HTTPException as http_exc:
+            raise http_exc
+
+        except Exception as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="An unexpected error occurred. Please try again later.",
+            )
+
+    @staticmethod
+    async def import_hangers(file: UploadFile, session: AsyncSession):
+        try:
+            report = ImportReport()
+            collection_ids: dict[str, int | None] = {}
+            seen_names, seen_codes = set(), set()
+            uncommitted = 0
+
+            async for batch in iter_row_batches(file, settings.IMPORT_BATCH_SIZE):
+                report.total_rows += len(batch)
+                hangers = []
+                for row_number, row in batch:
+                    hanger, errors = validate_row(HangerCreateRequest, row)
+                    if hanger is not None:
+                        if hanger.name in seen_names:
+                            errors.append(
+                                f"name: {hanger.name} is repeated in the file"
+                            )
+                        if hanger.code in seen_codes:
+                            errors.append(
+                                f"code: {hanger.code} is repeated in the file"
+                            )
+                    if errors:
+                        report.fail(row_number, *errors)
+                        continue
+                    seen_names.add(hanger.name)
+                    seen_codes.add(hanger.code)
+                    hangers.append((row_number, hanger))
+                if not hangers:
+                    continue
+
+                await resolve_ids(
+                    Collection,
+                    (hanger.collection_uuid for _, hanger in hangers),
+                    collection_ids,
+                    session,
+                )
+
+                # Deleted hangers still hold their name and code in the unique keys
+                taken = (
+                    await session.execute(
+                        select(Hanger.name, Hanger.code).filter(
+                            or_(
+                                Hanger.name.in_([h.name for _, h in hangers]),
+                                Hanger.code.in_([h.code for _, h in hangers]),
+                            )
+                        )
+                    )
+                ).all()
+                taken_names = {name for name, _ in taken}
+                taken_codes = {code for _, code in taken}
+
+                rows = []
+                for row_number, hanger in hangers:
+                    errors = []
+                    if hanger.name in taken_names:
+                        errors.append(
+                            f"name: Hanger with name {hanger.name} already exists"
+                        )
+                    if hanger.code in taken_codes:
+                        errors.append(
+                            f"code: Hanger with code {hanger.code} already exists"
+                        )
+                    hanger_data = hanger.model_dump()
+                    collection_uuid = hanger_data.pop("collection_uuid", None)
+                    if collection_uuid:
+                        hanger_data["collection_id"] = collection_ids[collection_uuid]
+                        if hanger_data["collection_id"] is None:
+                            errors.append(
+                                f"collection_uuid: Collection with uuid {collection_uuid} not found"
+                            )
+                    if errors:
+                        report.fail(row_number, *errors)
+                        continue
+                    rows.append((row_number, hanger_data))
+
+                await insert_rows(Hanger, rows, report, session)
+                uncommitted += len(rows)
+                if uncommitted >= settings.IMPORT_TRANSACTION_SIZE > 0:
+                    await session.commit()
+                    # The rows were inserted without the ORM, the index reloads
+                    # lazily. Reset per chunk, a later chunk may still fail
+                    reset_search_index(Hanger)
+                    uncommitted = 0
+
+            await session.commit()
+            if report.created:
+                reset_search_index(Hanger)
+            return {"message": "Hangers Imported", **report.as_dict()}
+
+        except HTTPException as http_exc:
+            raise http_exc
+
+        except Exception as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="An unexpected error occurred. Please try again later.",
+            )
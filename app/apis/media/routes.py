@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.apis.media.service import MediaService
+from app.config.database import get_async_session
+from app.config.security import get_current_principal
+
+media_router = APIRouter(
+    prefix="/media",
+    tags=["Media"],
+    dependencies=[Depends(get_current_principal)],
+)
+
+
+@media_router.api_route(
+    "/document_uuid", methods=["GET", "HEAD"], status_code=status.HTTP_200_OK
+)
+async def get_media(
+    document_uuid: str,
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Serve the file of a document
+
+    Supports Range requests, and answers If-None-Match with a 304 when the
+    ETag (the SHA-256 of the content) still matches.
+
+    Returns:
+        RangeFileResponse: The file, or the requested byte range of it
+    """
+
+    return await MediaService.get_media(document_uuid, request, session)
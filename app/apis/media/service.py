@@ -0,0 +1,168 @@
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+
+import aiofiles.os
+from fastapi import HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.apis.utils.models import DocumentMaster
+from app.config.logger_config import logger
+from app.utils.file_response import RangeFileResponse
+
+# Content addressed files never change under the same ETag. They are only
+# served to authenticated users, so shared caches must not keep them.
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+_RANGE_SPEC_RE = re.compile(r"^(\d*)-(\d*)$")
+
+
+class MediaService:
+    @staticmethod
+    async def get_media(document_uuid: str, request: Request, session: AsyncSession):
+        try:
+            document = await session.scalar(
+                select(DocumentMaster).filter(
+                    DocumentMaster.uuid == document_uuid,
+                    DocumentMaster.is_delete == False,
+                )
+            )
+            if not document or not document.actual_path:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND, detail="Document not found"
+                )
+            try:
+                stat_result = await aiofiles.os.stat(document.actual_path)
+            except FileNotFoundError:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND, detail="File not found"
+                )
+
+            file_size = stat_result.st_size
+            if document.checksum:
+                etag = f'"{document.checksum}"'
+                cache_control = IMMUTABLE_CACHE_CONTROL
+            else:
+                # Saved before checksums were recorded, the file may change
+                etag = f'W/"{int(stat_result.st_mtime)}-{file_size}"'
+                cache_control = REVALIDATE_CACHE_CONTROL
+
+            media_type = (
+                mimetypes.guess_type(document.document_name or document.actual_path)[0]
+                or "application/octet-stream"
+            )
+            filename = document.document_name or os.path.basename(document.actual_path)
+            headers = {
+                "etag": etag,
+                "cache-control": cache_control,
+                "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+                "accept-ranges": "bytes",
+                "content-disposition": f'inline; filename="{filename}"',
+            }
+
+            if MediaService.etag_matches(request.headers.get("if-none-match"), etag):
+                return Response(
+                    status_code=status.HTTP_304_NOT_MODIFIED, headers=headers
+                )
+
+            byte_range = request.headers.get("range")
+            if_range = request.headers.get("if-range")
+            if byte_range and (if_range is None or if_range == etag):
+                try:
+                    parsed = MediaService.parse_range(byte_range, file_size)
+                except ValueError:
+                    # A malformed Range header is ignored, the whole file is sent
+                    parsed = (0, file_size - 1)
+                if parsed is None:
+                    headers["content-range"] = f"bytes */{file_size}"
+                    return Response(
+                        status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                        headers=headers,
+                    )
+                if parsed != (0, file_size - 1):
+                    start, end = parsed
+                    headers["content-range"] = f"bytes {start}-{end}/{file_size}"
+                    return RangeFileResponse(
+                        document.actual_path,
+                        start,
+                        end,
+                        status_code=status.HTTP_206_PARTIAL_CONTENT,
+                        headers=headers,
+                        media_type=media_type,
+                    )
+
+            return RangeFileResponse(
+                document.actual_path,
+                0,
+                file_size - 1,
+                headers=headers,
+                media_type=media_type,
+            )
+
+        except HTTPException as http_exc:
+            raise http_exc
+
+        except Exception as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="An unexpected error occurred. Please try again later.",
+            )
+
+    @staticmethod
+    def etag_matches(if_none_match: str | None, etag: str) -> bool:
+        """Weak comparison of an If-None-Match header, as RFC 9110 asks for"""
+
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        opaque = etag.removeprefix("W/")
+        return any(
+            candidate.strip().removeprefix("W/") == opaque
+            for candidate in if_none_match.split(",")
+        )
+
+    @staticmethod
+    def parse_range(header: str, file_size: int) -> tuple[int, int] | None:
+        """Parse a "bytes=" Range header into inclusive (start, end) offsets
+
+        Multiple ranges are answered with the smallest range covering them
+        all, which clients accept in place of a multipart/byteranges body.
+
+        Raises:
+            ValueError: The header is malformed or not in bytes
+
+        Returns:
+            tuple[int, int] | None: None when the range cannot be satisfied
+        """
+
+        unit, _, specs = header.partition("=")
+        if unit.strip().lower() != "bytes":
+            raise ValueError(f"Unsupported range unit: {unit}")
+
+        ranges = []
+        for spec in specs.split(","):
+            match = _RANGE_SPEC_RE.match(spec.strip())
+            if not match or match.groups() == ("", ""):
+                raise ValueError(f"Malformed range: {spec}")
+            first, last = match.groups()
+            if first == "":
+                # Suffix range: the last N bytes
+                length = int(last)
+                if length == 0:
+                    continue
+                start, end = max(file_size - length, 0), file_size - 1
+            else:
+                start = int(first)
+                end = min(int(last), file_size - 1) if last else file_size - 1
+                if start > end:
+                    continue
+            ranges.append((start, end))
+
+        if not ranges:
+            return None
+        return min(start for start, _ in ranges), max(end for _, end in ranges)
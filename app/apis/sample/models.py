@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, Column, ForeignKey, Integer, String
+from sqlalchemy import BigInteger, Column, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from app.apis.utils.models import CommonModel
@@ -6,6 +6,20 @@ from app.apis.utils.models import CommonModel
 
 class Sample(CommonModel):
     __tablename__ = "sample"
+    __search_columns__ = (
+        "name",
+        "mill_reference_number",
+        "composition",
+        "construction",
+    )
+    __table_args__ = (
+        Index(
+            "ft_sample_search",
+            *__search_columns__,
+            mysql_prefix="FULLTEXT",
+            mysql_with_parser="ngram",
+        ).ddl_if(dialect="mysql"),
+    )
 
     name = Column(String(255), nullable=False, unique=True)
     mill_reference_number = Column(String(255))
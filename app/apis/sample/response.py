@@ -12,3 +12,4 @@ class ListSampleRespose(BaseResponse):
     hanger_uuid: str | None
     hanger_name: str | None
     sample_image: str | None
+    thumbnail_url: str | None
@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Query, UploadFile, status
+from fastapi import APIRouter, Query, Request, Response, UploadFile, status
 from fastapi.params import Depends, Form
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.apis.sample.response import ListSampleRespose
 from app.apis.sample.schema import (
@@ -10,10 +10,10 @@ from app.apis.sample.schema import (
     SampleUpdateRequest,
 )
 from app.apis.sample.service import SampleService
-from app.apis.user.models import User
 from app.apis.user.schema import RoleEnum
-from app.config.database import get_session
-from app.config.security import get_current_user
+from app.apis.utils.schema import BatchRequest, BatchStatusRequest
+from app.config.database import get_async_session
+from app.config.security import Principal, get_current_principal
 from app.utils.utility import has_role
 
 sample_router = APIRouter(prefix="/sample", tags=["Samples"])
@@ -24,7 +24,7 @@ sample_router = APIRouter(prefix="/sample", tags=["Samples"])
     status_code=status.HTTP_201_CREATED,
     dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
 )
-def create_sample(
+async def create_sample(
     name: str = Form(...),
     mill_reference_number: str | None = Form(default=None),
     construction: str | None = Form(default=None),
@@ -34,7 +34,7 @@ def create_sample(
     count: str | None = Form(default=None),
     hanger_uuid: str | None = Form(default=None),
     sample_image: UploadFile | None = None,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Create a new sample endpoint
 
@@ -53,7 +53,30 @@ def create_sample(
         hanger_uuid=hanger_uuid,
     )
 
-    return SampleService.create_sample(data, sample_image, session)
+    return await SampleService.create_sample(data, sample_image, session)
+
+
+@sample_router.post(
+    "/import",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
+)
+async def import_samples(
+    file: UploadFile,
+    images: UploadFile | None = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Create samples in bulk from a CSV or XLSX file endpoint
+
+    The first row names the columns, as in the create sample form. A
+    sample_image column may name an image inside the images zip file.
+    Valid rows are created and every rejected row is listed with its errors.
+
+    Returns:
+        tuple[dict,int]: A dict with the import counts and row errors, and a status_code
+    """
+
+    return await SampleService.import_samples(file, images, session)
 
 
 @sample_router.patch(
@@ -61,7 +84,7 @@ def create_sample(
     status_code=status.HTTP_202_ACCEPTED,
     dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
 )
-def update_sample(
+async def update_sample(
     sample_uuid: str,
     name: str = Form(default=None),
     mill_reference_number: str | None = Form(default=None),
@@ -72,7 +95,7 @@ def update_sample(
     count: str | None = Form(default=None),
     hanger_uuid: str | None = Form(default=None),
     sample_image: UploadFile | None = None,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Create a new sample endpoint
 
@@ -91,7 +114,7 @@ def update_sample(
         hanger_uuid=hanger_uuid,
     )
 
-    return SampleService.update_sample(data, sample_image, session)
+    return await SampleService.update_sample(sample_uuid, data, sample_image, session)
 
 
 @sample_router.get(
@@ -99,10 +122,12 @@ def update_sample(
     status_code=status.HTTP_200_OK,
     response_model=ListSampleRespose,
 )
-def get_sample_by_uuid(
+async def get_sample_by_uuid(
     sample_uuid: str,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Get sample by UUID endpoint
 
@@ -110,25 +135,34 @@ def get_sample_by_uuid(
         tuple[dict,int]: A dict with sample data and a status_code
     """
 
-    return SampleService.get_sample_by_uuid(sample_uuid, current_user, session)
+    return await SampleService.get_sample_by_uuid(
+        sample_uuid, current_user, session, request, response
+    )
 
 
 @sample_router.get(
     "/", status_code=status.HTTP_200_OK, response_model=list[ListSampleRespose]
 )
-def list_sample(
+async def list_sample(
+    response: Response,
+    request: Request,
     filters: SampleFilters = Depends(),
-    sort_by: list[SampleSortEnum] = Query(default=SampleSortEnum.desc_created_at),
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    sort_by: list[SampleSortEnum] = Query(default=[SampleSortEnum.desc_created_at]),
+    current_user: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """List sample endpoint
 
+    Pass the X-Next-Cursor response header back as `cursor` to fetch the
+    next page with keyset pagination instead of `page`.
+
     Returns:
         tuple[dict,int]: A dict with sample data and a status_code
     """
 
-    return SampleService.list_samples(filters, sort_by, current_user, session)
+    return await SampleService.list_samples(
+        filters, sort_by, current_user, session, response, request
+    )
 
 
 @sample_router.get(
@@ -136,9 +170,9 @@ def list_sample(
     status_code=status.HTTP_200_OK,
     dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
 )
-def change_sample_status(
+async def change_sample_status(
     sample_uuid: str,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Change sample status endpoint
 
@@ -146,7 +180,7 @@ def change_sample_status(
         tuple[dict,int]: A dict with change status message and a status_code
     """
 
-    return SampleService.change_sample_status(sample_uuid, session)
+    return await SampleService.change_sample_status(sample_uuid, session)
 
 
 @sample_router.delete(
@@ -154,9 +188,9 @@ def change_sample_status(
     status_code=status.HTTP_200_OK,
     dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
 )
-def delete_sample(
+async def delete_sample(
     sample_uuid: str,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Change sample status endpoint
 
@@ -164,4 +198,44 @@ def delete_sample(
         tuple[dict,int]: A dict with delete message and a status_code
     """
 
-    return SampleService.delete_sample(sample_uuid, session)
+    return await SampleService.delete_sample(sample_uuid, session)
+
+
+@sample_router.patch(
+    "/batch/change-status",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
+)
+async def change_samples_status(
+    data: BatchStatusRequest,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Activate or deactivate samples in bulk endpoint
+
+    The samples are picked by their uuids, or by a filter.
+
+    Returns:
+        tuple[dict,int]: A dict with the counts and the uuids not found, and a status_code
+    """
+
+    return await SampleService.change_samples_status(data, session)
+
+
+@sample_router.post(
+    "/batch/delete",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
+)
+async def delete_samples(
+    data: BatchRequest,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Delete samples in bulk endpoint
+
+    The samples are picked by their uuids, or by a filter.
+
+    Returns:
+        tuple[dict,int]: A dict with the counts and the uuids not found, and a status_code
+    """
+
+    return await SampleService.delete_samples(data, session)
@@ -38,3 +38,4 @@ class SampleFilters(BaseRequest):
     search_by: str | None = None
     page: int = Field(default=1, ge=1)
     per_page: int = Field(default=10, ge=1)
+    cursor: str | None = None
@@ -1,6 +1,8 @@
-from fastapi import HTTPException, UploadFile, status
-from sqlalchemy import asc, desc, exists
-from sqlalchemy.orm import Query, Session
+import uuid
+
+from fastapi import HTTPException, Request, Response, UploadFile, status
+from sqlalchemy import Select, exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.apis.hanger.models import Hanger
 from app.apis.sample.models import Sample
@@ -10,25 +12,59 @@ from app.apis.sample.schema import (
     SampleSortEnum,
     SampleUpdateRequest,
 )
-from app.apis.user.models import User
-from app.apis.user.schema import RoleEnum
 from app.apis.utils.models import DocumentMaster
+from app.apis.utils.schema import BatchRequest, BatchStatusRequest
 from app.config.logger_config import logger
-from app.utils.utility import save_file, set_id_if_exists_in_dict
+from app.config.security import Principal
+from app.config.setting import get_settings
+from app.utils.batch import batch_update
+from app.utils.bulk_import import (
+    ImageArchive,
+    ImportReport,
+    insert_rows,
+    iter_row_batches,
+    resolve_ids,
+    validate_row,
+)
+from app.utils.conditional import (
+    conditional_response,
+    get_validators,
+    with_modified_at,
+)
+from app.utils.derivatives import outerjoin_rendition
+from app.utils.pagination import get_next_cursor, get_sort_keys, paginate
+from app.utils.response_cache import request_signature, response_cache
+from app.utils.search import (
+    apply_search,
+    discard_from_search_index,
+    reset_search_index,
+)
+from app.utils.storage import release_document
+from app.utils.utility import (
+    save_file,
+    set_id_if_exists_in_dict,
+    uuid_id_cache,
+)
+
+settings = get_settings()
 
 
 class SampleService:
     @staticmethod
-    def create_sample(
-        data: SampleCreateRequest, sample_image: UploadFile | None, session=Session
+    async def create_sample(
+        data: SampleCreateRequest,
+        sample_image: UploadFile | None,
+        session: AsyncSession,
     ):
         try:
-            sample_exists = session.query(
-                exists().where(
-                    Sample.name == data.name,
-                    Sample.is_delete == False,
+            sample_exists = await session.scalar(
+                select(
+                    exists().where(
+                        Sample.name == data.name,
+                        Sample.is_delete == False,
+                    )
                 )
-            ).scalar()
+            )
             if sample_exists:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -39,7 +75,7 @@ class SampleService:
             hanger_uuid = sample_data.pop("hanger_uuid", None)
 
             if hanger_uuid:
-                if not set_id_if_exists_in_dict(
+                if not await set_id_if_exists_in_dict(
                     hanger_uuid,
                     Hanger,
                     Hanger.id,
@@ -54,19 +90,17 @@ class SampleService:
 
             sample = Sample(**sample_data)
             session.add(sample)
-            session.flush()
+            await session.flush()
 
             if sample_image:
-                document_id = save_file(
+                document_id = await save_file(
                     sample_image,
-                    folder_name=f"sample/{sample.uuid}",
                     entity_type="SAMPLE-IMAGE",
                     session=session,
                 )
                 sample.sample_image_id = document_id
             session.add(sample)
-            session.commit()
-            session.refresh(sample, attribute_names=["uuid"])
+            await session.commit()
             return {"message": "Sample Created Sucessfully", "sample_uuid": sample.uuid}
 
         except HTTPException as http_exc:
@@ -80,17 +114,141 @@ class SampleService:
             )
 
     @staticmethod
-    def update_sample(
+    async def import_samples(
+        file: UploadFile, images: UploadFile | None, session: AsyncSession
+    ):
+        try:
+            report = ImportReport()
+            archive = ImageArchive(images) if images else None
+            hanger_ids: dict[str, int | None] = {}
+            seen_names = set()
+            uncommitted = 0
+
+            try:
+                async for batch in iter_row_batches(file, settings.IMPORT_BATCH_SIZE):
+                    report.total_rows += len(batch)
+                    samples = []
+                    for row_number, row in batch:
+                        sample, errors = validate_row(SampleCreateRequest, row)
+                        image_name = row.get("sample_image")
+                        if sample is not None and sample.name in seen_names:
+                            errors.append(
+                                f"name: {sample.name} is repeated in the file"
+                            )
+                        if image_name and archive is None:
+                            errors.append(
+                                "sample_image: No images zip file was uploaded"
+                            )
+                        elif image_name and image_name not in archive:
+                            errors.append(
+                                f"sample_image: {image_name} is not in the images zip file"
+                            )
+                        if errors:
+                            report.fail(row_number, *errors)
+                            continue
+                        seen_names.add(sample.name)
+                        samples.append((row_number, sample, image_name))
+                    if not samples:
+                        continue
+
+                    await resolve_ids(
+                        Hanger,
+                        (sample.hanger_uuid for _, sample, _ in samples),
+                        hanger_ids,
+                        session,
+                    )
+
+                    # Deleted samples still hold their name in the unique key
+                    taken_names = set(
+                        (
+                            await session.scalars(
+                                select(Sample.name).filter(
+                                    Sample.name.in_([s.name for _, s, _ in samples])
+                                )
+                            )
+                        ).all()
+                    )
+
+                    rows, document_ids = [], {}
+                    for row_number, sample, image_name in samples:
+                        errors = []
+                        if sample.name in taken_names:
+                            errors.append(
+                                f"name: Sample with name {sample.name} already exists"
+                            )
+                        sample_data = sample.model_dump()
+                        hanger_uuid = sample_data.pop("hanger_uuid", None)
+                        if hanger_uuid:
+                            sample_data["hanger_id"] = hanger_ids[hanger_uuid]
+                            if sample_data["hanger_id"] is None:
+                                errors.append(
+                                    f"hanger_uuid: Hanger with uuid {hanger_uuid} not found"
+                                )
+                        if errors:
+                            report.fail(row_number, *errors)
+                            continue
+
+                        # Set for every row, as the rows share one INSERT
+                        sample_data["uuid"] = str(uuid.uuid4())
+                        if image_name:
+                            try:
+                                document_id = await save_file(
+                                    archive.open(image_name),
+                                    entity_type="SAMPLE-IMAGE",
+                                    session=session,
+                                )
+                            except HTTPException as http_exc:
+                                report.fail(
+                                    row_number, f"sample_image: {http_exc.detail}"
+                                )
+                                continue
+                            sample_data["sample_image_id"] = document_id
+                            document_ids[row_number] = document_id
+                        rows.append((row_number, sample_data))
+
+                    rejected = await insert_rows(Sample, rows, report, session)
+                    for row_number in rejected:
+                        # The image of a row that lost a race is not referenced
+                        await release_document(document_ids.get(row_number), session)
+                    uncommitted += len(rows)
+                    if uncommitted >= settings.IMPORT_TRANSACTION_SIZE > 0:
+                        await session.commit()
+                        # The rows were inserted without the ORM, the index reloads
+                        # lazily. Reset per chunk, a later chunk may still fail
+                        reset_search_index(Sample)
+                        uncommitted = 0
+
+                await session.commit()
+            finally:
+                if archive is not None:
+                    archive.close()
+
+            if report.created:
+                reset_search_index(Sample)
+            return {"message": "Samples Imported", **report.as_dict()}
+
+        except HTTPException as http_exc:
+            raise http_exc
+
+        except Exception as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="An unexpected error occurred. Please try again later.",
+            )
+
+    @staticmethod
+    async def update_sample(
         sample_uuid: str,
         data: SampleUpdateRequest,
         sample_image: UploadFile | None,
-        session: Session,
+        session: AsyncSession,
     ):
         try:
-            sample = (
-                session.query(Sample)
-                .filter(Sample.uuid, Sample.is_delete == False)
-                .first()
+            sample = await session.scalar(
+                select(Sample).filter(
+                    Sample.uuid == sample_uuid, Sample.is_delete == False
+                )
             )
             if not sample:
                 raise HTTPException(
@@ -107,7 +265,7 @@ class SampleService:
             hanger_uuid = sample_data.pop("hanger_uuid", None)
 
             if hanger_uuid:
-                if not set_id_if_exists_in_dict(
+                if not await set_id_if_exists_in_dict(
                     hanger_uuid,
                     Hanger,
                     Hanger.id,
@@ -128,15 +286,15 @@ class SampleService:
                     setattr(sample, attr, new_value)
 
             if sample_image:
-                document_id = save_file(
+                document_id = await save_file(
                     sample_image,
-                    folder_name=f"sample/{sample.uuid}",
                     entity_type="SAMPLE-IMAGE",
                     session=session,
                 )
+                await release_document(sample.sample_image_id, session)
                 sample.sample_image_id = document_id
             session.add(sample)
-            session.commit()
+            await session.commit()
             return {"message": "Sample Updated Sucessfully", "sample_uuid": sample_uuid}
 
         except HTTPException as http_exc:
@@ -150,11 +308,24 @@ class SampleService:
             )
 
     @staticmethod
-    def get_sample_by_uuid(sample_uuid: str, current_user: User, session: Session):
+    async def get_sample_by_uuid(
+        sample_uuid: str,
+        current_user: Principal,
+        session: AsyncSession,
+        request: Request,
+        response: Response,
+    ):
         try:
-            is_admin = any(role.name == RoleEnum.ADMIN for role in current_user.roles)
+            signature = request_signature(
+                "samples:detail", current_user, uuid=sample_uuid
+            )
+            cache_key = response_cache.key(signature, (Sample, Hanger, DocumentMaster))
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                return conditional_response(request, response, **cached)
+
             query = (
-                session.query(
+                select(
                     Sample.uuid,
                     Sample.name,
                     Sample.mill_reference_number,
@@ -178,16 +349,22 @@ class SampleService:
                     & (DocumentMaster.is_delete == False),
                 )
             )
-            if not is_admin:
+            if not current_user.is_admin:
                 query = query.filter(Sample.is_active == True)
-            sample = query.first()
+            query = with_modified_at(query, Sample, Hanger, DocumentMaster)
+            query = outerjoin_rendition(query, Sample.sample_image_id)
+            sample = (await session.execute(query)).first()
             if not sample:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Sample not found",
                 )
 
-            return sample
+            etag, last_modified = get_validators(sample, signature)
+            response_cache.set(
+                cache_key, sample, etag=etag, last_modified=last_modified
+            )
+            return conditional_response(request, response, sample, etag, last_modified)
 
         except HTTPException as http_exc:
             raise http_exc
@@ -199,17 +376,26 @@ class SampleService:
                 detail="An unexpected error occurred. Please try again later.",
             )
 
-    staticmethod
-
-    def list_samples(
+    @staticmethod
+    async def list_samples(
         filters: SampleFilters,
         sort_by: list[SampleSortEnum],
-        current_user: User,
-        session: Session,
+        current_user: Principal,
+        session: AsyncSession,
+        response: Response,
+        request: Request,
     ):
         try:
+            signature = request_signature(
+                "samples:list", current_user, filters=filters, sort_by=sort_by
+            )
+            cache_key = response_cache.key(signature, (Sample, Hanger, DocumentMaster))
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                return conditional_response(request, response, **cached)
+
             query = (
-                session.query(
+                select(
                     Sample.uuid,
                     Sample.name,
                     Sample.mill_reference_number,
@@ -234,10 +420,20 @@ class SampleService:
                 )
             )
 
-            query = SampleService.query_criteria(query, current_user, filters, sort_by)
+            query = with_modified_at(query, Sample, Hanger, DocumentMaster)
+            query = outerjoin_rendition(query, Sample.sample_image_id)
 
-            samples = query.all()
-            return samples
+            query, sort_keys = await SampleService.query_criteria(
+                query, current_user, filters, sort_by
+            )
+
+            samples = (await session.execute(query)).all()
+            next_cursor = get_next_cursor(samples, sort_keys, filters.per_page)
+            etag, last_modified = get_validators(samples, signature)
+            response_cache.set(cache_key, samples, next_cursor, etag, last_modified)
+            return conditional_response(
+                request, response, samples, etag, last_modified, next_cursor
+            )
 
         except HTTPException as http_exc:
             raise http_exc
@@ -250,43 +446,34 @@ class SampleService:
             )
 
     @staticmethod
-    def query_criteria(
-        query: Query,
-        current_user: User,
+    async def query_criteria(
+        query: Select,
+        current_user: Principal,
         filters: SampleFilters,
         sort_by: list[SampleSortEnum],
     ):
-        is_admin = any(role.name == RoleEnum.ADMIN for role in current_user.roles)
-        if not is_admin:
+        if not current_user.is_admin:
             query = query.filter(Sample.is_active == True)
 
+        sort_keys = get_sort_keys(Sample, sort_by)
         if filters.search_by:
-            query = query.filter(Sample.name.ilike(f"%{filters.search_by}%"))
-
-        if sort_by:
-            for sort in sort_by:
-                field_name = sort.value.lstrip("-")
-                try:
-                    field = getattr(Sample, field_name)
-                except AttributeError:
-                    raise ValueError(f"Invalid sort field: {field_name}")
-                if sort.value.startswith("-"):
-                    query = query.order_by(desc(field))
-                else:
-                    query = query.order_by(asc(field))
+            # Best matches first, the requested sort only breaks ties
+            query, relevance = await apply_search(query, Sample, filters.search_by)
+            sort_keys.insert(0, ("relevance", relevance, True))
 
-        offset = (filters.page - 1) * filters.per_page
-        query = query.offset(offset).limit(filters.per_page)
+        query = paginate(
+            query, sort_keys, filters.page, filters.per_page, filters.cursor
+        )
 
-        return query
+        return query, sort_keys
 
     @staticmethod
-    def change_sample_status(sample_uuid: str, session: Session):
+    async def change_sample_status(sample_uuid: str, session: AsyncSession):
         try:
-            sample = (
-                session.query(Sample)
-                .filter(Sample.uuid == sample_uuid, Sample.is_delete == False)
-                .first()
+            sample = await session.scalar(
+                select(Sample).filter(
+                    Sample.uuid == sample_uuid, Sample.is_delete == False
+                )
             )
             if not sample:
                 raise HTTPException(
@@ -294,7 +481,7 @@ class SampleService:
                 )
             msg = "activated" if not sample.is_active else "deactivated"
             sample.is_active = not sample.is_active
-            session.commit()
+            await session.commit()
 
             return {"message": f"sample {msg} successfully", "sample_uuid": sample_uuid}
 
@@ -309,19 +496,19 @@ class SampleService:
             )
 
     @staticmethod
-    def delete_sample(sample_uuid: str, session: Session):
+    async def delete_sample(sample_uuid: str, session: AsyncSession):
         try:
-            sample = (
-                session.query(Sample)
-                .filter(Sample.uuid == sample_uuid, Sample.is_delete == False)
-                .first()
+            sample = await session.scalar(
+                select(Sample).filter(
+                    Sample.uuid == sample_uuid, Sample.is_delete == False
+                )
             )
             if not sample:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND, detail="sample not found"
                 )
             sample.is_delete = True
-            session.commit()
+            await session.commit()
 
             return {"message": "sample deleted successfully"}
 
@@ -334,3 +521,46 @@ class SampleService:
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="An unexpected error occurred. Please try again later.",
             )
+
+    @staticmethod
+    async def change_samples_status(data: BatchStatusRequest, session: AsyncSession):
+        try:
+            result, _ = await batch_update(
+                Sample, data, {"is_active": data.is_active}, session
+            )
+            await session.commit()
+            msg = "activated" if data.is_active else "deactivated"
+
+            return {"message": f"samples {msg} successfully", **result}
+
+        except HTTPException as http_exc:
+            raise http_exc
+
+        except Exception as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="An unexpected error occurred. Please try again later.",
+            )
+
+    @staticmethod
+    async def delete_samples(data: BatchRequest, session: AsyncSession):
+        try:
+            result, rows = await batch_update(
+                Sample, data, {"is_delete": True}, session
+            )
+            discard_from_search_index(session, Sample, [row.id for row in rows])
+            await session.commit()
+            uuid_id_cache.invalidate(Sample, [row.uuid for row in rows])
+
+            return {"message": "samples deleted successfully", **result}
+
+        except HTTPException as http_exc:
+            raise http_exc
+
+        except Exception as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="An unexpected error occurred. Please try again later.",
+            )
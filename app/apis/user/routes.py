@@ -1,16 +1,17 @@
 from fastapi import (
     APIRouter,
-    BackgroundTasks,
     Depends,
     Form,
     HTTPException,
     Query,
+    Request,
+    Response,
     UploadFile,
     status,
 )
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import EmailStr
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.apis.user.response import UserDetailResponse
 from app.apis.user.schema import (
@@ -25,8 +26,10 @@ from app.apis.user.schema import (
     UserUpdateRequest,
 )
 from app.apis.user.service import UserService
-from app.config.database import get_session
-from app.config.security import get_current_user
+from app.apis.utils.schema import BatchRequest, BatchStatusRequest
+from app.config.database import get_async_session
+from app.config.query_stats import query_budget
+from app.config.security import Principal, get_current_principal, get_current_user
 from app.utils.utility import has_role
 
 from .models import User
@@ -39,7 +42,7 @@ user_router = APIRouter(prefix="/users", tags=["Users"])
     status_code=status.HTTP_201_CREATED,
     dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
 )
-def create_user(
+async def create_user(
     first_name: str = Form(..., examples=["John"]),
     last_name: str = Form(..., examples=["Doe"]),
     email: EmailStr = Form(..., examples=["john@example.com"]),
@@ -50,7 +53,7 @@ def create_user(
     ),
     profile_image: UploadFile | None = None,
     role: RoleEnum = Form(..., description="role of the user"),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Create User endpoint
 
@@ -58,7 +61,7 @@ def create_user(
         tuple[dict,int]: A dict with msg and a status_code
     """
 
-    return UserService.create_user(
+    return await UserService.create_user(
         first_name,
         last_name,
         email,
@@ -72,9 +75,9 @@ def create_user(
 
 
 @user_router.post("/login", status_code=status.HTTP_200_OK)
-def login_user(
+async def login_user(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Login User Endpoint
 
@@ -82,12 +85,13 @@ def login_user(
         dict: A dict containing access_token,refresh_token and token type
     """
 
-    return UserService.login_user(session, form_data)
+    return await UserService.login_user(session, form_data)
 
 
 @user_router.post("/refresh-token", status_code=status.HTTP_200_OK)
-def refresh_token(
-    refresh_token: RefreshTokenRequest, session: Session = Depends(get_session)
+async def refresh_token(
+    refresh_token: RefreshTokenRequest,
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Generate new token and refresh token endpoint
 
@@ -99,10 +103,10 @@ def refresh_token(
 
 
 @user_router.patch("/change-password", status_code=status.HTTP_202_ACCEPTED)
-def change_password(
+async def change_password(
     data: ChangePasswordRequest,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Change user password endpoint
 
@@ -110,14 +114,13 @@ def change_password(
         dict: A dict with message
     """
 
-    return UserService.change_password(data, current_user, session)
+    return await UserService.change_password(data, current_user, session)
 
 
 @user_router.post("/forget-password", status_code=status.HTTP_200_OK)
 async def forget_password(
     data: ForgetPasswordRequest,
-    background_task: BackgroundTasks,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Forget user password endpoint
 
@@ -125,12 +128,14 @@ async def forget_password(
         dict: A dict with message
     """
 
-    return await UserService.forget_password(data, background_task, session)
+    return await UserService.forget_password(data, session)
 
 
 @user_router.post("/reset-password", status_code=status.HTTP_200_OK)
-def reset_password(
-    token: str, data: ResetPasswordRequest, session: Session = Depends(get_session)
+async def reset_password(
+    token: str,
+    data: ResetPasswordRequest,
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Reset user password endpoiny
 
@@ -138,15 +143,18 @@ def reset_password(
         dict: A dict with message
     """
 
-    return UserService.reset_password(token, data, session)
+    return await UserService.reset_password(token, data, session)
 
 
 @user_router.get(
-    "/me", response_model=UserDetailResponse, status_code=status.HTTP_200_OK
+    "/me",
+    response_model=UserDetailResponse,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(query_budget(4))],
 )
-def get_me(
+async def get_me(
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """User detail endpoint
 
@@ -160,20 +168,27 @@ def get_me(
 @user_router.get(
     "/",
     status_code=status.HTTP_200_OK,
-    dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
+    dependencies=[Depends(has_role([RoleEnum.ADMIN])), Depends(query_budget(3))],
 )
-def list_users(
+async def list_users(
+    response: Response,
+    request: Request,
     filters: UserFilters = Depends(),
-    sort_by: list[UserSortEnum] = Query(default=UserSortEnum.desc_created_at),
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    sort_by: list[UserSortEnum] = Query(default=[UserSortEnum.desc_created_at]),
+    current_user: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """List Users with filter endpoint
 
+    Pass the X-Next-Cursor response header back as `cursor` to fetch the
+    next page with keyset pagination instead of `page`.
+
     Returns:
         dict: A list of dict with user information
     """
-    return UserService.list_users(filters, sort_by, current_user, session)
+    return await UserService.list_users(
+        filters, sort_by, current_user, session, response, request
+    )
 
 
 @user_router.get(
@@ -182,14 +197,22 @@ def list_users(
     status_code=status.HTTP_200_OK,
     dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
 )
-def get_user_by_uuid(user_uuid: str, session: Session = Depends(get_session)):
+async def get_user_by_uuid(
+    user_uuid: str,
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session),
+):
     """Get User by it's UUID
 
     Returns:
         dict: a dict with user information
     """
 
-    return UserService.get_user_by_uuid(user_uuid, session)
+    return await UserService.get_user_by_uuid(
+        user_uuid, current_user, session, request, response
+    )
 
 
 @user_router.get(
@@ -197,7 +220,9 @@ def get_user_by_uuid(user_uuid: str, session: Session = Depends(get_session)):
     status_code=status.HTTP_200_OK,
     dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
 )
-def active_or_deactivate_user(user_uuid: str, session: Session = Depends(get_session)):
+async def active_or_deactivate_user(
+    user_uuid: str, session: AsyncSession = Depends(get_async_session)
+):
     """Activate or Deactiavte User
 
     Returns:
@@ -205,7 +230,7 @@ def active_or_deactivate_user(user_uuid: str, session: Session = Depends(get_ses
 
     """
 
-    return UserService.activate_or_deactivate_user(user_uuid, session)
+    return await UserService.activate_or_deactivate_user(user_uuid, session)
 
 
 @user_router.delete(
@@ -213,21 +238,63 @@ def active_or_deactivate_user(user_uuid: str, session: Session = Depends(get_ses
     status_code=status.HTTP_200_OK,
     dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
 )
-def delete_user(user_uuid: str, session: Session = Depends(get_session)):
+async def delete_user(
+    user_uuid: str, session: AsyncSession = Depends(get_async_session)
+):
     """Delete User by it's UUID
 
     Returns:
         dict: a dict with user deleted message
     """
 
-    return UserService.delete_user(user_uuid, session)
+    return await UserService.delete_user(user_uuid, session)
+
+
+@user_router.patch(
+    "/batch/change-status",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
+)
+async def change_users_status(
+    data: BatchStatusRequest,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Activate or deactivate users in bulk endpoint
+
+    The users are picked by their uuids, or by a filter.
+
+    Returns:
+        tuple[dict,int]: A dict with the counts and the uuids not found, and a status_code
+    """
+
+    return await UserService.change_users_status(data, session)
+
+
+@user_router.post(
+    "/batch/delete",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(has_role([RoleEnum.ADMIN]))],
+)
+async def delete_users(
+    data: BatchRequest,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Delete users in bulk endpoint
+
+    The users are picked by their uuids, or by a filter.
+
+    Returns:
+        tuple[dict,int]: A dict with the counts and the uuids not found, and a status_code
+    """
+
+    return await UserService.delete_users(data, session)
 
 
 @user_router.patch(
     "/user_uuid",
     status_code=status.HTTP_200_OK,
 )
-def udpate_user(
+async def udpate_user(
     user_uuid: str,
     first_name: str | None = Form(None, examples=["John"]),
     last_name: str | None = Form(None, examples=["Doe"]),
@@ -238,22 +305,22 @@ def udpate_user(
         None, description="Gender must be 'M' or 'F'", examples=["M", "F"]
     ),
     profile_image: UploadFile | None = None,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    current_user: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """Update  User by it's UUID and ony Admin or own user can update
 
     Returns:
         dict: a dict with user deleted message
     """
-    if current_user.roles in [RoleEnum.ADMIN] or current_user.uuid == user_uuid:
+    if current_user.is_admin or current_user.uuid == user_uuid:
         data = UserUpdateRequest(
             first_name=first_name,
             last_name=last_name,
             mobile_no=mobile_no,
             gender=gender,
         )
-        return UserService.update_user(user_uuid, data, profile_image, session)
+        return await UserService.update_user(user_uuid, data, profile_image, session)
 
     raise HTTPException(
         status_code=status.HTTP_403_FORBIDDEN,
@@ -82,3 +82,4 @@ class UserFilters(BaseRequest):
     mobile_no: str | None = None
     page: int = Field(default=1, ge=1)
     per_page: int = Field(default=10, ge=1)
+    cursor: str | None = None
@@ -1,10 +1,10 @@
 from datetime import timedelta
 
-from fastapi import BackgroundTasks, HTTPException, UploadFile, status
+from fastapi import HTTPException, Request, Response, UploadFile, status
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy import asc, desc, exists, func
-from sqlalchemy.orm import Query, Session
+from sqlalchemy import Select, exists, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.apis.user.models import Role, User, user_roles
 from app.apis.user.response import UserDetailResponse
@@ -20,23 +20,36 @@ from app.apis.user.schema import (
     UserUpdateRequest,
 )
 from app.apis.utils.models import DocumentMaster
+from app.apis.utils.schema import BatchRequest, BatchStatusRequest
 from app.config import setting
 from app.config.logger_config import logger
 from app.config.security import (
+    Principal,
     create_access_token,
     create_refresh_token,
     decode_token,
-    verify_password,
+    invalidate_principal,
+    password_hasher,
 )
-from app.utils.email_utility import EmailRequest, send_email
-from app.utils.utility import authenticate_user, save_file
+from app.utils.batch import batch_update
+from app.utils.conditional import (
+    conditional_response,
+    get_validators,
+    with_modified_at,
+)
+from app.utils.email_utility import EmailRequest
+from app.utils.outbox import queue_email
+from app.utils.pagination import get_next_cursor, get_sort_keys, paginate
+from app.utils.response_cache import request_signature
+from app.utils.storage import release_document
+from app.utils.utility import authenticate_user, save_file, uuid_id_cache
 
 settings = setting.get_settings()
 
 
 class UserService:
     @staticmethod
-    def create_user(
+    async def create_user(
         first_name,
         last_name,
         email,
@@ -45,15 +58,17 @@ class UserService:
         gender,
         profile_image,
         role,
-        session: Session,
+        session: AsyncSession,
     ):
         try:
-            user_exists = session.query(
-                exists().where(
-                    User.email == email,
-                    User.is_delete == False,
+            user_exists = await session.scalar(
+                select(
+                    exists().where(
+                        User.email == email,
+                        User.is_delete == False,
+                    )
                 )
-            ).scalar()
+            )
             if user_exists:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -67,26 +82,25 @@ class UserService:
                 mobile_no=mobile_no,
                 gender=gender,
             )
-            db_user.password = password
+            db_user._password = await password_hasher.hash(password)
 
-            db_role = session.query(Role).filter(Role.name == role).first()
+            db_role = await session.scalar(select(Role).filter(Role.name == role))
             if not db_role:
                 return {"error": f"Role with {role} not found"}, 404
             db_user.roles.append(db_role)
             session.add(db_user)
-            session.flush(db_user)
+            await session.flush()
 
             document_id = None
             if profile_image:
-                document_id = save_file(
+                document_id = await save_file(
                     profile_image,
-                    folder_name=f"users/profile_images/{db_user.uuid}/",
                     entity_type="PROFILE-IMAGE",
                     session=session,
                 )
             db_user.profile_image_id = document_id
             session.add(db_user)
-            session.commit()
+            await session.commit()
             return {"message ": "User Created Successfully"}
 
         except HTTPException as http_exc:
@@ -100,9 +114,9 @@ class UserService:
             )
 
     @staticmethod
-    def login_user(session: Session, data: OAuth2PasswordRequestForm):
+    async def login_user(session: AsyncSession, data: OAuth2PasswordRequestForm):
         try:
-            user = authenticate_user(session, data.username, data.password)
+            user = await authenticate_user(session, data.username, data.password)
             if not user:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -139,7 +153,7 @@ class UserService:
             )
 
     @staticmethod
-    def refresh_token(refresh_token: RefreshTokenRequest, session: Session):
+    def refresh_token(refresh_token: RefreshTokenRequest, session: AsyncSession):
         try:
             payload = decode_token(refresh_token.refresh_token)
             user_email = payload.get("email")
@@ -178,17 +192,20 @@ class UserService:
             )
 
     @staticmethod
-    def change_password(
-        data: ChangePasswordRequest, current_user: User, session: Session
+    async def change_password(
+        data: ChangePasswordRequest, current_user: User, session: AsyncSession
     ):
         try:
-            if not verify_password(data.old_password, current_user._password):
+            if not await password_hasher.verify(
+                data.old_password, current_user._password
+            ):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid password"
                 )
-            current_user.password = data.new_password
+            current_user._password = await password_hasher.hash(data.new_password)
             session.add(current_user)
-            session.commit()
+            await session.commit()
+            invalidate_principal(current_user.email)
             return JSONResponse({"message": "Password change successfully"})
         except HTTPException as http_exc:
             raise http_exc
@@ -202,18 +219,16 @@ class UserService:
 
     @staticmethod
     async def forget_password(
-        data: ForgetPasswordRequest, background_task: BackgroundTasks, session: Session
+        data: ForgetPasswordRequest,
+        session: AsyncSession,
     ):
         try:
-            user = (
-                session.query(User.email, User.first_name)
-                .filter(
-                    User.email == data.email,
-                    User.is_delete == False,
-                    User.is_active == True,
-                )
-                .first()
+            query = select(User.email, User.first_name).filter(
+                User.email == data.email,
+                User.is_delete == False,
+                User.is_active == True,
             )
+            user = (await session.execute(query)).first()
             if not user:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST, detail="User not found"
@@ -231,7 +246,9 @@ class UserService:
                 is_html=True,
             )
 
-            background_task.add_task(send_email, email_request_data)
+            # Delivered by the outbox worker, retried until the server takes it
+            await queue_email(email_request_data, session)
+            await session.commit()
 
             return JSONResponse({"message": "Email with reset link sent successfully"})
         except HTTPException as http_exc:
@@ -245,7 +262,9 @@ class UserService:
             )
 
     @staticmethod
-    def reset_password(token: str, data: ResetPasswordRequest, session: Session):
+    async def reset_password(
+        token: str, data: ResetPasswordRequest, session: AsyncSession
+    ):
         try:
             payload = decode_token(token)
             user_email = payload.get("email")
@@ -253,22 +272,21 @@ class UserService:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Token"
                 )
-            user = (
-                session.query(User)
-                .filter(
+            user = await session.scalar(
+                select(User).filter(
                     User.email == user_email,
                     User.is_active == True,
                     User.is_delete == False,
                 )
-                .first()
             )
             if not user:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
                 )
-            user.password = data.new_password
+            user._password = await password_hasher.hash(data.new_password)
             session.add(user)
-            session.commit()
+            await session.commit()
+            invalidate_principal(user_email)
             return JSONResponse({"message": "Password reset successfully"}, 200)
 
         except HTTPException as http_exc:
@@ -282,7 +300,7 @@ class UserService:
             )
 
     @staticmethod
-    def get_me(current_user: User, session: Session):
+    def get_me(current_user: User, session: AsyncSession):
         try:
             user = UserDetailResponse(
                 uuid=current_user.uuid,
@@ -292,9 +310,11 @@ class UserService:
                 mobile_no=current_user.mobile_no,
                 gender=GenderEnum(current_user.gender),
                 roles=[RoleEnum(role.name) for role in current_user.roles],
-                profile_image=current_user.profile_image.file_path
-                if current_user.profile_image_id
-                else None,
+                profile_image=(
+                    current_user.profile_image.file_path
+                    if current_user.profile_image_id
+                    else None
+                ),
             )
 
             return user
@@ -309,15 +329,17 @@ class UserService:
             )
 
     @staticmethod
-    def list_users(
+    async def list_users(
         filters: UserFilters,
         sort_by: list[UserSortEnum],
         current_user,
-        session: Session,
+        session: AsyncSession,
+        response: Response,
+        request: Request,
     ):
         try:
             query = (
-                session.query(
+                select(
                     User.uuid,
                     User.first_name,
                     User.last_name,
@@ -333,9 +355,20 @@ class UserService:
                 .outerjoin(DocumentMaster, DocumentMaster.id == User.profile_image_id)
                 .group_by(User.id)
             )
-            query = UserService.query_criteria(query, filters, sort_by)
-            query = query.all()
-            return [
+            query = with_modified_at(query, User, DocumentMaster)
+            query, sort_keys = UserService.query_criteria(query, filters, sort_by)
+            query = (await session.execute(query)).all()
+            next_cursor = get_next_cursor(query, sort_keys, filters.per_page)
+            # The list leaves out the caller, so it is part of the signature
+            signature = request_signature(
+                "users:list",
+                current_user,
+                filters=filters,
+                sort_by=sort_by,
+                user=current_user.uuid,
+            )
+            etag, last_modified = get_validators(query, signature)
+            users = [
                 {
                     "uuid": result.uuid,
                     "first_name": result.first_name,
@@ -348,6 +381,9 @@ class UserService:
                 }
                 for result in query
             ]
+            return conditional_response(
+                request, response, users, etag, last_modified, next_cursor
+            )
 
         except HTTPException as http_exc:
             raise http_exc
@@ -360,7 +396,9 @@ class UserService:
             )
 
     @staticmethod
-    def query_criteria(query: Query, filters: UserFilters, sort_by: list[UserSortEnum]):
+    def query_criteria(
+        query: Select, filters: UserFilters, sort_by: list[UserSortEnum]
+    ):
         if filters.first_name:
             query = query.filter(User.first_name.ilike(f"%{filters.first_name}%"))
         if filters.gender:
@@ -368,28 +406,24 @@ class UserService:
         if filters.mobile_no:
             query = query.filter(User.mobile_no.like(f"%{filters.mobile_no}%"))
 
-        if sort_by:
-            for sort in sort_by:
-                field_name = sort.value.lstrip("-")
-                try:
-                    field = getattr(User, field_name)
-                except AttributeError:
-                    raise ValueError(f"Invalid sort field: {field_name}")
-                if sort.value.startswith("-"):
-                    query = query.order_by(desc(field))
-                else:
-                    query = query.order_by(asc(field))
+        sort_keys = get_sort_keys(User, sort_by)
+        query = paginate(
+            query, sort_keys, filters.page, filters.per_page, filters.cursor
+        )
 
-        offset = (filters.page - 1) * filters.per_page
-        query = query.offset(offset).limit(filters.per_page)
-
-        return query
+        return query, sort_keys
 
     @staticmethod
-    def get_user_by_uuid(user_uuid: str, session: Session):
+    async def get_user_by_uuid(
+        user_uuid: str,
+        current_user: Principal,
+        session: AsyncSession,
+        request: Request,
+        response: Response,
+    ):
         try:
-            user = (
-                session.query(
+            query = (
+                select(
                     User.uuid,
                     User.first_name,
                     User.last_name,
@@ -404,24 +438,35 @@ class UserService:
                 .outerjoin(DocumentMaster, DocumentMaster.id == User.profile_image_id)
                 .filter(User.uuid == user_uuid, User.is_delete == False)
                 .group_by(User.id)
-                .first()
             )
+            query = with_modified_at(query, User, DocumentMaster)
+            user = (await session.execute(query)).first()
 
             if not user:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
                 )
 
-            return {
-                "uuid": user.uuid,
-                "first_name": user.first_name,
-                "last_name": user.last_name,
-                "email": user.email,
-                "mobile_no": user.mobile_no,
-                "gender": user.gender,
-                "roles": user.roles.split(",") if user.roles else [],
-                "profile_image": user.profile_image,
-            }
+            etag, last_modified = get_validators(
+                user,
+                request_signature("users:detail", current_user, uuid=user_uuid),
+            )
+            return conditional_response(
+                request,
+                response,
+                {
+                    "uuid": user.uuid,
+                    "first_name": user.first_name,
+                    "last_name": user.last_name,
+                    "email": user.email,
+                    "mobile_no": user.mobile_no,
+                    "gender": user.gender,
+                    "roles": user.roles.split(",") if user.roles else [],
+                    "profile_image": user.profile_image,
+                },
+                etag,
+                last_modified,
+            )
         except HTTPException as http_exc:
             raise http_exc
 
@@ -433,12 +478,10 @@ class UserService:
             )
 
     @staticmethod
-    def activate_or_deactivate_user(user_uuid: str, session: Session):
+    async def activate_or_deactivate_user(user_uuid: str, session: AsyncSession):
         try:
-            user = (
-                session.query(User)
-                .filter(User.uuid == user_uuid, User.is_delete == False)
-                .first()
+            user = await session.scalar(
+                select(User).filter(User.uuid == user_uuid, User.is_delete == False)
             )
             if not user:
                 raise HTTPException(
@@ -446,7 +489,8 @@ class UserService:
                 )
             msg = "activated" if not user.is_active else "deactivated"
             user.is_active = not user.is_active
-            session.commit()
+            await session.commit()
+            invalidate_principal(user.email)
 
             return {"message": f"User  {msg} successfully"}
 
@@ -461,19 +505,18 @@ class UserService:
             )
 
     @staticmethod
-    def delete_user(user_uuid: str, session: Session):
+    async def delete_user(user_uuid: str, session: AsyncSession):
         try:
-            user = (
-                session.query(User)
-                .filter(User.uuid == user_uuid, User.is_delete == False)
-                .first()
+            user = await session.scalar(
+                select(User).filter(User.uuid == user_uuid, User.is_delete == False)
             )
             if not user:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
                 )
             user.is_delete = True
-            session.commit()
+            await session.commit()
+            invalidate_principal(user.email)
 
             return {"message": "User Deleted Successfully"}
         except HTTPException as http_exc:
@@ -487,17 +530,61 @@ class UserService:
             )
 
     @staticmethod
-    def update_user(
+    async def change_users_status(data: BatchStatusRequest, session: AsyncSession):
+        try:
+            result, rows = await batch_update(
+                User, data, {"is_active": data.is_active}, session, (User.email,)
+            )
+            await session.commit()
+            for row in rows:
+                invalidate_principal(row.email)
+            msg = "activated" if data.is_active else "deactivated"
+
+            return {"message": f"Users {msg} successfully", **result}
+
+        except HTTPException as http_exc:
+            raise http_exc
+
+        except Exception as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="An unexpected error occurred. Please try again later.",
+            )
+
+    @staticmethod
+    async def delete_users(data: BatchRequest, session: AsyncSession):
+        try:
+            result, rows = await batch_update(
+                User, data, {"is_delete": True}, session, (User.email,)
+            )
+            await session.commit()
+            for row in rows:
+                invalidate_principal(row.email)
+            uuid_id_cache.invalidate(User, [row.uuid for row in rows])
+
+            return {"message": "Users Deleted Successfully", **result}
+
+        except HTTPException as http_exc:
+            raise http_exc
+
+        except Exception as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="An unexpected error occurred. Please try again later.",
+            )
+
+    @staticmethod
+    async def update_user(
         user_uuid: str,
         data: UserUpdateRequest,
         profile_image: UploadFile | None,
-        session: Session,
+        session: AsyncSession,
     ):
         try:
-            user = (
-                session.query(User)
-                .filter(User.uuid == user_uuid, User.is_delete == False)
-                .first()
+            user = await session.scalar(
+                select(User).filter(User.uuid == user_uuid, User.is_delete == False)
             )
 
             if not user:
@@ -523,15 +610,16 @@ class UserService:
                     setattr(user, attr, new_value)
 
             if profile_image:
-                document_id = save_file(
+                document_id = await save_file(
                     profile_image,
-                    folder_name="users/profile_images",
                     entity_type="PROFILE-IMAGE",
                     session=session,
                 )
+                await release_document(user.profile_image_id, session)
                 user.profile_image_id = document_id
 
-            session.commit()
+            await session.commit()
+            invalidate_principal(user.email)
             return {"message": "User updated successfully."}
 
         except HTTPException as http_exc:
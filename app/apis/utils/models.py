@@ -1,6 +1,18 @@
 import uuid
 
-from sqlalchemy import CHAR, BigInteger, Boolean, Column, DateTime, String
+from sqlalchemy import (
+    CHAR,
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+)
 
 from app.config.database import Base
 from app.utils.utility import get_current_indian_time
@@ -10,7 +22,12 @@ class CommonModel(Base):
     __abstract__ = True
     __allow_unmapped__ = True
 
-    id = Column(BigInteger(), primary_key=True, autoincrement=True)
+    # SQLite only autoincrements an INTEGER PRIMARY KEY (the rowid alias)
+    id = Column(
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
     uuid = Column(
         CHAR(50),
         default=lambda: str(uuid.uuid4()),
@@ -19,7 +36,7 @@ class CommonModel(Base):
         nullable=False,
     )
 
-    created_at = Column(DateTime, default=get_current_indian_time)
+    created_at = Column(DateTime, default=get_current_indian_time, index=True)
     modified_at = Column(
         DateTime, default=get_current_indian_time, onupdate=get_current_indian_time
     )
@@ -29,8 +46,47 @@ class CommonModel(Base):
 
 class DocumentMaster(CommonModel):
     __tablename__ = "document_master"
+    __table_args__ = (
+        UniqueConstraint("parent_id", "rendition", name="uq_document_rendition"),
+    )
 
     document_name = Column(String(255))
     file_path = Column(String(255))  # For SERVER with IP
     entity_type = Column(String(255))
     actual_path = Column(String(255))  # For LOCAL
+    checksum = Column(String(64))  # SHA-256 hex digest of the content
+    file_size = Column(BigInteger())  # In bytes
+    blob_id = Column(BigInteger(), ForeignKey("document_blobs.id"))
+    # Derived images (thumbnail, medium) point to the original upload
+    parent_id = Column(BigInteger(), ForeignKey("document_master.id"))
+    rendition = Column(String(20))
+
+
+class DocumentBlob(CommonModel):
+    """Stored file content, shared by every DocumentMaster with the same bytes"""
+
+    __tablename__ = "document_blobs"
+
+    checksum = Column(String(64), unique=True, nullable=False)
+    storage_path = Column(String(255), nullable=False)
+    file_size = Column(BigInteger())
+    ref_count = Column(Integer(), default=0, nullable=False)
+
+
+class EmailOutbox(CommonModel):
+    """Outgoing email, kept until the outbox worker delivered it"""
+
+    __tablename__ = "email_outbox"
+    __table_args__ = (Index("ix_email_outbox_due", "status", "next_attempt_at"),)
+
+    to_email = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    body = Column(Text, nullable=False)
+    is_html = Column(Boolean, default=False)
+    status = Column(String(20), default="pending", nullable=False)
+    attempts = Column(Integer(), default=0, nullable=False)
+    next_attempt_at = Column(DateTime)
+    # Set by the worker sending it, next_attempt_at then holds its lease
+    claim_token = Column(String(32))
+    last_error = Column(String(1000))
+    sent_at = Column(DateTime)
@@ -1,6 +1,7 @@
 
+from datetime import datetime
 from enum import Enum
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class BaseRequest(BaseModel):
@@ -13,3 +14,16 @@ class BaseRequest(BaseModel):
 class SortOrderEnum(str, Enum):
     ASC = "asc"
     DESC = "desc"
+
+
+class BatchRequest(BaseRequest):
+    """Records of a batch operation, by uuid or by a filter"""
+
+    uuids: list[str] | None = Field(None, examples=[["uuid-1", "uuid-2"]])
+    search_by: str | None = None
+    created_after: datetime | None = None
+    created_before: datetime | None = None
+
+
+class BatchStatusRequest(BatchRequest):
+    is_active: bool
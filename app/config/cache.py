@@ -0,0 +1,180 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from app.config.setting import get_settings
+
+settings = get_settings()
+
+
+class CacheBackend:
+    """Minimal key/value cache interface with per-entry TTL
+
+    Values have to be JSON serialisable so every backend can store them.
+    """
+
+    def get(self, key: str) -> Any | None:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """Thread safe in-process LRU cache, entries are private to one worker"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: OrderedDict[str, tuple[float | None, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class SqliteCache(CacheBackend):
+    """Cache stored in a local SQLite file shared by all workers on the host
+
+    Stand-in for a shared cache server (Redis/Memcached) in multi-worker
+    deployments: an invalidation done by one worker is seen by the others.
+    """
+
+    def __init__(
+        self, path: str, namespace: str, maxsize: int = 1024, ttl: float | None = None
+    ):
+        self.path = path
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes_lock = threading.Lock()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "expires_at REAL, PRIMARY KEY (namespace, key))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Any | None:
+        row = (
+            self._connect()
+            .execute(
+                "SELECT value, expires_at FROM cache_entries "
+                "WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            self.delete(key)
+            return None
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        connection = self._connect()
+        connection.execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) "
+            "VALUES (?, ?, ?, ?)",
+            (self.namespace, key, json.dumps(value), expires_at),
+        )
+        with self._writes_lock:
+            self._writes += 1
+            prune = self._writes % 100 == 0
+        if prune:
+            self._prune(connection)
+
+    def delete(self, key: str) -> None:
+        self._connect().execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        )
+
+    def clear(self) -> None:
+        self._connect().execute(
+            "DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,)
+        )
+
+    def _prune(self, connection: sqlite3.Connection) -> None:
+        """Drop expired entries, then the soonest expiring ones over maxsize"""
+
+        connection.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND expires_at < ?",
+            (self.namespace, time.time()),
+        )
+        connection.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+            "SELECT key FROM cache_entries WHERE namespace = ? "
+            "ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.maxsize),
+        )
+
+
+def get_cache(namespace: str, maxsize: int = 1024, ttl: float | None = None):
+    """Create the cache backend configured by CACHE_BACKEND for a namespace
+
+    Args:
+        namespace (str): Keeps the keys of different caches apart
+        maxsize (int): Maximum number of entries
+        ttl (float | None): Default time to live in seconds
+
+    Returns:
+        CacheBackend: "memory" (default) or "sqlite" backend
+    """
+
+    if settings.CACHE_BACKEND == "sqlite":
+        return SqliteCache(settings.CACHE_SQLITE_PATH, namespace, maxsize, ttl)
+    if settings.CACHE_BACKEND == "memory":
+        return MemoryCache(maxsize, ttl)
+    raise ValueError(f"Unknown cache backend: {settings.CACHE_BACKEND}")
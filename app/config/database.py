@@ -1,25 +1,56 @@
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from app.config.logger_config import logger
+from app.config.metrics import instrument_pool
+from app.config.query_stats import instrument_engine
 from app.config.setting import get_settings
 
 settings = get_settings()
 
+# Sync engine: migrations, seed scripts, startup loaders and background workers
 engine = create_engine(
     settings.DATABASE_URI,
     pool_pre_ping=True,
     pool_recycle=3600,
-    pool_size=20,
-    max_overflow=0,
-    echo=settings.MYSQL_ECHO,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
 )
 
+instrument_engine(engine)
+instrument_pool(engine.pool, "sync")
+
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
+# Async engine: request handlers, a waiting request holds no thread.
+# aiosqlite (local testing) runs without a connection pool to size
+async_pool_options = (
+    {}
+    if make_url(settings.ASYNC_DATABASE_URI).get_backend_name() == "sqlite"
+    else {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+    }
+)
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URI,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+    **async_pool_options,
+)
+instrument_engine(async_engine.sync_engine)
+instrument_pool(async_engine.sync_engine.pool, "async")
+
+# Objects stay loaded after commit, an expired attribute would need a lazy
+# load which AsyncSession cannot do implicitly
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
 
 Base = declarative_base()
 
@@ -41,3 +72,22 @@ def get_session() -> Generator:
 
     finally:
         session.close()
+
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    session = AsyncSessionLocal()
+    try:
+        yield session
+
+    except SQLAlchemyError as e:
+        logger.error(f"Database error: {e}")
+        await session.rollback()
+        raise
+
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        await session.rollback()
+        raise
+
+    finally:
+        await session.close()
@@ -1,24 +1,91 @@
+import atexit
+import copy
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import multiprocessing
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 from app.config.setting import get_settings
 
 settings = get_settings()
+
+# Attributes every LogRecord has, anything else came in through extra=
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the fields passed through extra="""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(
+            (key, value)
+            for key, value in vars(record).items()
+            if key not in RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class LocalQueueHandler(QueueHandler):
+    """Queue handler for a listener in the same process
+
+    Records are not pickled, so only the message and the traceback are
+    rendered here and extra= values reach the formatter as they are.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
 # Configure logger
 logger = logging.getLogger(settings.lOGGER_NAME)
 logger.setLevel(logging.INFO)
 
 # Create a file handler for logging
 file_handler = RotatingFileHandler(
-    f'{settings.lOGGER_NAME}.log',          # Log file name
-    maxBytes=10**6,     # Maximum file size in bytes (1 MB)
-    backupCount=5       # Number of backup files to keep
+    f"{settings.lOGGER_NAME}.log",  # Log file name
+    maxBytes=10**6,  # Maximum file size in bytes (1 MB)
+    backupCount=5,  # Number of backup files to keep
+    delay=True,  # Opened on the first record, never in job worker processes
 )
 file_handler.setLevel(logging.INFO)
+file_handler.setFormatter(JsonFormatter())
+
+# The event loop only puts records on a queue, a listener thread formats
+# them and does the file I/O
+log_queue = queue.SimpleQueue()
+logger.addHandler(LocalQueueHandler(log_queue))
+log_listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+
+def forward_to_parent(records: multiprocessing.Queue):
+    """Send the records of a job worker to the listener of the app process
 
-# Create a formatter and set it for the file handler
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
+    Process pool initializer. Only the app process writes and rotates the
+    log file, a RotatingFileHandler per process would rotate it under the
+    others.
+    """
 
-# Add the file handler to the logger
-logger.addHandler(file_handler)
+    atexit.unregister(log_listener.stop)
+    log_listener.stop()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(QueueHandler(records))
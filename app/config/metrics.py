@@ -0,0 +1,253 @@
+import bisect
+import math
+import os
+import tempfile
+import threading
+import time
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+# Seconds, the usual Prometheus defaults
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Metric:
+    """A named family of samples, one per combination of label values"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} takes the labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> list[tuple[str, tuple, float]]:
+        """(suffix, label pairs, value) of every sample"""
+
+        with self._lock:
+            return [
+                ("", tuple(zip(self.labelnames, key)), value)
+                for key, value in self._values.items()
+            ]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0:
+            raise ValueError("A counter can only go up")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [count per bucket..., count above the last bucket, sum]
+            state = self._values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            state[bisect.bisect_left(self.buckets, value)] += 1
+            state[-1] += value
+
+    def samples(self) -> list[tuple[str, tuple, float]]:
+        samples = []
+        with self._lock:
+            for key, state in self._values.items():
+                labels = tuple(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, count in zip((*self.buckets, math.inf), state):
+                    cumulative += count
+                    samples.append(("_bucket", (*labels, ("le", bound)), cumulative))
+                samples.append(("_sum", labels, state[-1]))
+                samples.append(("_count", labels, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """In-process metrics, rendered in the Prometheus text exposition format
+
+    Every worker process keeps its own registry, so a scraper has to reach
+    each worker (or sum what it gets). Values that are cheap to read but
+    not event driven, like pool usage, are refreshed by collectors right
+    before rendering. Nothing here needs a Prometheus server: the text can
+    be fetched from /metrics or written to a file with dump().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: dict[str, Metric] = {}
+        self._collectors: list[Callable[[], None]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, func: Callable[[], None]) -> Callable[[], None]:
+        """Register func to be called before every render, usable as a decorator"""
+
+        with self._lock:
+            self._collectors.append(func)
+        return func
+
+    def render(self) -> str:
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        for collect in collectors:
+            collect()
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, labels, value in metric.samples():
+                lines.append(
+                    f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}"
+                )
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str):
+        """Write the rendered metrics to path, replacing it atomically"""
+
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            file.write(self.render())
+        os.replace(temp_path, path)
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    pairs = (
+        f'{name}="{_format_value(value) if name == "le" else _escape_label(value)}"'
+        for name, value in labels
+    )
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 2**53 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+metrics = MetricsRegistry()
+
+db_pool_checkout_seconds = metrics.histogram(
+    "db_pool_checkout_seconds",
+    "Time a connection stayed checked out of the pool",
+    ("pool",),
+)
+db_pool_connections = metrics.gauge(
+    "db_pool_connections",
+    "Connections of the pool by state: checked_out, idle and overflow",
+    ("pool", "state"),
+)
+db_pool_size = metrics.gauge(
+    "db_pool_size", "Connections the pool keeps open", ("pool",)
+)
+
+
+def instrument_pool(pool: Pool, name: str):
+    """Time checkouts of pool and report its usage under pool=name
+
+    Pools without a fixed size (NullPool, StaticPool) only get the timings.
+    """
+
+    @event.listens_for(pool, "checkout")
+    def _checked_out(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+
+    @event.listens_for(pool, "checkin")
+    def _checked_in(dbapi_connection, connection_record):
+        started = connection_record.info.pop("checked_out_at", None)
+        if started is not None:
+            db_pool_checkout_seconds.observe(time.perf_counter() - started, pool=name)
+
+    if not hasattr(pool, "checkedout"):
+        return
+
+    @metrics.collector
+    def _collect_usage():
+        db_pool_size.set(pool.size(), pool=name)
+        db_pool_connections.set(pool.checkedout(), pool=name, state="checked_out")
+        db_pool_connections.set(pool.checkedin(), pool=name, state="idle")
+        db_pool_connections.set(max(pool.overflow(), 0), pool=name, state="overflow")
@@ -1,17 +1,131 @@
 import time
-from starlette.middleware.base import BaseHTTPMiddleware
-from fastapi import Request
+import uuid
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
 from app.config.logger_config import logger
+from app.config.metrics import metrics
+from app.config.query_stats import QueryBudgetExceeded, QueryStats, current_query_stats
+from app.config.setting import get_settings
+
+settings = get_settings()
+
+http_request_duration_seconds = metrics.histogram(
+    "http_request_duration_seconds",
+    "Time until the last byte of the response was sent",
+    ("method", "route"),
+)
+http_requests_total = metrics.counter(
+    "http_requests_total", "Finished requests", ("method", "route", "status")
+)
+http_requests_in_flight = metrics.gauge(
+    "http_requests_in_flight", "Requests being handled"
+)
+
+
+class LoggingMiddleware:
+    """Log one structured record per HTTP request
+
+    A plain ASGI middleware, so responses stream through untouched. The
+    record carries the request id (taken from X-Request-ID or generated,
+    and sent back in the same header), the route template, the status and
+    the duration until the last byte of the response was sent. The same
+    duration goes into the request metrics, labelled by route template so
+    paths with ids in them do not each get their own series.
+
+    The queries of the request are counted and timed too. Their totals go
+    into a Server-Timing header and the record, statements repeated
+    SQL_REPEAT_THRESHOLD times are logged as a likely N+1, and going over
+    the query budget is logged, or fails the request with SQL_STRICT_BUDGET.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        request_id = self._get_request_id(scope)
+        scope.setdefault("state", {})["request_id"] = request_id
+        status_code = 500
+        http_requests_in_flight.inc()
+        stats = QueryStats(budget=settings.SQL_QUERY_BUDGET)
+        stats_token = current_query_stats.set(stats)
+
+        async def send_with_request_id(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                # Checked first, a request failing it is logged with the 500
+                self._check_query_budget(scope, stats)
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Request-ID", request_id)
+                headers.append("Server-Timing", stats.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            duration = time.perf_counter() - started
+            http_requests_in_flight.dec()
+            current_query_stats.reset(stats_token)
+            route = getattr(scope.get("route"), "path_format", None)
+            method = scope["method"]
+            # Unmatched paths share one series, scanners would flood the labels
+            http_request_duration_seconds.observe(
+                duration, method=method, route=route or "unmatched"
+            )
+            http_requests_total.inc(
+                method=method, route=route or "unmatched", status=status_code
+            )
+            logger.info(
+                "request",
+                extra={
+                    "request_id": request_id,
+                    "method": method,
+                    "route": route or scope["path"],
+                    "status": status_code,
+                    "duration_ms": round(duration * 1000, 2),
+                    "queries": stats.count,
+                    "db_ms": round(stats.seconds * 1000, 2),
+                },
+            )
+            for statement, count in stats.repeated(settings.SQL_REPEAT_THRESHOLD):
+                logger.warning(
+                    "repeated statement",
+                    extra={
+                        "request_id": request_id,
+                        "route": route or scope["path"],
+                        "count": count,
+                        "statement": statement[:500],
+                    },
+                )
 
+    @staticmethod
+    def _check_query_budget(scope: Scope, stats: QueryStats):
+        if stats.count <= stats.budget:
+            return
+        route = getattr(scope.get("route"), "path_format", None) or scope["path"]
+        message = (
+            f"{scope['method']} {route} ran {stats.count} queries, "
+            f"its budget is {stats.budget}"
+        )
+        if settings.SQL_STRICT_BUDGET:
+            repeated = stats.repeated(2)[:3]
+            raise QueryBudgetExceeded(
+                "\n".join([message, *(f"{n}x {sql}" for sql, n in repeated)])
+            )
+        logger.warning(message)
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        logger.info(f"Request: method={request.method} url={request.url.path}")
-        
-        response = await call_next(request)
-        
-        duration = time.time() - start_time
-        logger.info(f"Response: status_code={response.status_code} duration={duration:.4f} seconds")
-        
-        return response
+    @staticmethod
+    def _get_request_id(scope: Scope) -> str:
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1").strip()
+                if 0 < len(request_id) <= 128:
+                    return request_id
+        return uuid.uuid4().hex
@@ -0,0 +1,97 @@
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.apis.user.schema import RoleEnum
+from app.config.database import SessionLocal
+from app.config.logger_config import logger
+
+
+class RoleRegistry:
+    """Role names present in the roles table, loaded once at startup
+
+    has_role checks run against this in-memory set instead of querying the
+    roles table. It is reloaded on a background thread after a committed
+    change to a Role row, so no request waits on the sync query. Until the
+    first load every RoleEnum value is assumed to exist.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._roles = frozenset(role.value for role in RoleEnum)
+
+    @property
+    def roles(self) -> frozenset[str]:
+        return self._roles
+
+    def load(self, session: Session):
+        from app.apis.user.models import Role
+
+        names = session.query(Role.name).filter(Role.is_delete == False).all()
+        with self._lock:
+            self._roles = frozenset(name for (name,) in names)
+        logger.info(f"Role registry loaded: {sorted(self._roles)}")
+
+    def refresh(self):
+        # One at a time, so the last reload started is the last one applied
+        with self._refresh_lock:
+            try:
+                with SessionLocal() as session:
+                    self.load(session)
+            except Exception as e:
+                # Keep answering from the last known roles rather than failing auth
+                logger.error(f"Role registry refresh failed: {e}")
+
+    def mark_stale(self):
+        threading.Thread(target=self.refresh, name="role-registry", daemon=True).start()
+
+
+role_registry = RoleRegistry()
+
+
+class RoleMatrix:
+    """Precompiled answer to "may a principal with these roles pass?"
+
+    Built once per has_role() declaration; the allowed set is recomputed only
+    when the role registry changes.
+    """
+
+    def __init__(self, required_roles: list[str]):
+        self.required = frozenset(RoleEnum(role).value for role in required_roles)
+        self._registry_roles = None
+        self._allowed = frozenset()
+
+    @property
+    def allowed(self) -> frozenset[str]:
+        registry_roles = role_registry.roles
+        if registry_roles is not self._registry_roles:
+            self._allowed = self.required & registry_roles
+            self._registry_roles = registry_roles
+        return self._allowed
+
+    def permits(self, roles: frozenset[str]) -> bool:
+        return not self.allowed.isdisjoint(roles)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_role_changes(session, flush_context):
+    from app.apis.user.models import Role
+
+    if any(
+        isinstance(instance, Role)
+        for instance in (*session.new, *session.dirty, *session.deleted)
+    ):
+        session.info["roles_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _refresh_roles(session):
+    if session.info.pop("roles_changed", False):
+        role_registry.mark_stale()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_role_changes(session):
+    session.info.pop("roles_changed", None)
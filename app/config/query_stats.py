@@ -0,0 +1,98 @@
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import Engine, event
+
+from app.config.metrics import metrics
+from app.config.setting import get_settings
+
+settings = get_settings()
+
+db_query_duration_seconds = metrics.histogram(
+    "db_query_duration_seconds", "Time of one statement on the database"
+)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """A request ran more queries than its budget, raised with SQL_STRICT_BUDGET"""
+
+
+@dataclass
+class QueryStats:
+    """Statements run on behalf of one request"""
+
+    budget: int
+    count: int = 0
+    seconds: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.seconds += elapsed
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Statements run at least threshold times, most repeated first
+
+        Parameters are bound separately, so a lazy load or a query inside a
+        loop shows up as the same statement text over and over.
+        """
+
+        return [
+            (statement, count)
+            for statement, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.seconds * 1000:.2f};desc="{self.count} queries"'
+
+
+# Set by LoggingMiddleware for the duration of each HTTP request. Background
+# workers run outside a request, their statements are only timed
+current_query_stats: ContextVar[QueryStats | None] = ContextVar(
+    "current_query_stats", default=None
+)
+
+
+def query_budget(limit: int):
+    """Route dependency replacing SQL_QUERY_BUDGET for that route
+
+    Usage: dependencies=[Depends(query_budget(4))]
+    """
+
+    async def set_query_budget():
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.budget = limit
+
+    return set_query_budget
+
+
+def instrument_engine(engine: Engine):
+    """Time every statement of engine and count it against the current request"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        db_query_duration_seconds.observe(elapsed)
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.record(statement, elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        # A failed statement never reaches after_cursor_execute
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_started"):
+            connection.info["query_started"].pop()
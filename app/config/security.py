@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 from typing import Optional
 
@@ -6,22 +8,49 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from pydantic import BaseModel, EmailStr
-from sqlalchemy.orm import Session, joinedload
-
-from app.apis.user.schema import TokenData
-from app.config.database import get_session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.apis.user.schema import RoleEnum, TokenData
+from app.config.cache import get_cache
+from app.config.database import get_async_session
+from app.config.metrics import metrics
 from app.config.setting import get_settings
 
 settings = get_settings()
 
+bcrypt_queue_depth = metrics.gauge(
+    "bcrypt_queue_depth", "Password hashes running or waiting for a worker"
+)
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/users/login")
 
+# Resolved principals keyed by token subject (the user email)
+principal_cache = get_cache(
+    "principal", settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL
+)
+
 
 class TokenScheme(BaseModel):
     email: Optional[str] = EmailStr
 
 
+class Principal(BaseModel):
+    """The authenticated user as needed for authorisation, safe to cache"""
+
+    id: int
+    uuid: str
+    email: str
+    is_active: bool
+    roles: frozenset[str]
+
+    @property
+    def is_admin(self) -> bool:
+        return RoleEnum.ADMIN.value in self.roles
+
+
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
@@ -30,6 +59,53 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+class PasswordHasher:
+    """Runs bcrypt on its own bounded thread pool
+
+    bcrypt releases the GIL, so a few dedicated threads keep hashing off the
+    event loop and out of the shared threadpool that serves sync endpoints.
+    A login storm queues here instead of stalling every other request. When
+    more than max_queue calls are waiting, new calls fail fast with a 503.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_depth = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bcrypt"
+        )
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def _run(self, func, *args):
+        if self.queue_depth >= self.max_queue:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many authentication requests, please retry shortly.",
+                headers={"Retry-After": "1"},
+            )
+        # Only touched from the event loop thread, so no lock is needed
+        self.queue_depth += 1
+        bcrypt_queue_depth.set(self.queue_depth)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.queue_depth -= 1
+            bcrypt_queue_depth.set(self.queue_depth)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(settings.BCRYPT_WORKERS, settings.BCRYPT_MAX_QUEUE)
+
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     from app.utils.utility import get_current_indian_time
 
@@ -78,11 +154,51 @@ def decode_token(token: str):
         )
 
 
-def get_current_user(
-    session: Session = Depends(get_session), token: str = Depends(oauth2_scheme)
-):
-    from app.apis.user.models import User
+def invalidate_principal(email: str):
+    """Drop the cached principal of a user, call it after changing the user"""
+
+    principal_cache.delete(email)
+
+
+async def load_principal(email: str, session: AsyncSession) -> Principal | None:
+    """Resolve a token subject to a Principal, served from the principal cache"""
+
+    from app.apis.user.models import Role, User, user_roles
+
+    cached = principal_cache.get(email)
+    if cached is not None:
+        return Principal(**cached)
 
+    query = (
+        select(User.id, User.uuid, User.email, User.is_active, Role.name)
+        .outerjoin(user_roles, user_roles.c.user_id == User.id)
+        .outerjoin(Role, Role.id == user_roles.c.role_id)
+        .filter(
+            User.email == email,
+            User.is_delete == False,
+            User.is_active == True,
+        )
+    )
+    rows = (await session.execute(query)).all()
+    if not rows:
+        return None
+
+    user = rows[0]
+    principal = Principal(
+        id=user.id,
+        uuid=user.uuid,
+        email=user.email,
+        is_active=user.is_active,
+        roles=frozenset(row.name for row in rows if row.name),
+    )
+    principal_cache.set(email, principal.model_dump(mode="json"))
+    return principal
+
+
+async def get_current_principal(
+    session: AsyncSession = Depends(get_async_session),
+    token: str = Depends(oauth2_scheme),
+) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -96,16 +212,31 @@ def get_current_user(
         token_data = TokenScheme(email=email)
     except Exception:
         raise credentials_exception
-    user = (
-        session.query(User)
-        .options(joinedload(User.roles))
-        .filter(
-            User.email == token_data.email,
-            User.is_delete == False,
-            User.is_active == True,
-        )
-        .first()
-    )
-    if user is None:
+
+    principal = await load_principal(token_data.email, session)
+    if principal is None:
         raise credentials_exception
+    return principal
+
+
+async def get_current_user(
+    session: AsyncSession = Depends(get_async_session),
+    principal: Principal = Depends(get_current_principal),
+):
+    """Load the full User row, only for endpoints that need more than a Principal"""
+
+    from app.apis.user.models import User
+
+    user = await session.get(
+        User,
+        principal.id,
+        options=[selectinload(User.roles), selectinload(User.profile_image)],
+    )
+    if user is None or user.is_delete or not user.is_active:
+        invalidate_principal(principal.email)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
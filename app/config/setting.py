@@ -15,13 +15,91 @@ class Settings(BaseSettings):
     MYSQL_PASS: str = os.environ.get("MYSQL_PASSWORD", "root")
     MYSQL_PORT: int = int(os.environ.get("MYSQL_PORT", 3306))
     MYSQL_DB: str = os.environ.get("MYSQL_DB", "fastapi")
-    MYSQL_ECHO: bool = os.environ.get("MYSQL_ECHO", True)
     DATABASE_URI: str = f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASS}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
+    ASYNC_DATABASE_URI: str = f"mysql+aiomysql://{MYSQL_USER}:{MYSQL_PASS}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
+    DB_POOL_SIZE: int = int(os.environ.get("DB_POOL_SIZE", 20))
+    DB_MAX_OVERFLOW: int = int(os.environ.get("DB_MAX_OVERFLOW", 0))
+
+    # SQL_INSTRUMENTATION
+    # Queries of each request are counted and timed into a Server-Timing
+    # header. A statement repeated SQL_REPEAT_THRESHOLD times in a request is
+    # logged as a likely N+1. Going over the budget is logged, or raises with
+    # SQL_STRICT_BUDGET, meant for development and test runs
+    SQL_QUERY_BUDGET: int = int(os.environ.get("SQL_QUERY_BUDGET", 50))
+    SQL_REPEAT_THRESHOLD: int = int(os.environ.get("SQL_REPEAT_THRESHOLD", 5))
+    SQL_STRICT_BUDGET: bool = os.environ.get("SQL_STRICT_BUDGET", False)
 
     # DOCUMENT_CONFIGURATION
     UPLOAD_FOLDER: str = os.environ.get(
         "UPLOAD_FOLDER", "/home/shehbaaz/Documents/DurableTextile/uploads"
     )
+    UPLOAD_MAX_BYTES: int = int(os.environ.get("UPLOAD_MAX_BYTES", 50 * 1024 * 1024))
+    UPLOAD_CHUNK_SIZE: int = int(os.environ.get("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+    # IMAGE_DERIVATIVES
+    # Longest side in pixels of each rendition, generated after an upload
+    THUMBNAIL_SIZE: int = int(os.environ.get("THUMBNAIL_SIZE", 320))
+    MEDIUM_IMAGE_SIZE: int = int(os.environ.get("MEDIUM_IMAGE_SIZE", 1280))
+    RENDITION_FORMAT: str = os.environ.get("RENDITION_FORMAT", "WEBP")  # or JPEG
+    RENDITION_QUALITY: int = int(os.environ.get("RENDITION_QUALITY", 80))
+    DERIVATIVE_WORKERS: int = int(os.environ.get("DERIVATIVE_WORKERS", 2))
+
+    # PDF_EXPORT
+    # Exports render on a process pool, finished files are kept for
+    # EXPORT_JOB_TTL seconds under EXPORT_FOLDER
+    EXPORT_FOLDER: str = os.environ.get("EXPORT_FOLDER", "exports")
+    EXPORT_WORKERS: int = int(os.environ.get("EXPORT_WORKERS", 2))
+    EXPORT_JOB_TTL: int = int(os.environ.get("EXPORT_JOB_TTL", 60 * 60))
+    # Rendered PDFs are reused until their collections change
+    EXPORT_CACHE_FOLDER: str = os.environ.get("EXPORT_CACHE_FOLDER", "exports/cache")
+    EXPORT_CACHE_MAX_BYTES: int = int(
+        os.environ.get("EXPORT_CACHE_MAX_BYTES", 500 * 1024 * 1024)
+    )
+    # Images are scaled to the printed size at this resolution before
+    # rendering, and cached apart from the PDFs
+    PDF_IMAGE_DPI: int = int(os.environ.get("PDF_IMAGE_DPI", 150))
+    PDF_IMAGE_QUALITY: int = int(os.environ.get("PDF_IMAGE_QUALITY", 85))
+    PDF_IMAGE_CACHE_MAX_BYTES: int = int(
+        os.environ.get("PDF_IMAGE_CACHE_MAX_BYTES", 500 * 1024 * 1024)
+    )
+
+    # TEMPLATES
+    # Compiled templates, relative to the project root unless absolute
+    TEMPLATE_CACHE_FOLDER: str = os.environ.get(
+        "TEMPLATE_CACHE_FOLDER", "cache/templates"
+    )
+
+    # BULK_IMPORT
+    # Rows parsed, validated and inserted together
+    IMPORT_BATCH_SIZE: int = int(os.environ.get("IMPORT_BATCH_SIZE", 500))
+    # Rows inserted before a commit, in whole batches; 0 commits the whole
+    # file at once
+    IMPORT_TRANSACTION_SIZE: int = int(os.environ.get("IMPORT_TRANSACTION_SIZE", 500))
+
+    # BATCH_UPDATE
+    # Records changed by each UPDATE of the batch status and delete endpoints
+    BATCH_UPDATE_CHUNK_SIZE: int = int(os.environ.get("BATCH_UPDATE_CHUNK_SIZE", 500))
+
+    # SEARCH_CONFIGURATION
+    SEARCH_MIN_SIMILARITY: float = float(os.environ.get("SEARCH_MIN_SIMILARITY", 0.6))
+    # Without FULLTEXT (SQLite) the best matches ranked by relevance, the
+    # other matches still come back, after them
+    SEARCH_MAX_CANDIDATES: int = int(os.environ.get("SEARCH_MAX_CANDIDATES", 1000))
+
+    # CACHE_CONFIGURATION
+    # "memory" keeps entries per worker, "sqlite" shares them between the
+    # workers of one host through CACHE_SQLITE_PATH
+    CACHE_BACKEND: str = os.environ.get("CACHE_BACKEND", "memory")
+    CACHE_SQLITE_PATH: str = os.environ.get("CACHE_SQLITE_PATH", "cache/cache.sqlite3")
+    PRINCIPAL_CACHE_TTL: int = int(os.environ.get("PRINCIPAL_CACHE_TTL", 300))
+    PRINCIPAL_CACHE_SIZE: int = int(os.environ.get("PRINCIPAL_CACHE_SIZE", 10000))
+    # Ids of record uuids, per table
+    UUID_CACHE_SIZE: int = int(os.environ.get("UUID_CACHE_SIZE", 10000))
+    UUID_CACHE_TTL: int = int(os.environ.get("UUID_CACHE_TTL", 24 * 60 * 60))
+    # List and detail responses of the catalogue, dropped when a table they
+    # read is written
+    RESPONSE_CACHE_SIZE: int = int(os.environ.get("RESPONSE_CACHE_SIZE", 2000))
+    RESPONSE_CACHE_TTL: int = int(os.environ.get("RESPONSE_CACHE_TTL", 600))
 
     # LOGGER_CONFIGURATION
     lOGGER_NAME: str = os.environ.get("LOGGER_NAME", "fastapi")
@@ -38,6 +116,12 @@ class Settings(BaseSettings):
         os.environ.get("REFRESH_TOKEN_EXPIRE_MINUTES", 60 * 24 * 7)
     )
 
+    # Password hashing pool
+    BCRYPT_WORKERS: int = int(
+        os.environ.get("BCRYPT_WORKERS", min(4, os.cpu_count() or 1))
+    )
+    BCRYPT_MAX_QUEUE: int = int(os.environ.get("BCRYPT_MAX_QUEUE", 256))
+
     # App Secret Key
     APP_SECRET_KEY: str = os.environ.get(
         "APP_SECRET_KEY",
@@ -54,6 +138,26 @@ class Settings(BaseSettings):
     MAIL_STARTTLS: str = os.environ.get("MAIL_STARTTLS", False)
     MAIL_SSL_TLS: str = os.environ.get("MAIL_SSL_TLS", True)
 
+    # EMAIL_OUTBOX
+    # "smtp" delivers through MAIL_SERVER, "file" writes .eml files into
+    # MAIL_SPOOL_FOLDER instead, a local stand-in for development and tests
+    MAIL_BACKEND: str = os.environ.get("MAIL_BACKEND", "smtp")
+    MAIL_SPOOL_FOLDER: str = os.environ.get("MAIL_SPOOL_FOLDER", "mail_spool")
+    MAIL_POOL_SIZE: int = int(os.environ.get("MAIL_POOL_SIZE", 2))
+    MAIL_POOL_IDLE_TIMEOUT: int = int(os.environ.get("MAIL_POOL_IDLE_TIMEOUT", 60))
+    MAIL_BATCH_SIZE: int = int(os.environ.get("MAIL_BATCH_SIZE", 50))
+    MAIL_POLL_INTERVAL: int = int(os.environ.get("MAIL_POLL_INTERVAL", 5))
+    MAIL_SEND_LEASE: int = int(os.environ.get("MAIL_SEND_LEASE", 300))
+    MAIL_MAX_ATTEMPTS: int = int(os.environ.get("MAIL_MAX_ATTEMPTS", 6))
+    MAIL_RETRY_BASE_SECONDS: int = int(os.environ.get("MAIL_RETRY_BASE_SECONDS", 30))
+    # Token bucket per recipient domain: messages per second and burst size
+    MAIL_DOMAIN_RATE: float = float(os.environ.get("MAIL_DOMAIN_RATE", 2))
+    MAIL_DOMAIN_BURST: int = int(os.environ.get("MAIL_DOMAIN_BURST", 20))
+
+    # METRICS
+    # Served at /metrics, and written to this file on shutdown when set
+    METRICS_DUMP_FILE: str = os.environ.get("METRICS_DUMP_FILE", "")
+
     class Config:
         env_file = ".env"
 
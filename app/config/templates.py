@@ -0,0 +1,63 @@
+import time
+from pathlib import Path
+
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    select_autoescape,
+)
+
+from app.config.logger_config import logger
+from app.config.metrics import metrics
+from app.config.setting import get_settings
+
+settings = get_settings()
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+TEMPLATE_FOLDER = BASE_DIR / "templates"
+
+template_render_seconds = metrics.histogram(
+    "template_render_seconds", "Time to render a Jinja template", ("template",)
+)
+
+
+class TemplateRenderer:
+    """One Jinja environment for the PDF and email templates
+
+    Templates are compiled once and kept in the environment, and the
+    compiled bytecode is cached on disk so new workers skip parsing too.
+    Outside DEBUG the files are never checked for changes again.
+    """
+
+    def __init__(self, folder: Path, bytecode_folder: Path, auto_reload: bool):
+        bytecode_folder.mkdir(parents=True, exist_ok=True)
+        self.env = Environment(
+            loader=FileSystemLoader(folder),
+            bytecode_cache=FileSystemBytecodeCache(str(bytecode_folder)),
+            auto_reload=auto_reload,
+            autoescape=select_autoescape(["html", "xml"]),
+        )
+
+    def preload(self):
+        """Compile every template, called at startup"""
+
+        for name in self.env.list_templates(extensions=["html", "txt", "xml"]):
+            self.env.get_template(name)
+
+    def render(self, template_name: str, **context) -> str:
+        started = time.perf_counter()
+        content = self.env.get_template(template_name).render(**context)
+        elapsed = time.perf_counter() - started
+
+        template_render_seconds.observe(elapsed, template=template_name)
+        if elapsed > 0.5:
+            logger.info(f"Template {template_name} took {elapsed:.3f}s to render")
+        return content
+
+
+templates = TemplateRenderer(
+    TEMPLATE_FOLDER,
+    BASE_DIR / settings.TEMPLATE_CACHE_FOLDER,
+    auto_reload=settings.DEBUG,
+)
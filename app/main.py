@@ -1,19 +1,59 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
+from app.apis.collection.models import Collection
 from app.apis.collection.routes import collection_router
+from app.apis.hanger.models import Hanger
 from app.apis.hanger.routes import hanger_router
+from app.apis.media.routes import media_router
+from app.apis.sample.models import Sample
 from app.apis.sample.routes import sample_router
 from app.apis.user.routes import user_router
+from app.config.database import async_engine
+from app.config.metrics import metrics
 from app.config.middleware import LoggingMiddleware
+from app.config.permissions import role_registry
+from app.config.security import password_hasher
+from app.config.setting import get_settings
+from app.config.templates import templates
+from app.utils.derivatives import derivative_worker
+from app.utils.jobs import export_queue
+from app.utils.outbox import outbox_worker
+from app.utils.search import build_search_indexes
+from app.utils.storage import blob_cleanup
+
+settings = get_settings()
+
+
+@asynccontextmanager
+async def lifespan(application: FastAPI):
+    # Sync queries, kept off the event loop
+    await asyncio.to_thread(role_registry.refresh)
+    await build_search_indexes(Hanger, Sample, Collection)
+    templates.preload()
+    outbox_worker.start()
+    yield
+    await outbox_worker.stop()
+    password_hasher.shutdown()
+    derivative_worker.shutdown()
+    export_queue.shutdown()
+    blob_cleanup.shutdown()
+    await async_engine.dispose()
+    if settings.METRICS_DUMP_FILE:
+        metrics.dump(settings.METRICS_DUMP_FILE)
 
 
 def create_application():
-    application = FastAPI()
+    application = FastAPI(lifespan=lifespan)
     application.add_middleware(LoggingMiddleware)
     application.include_router(user_router, prefix="/api")
     application.include_router(collection_router, prefix="/api")
     application.include_router(hanger_router, prefix="/api")
     application.include_router(sample_router, prefix="/api")
+    application.include_router(media_router, prefix="/api")
     return application
 
 
@@ -23,3 +63,12 @@ app = create_application()
 @app.get("/")
 async def root():
     return {"message": "Hi, I am FastAPI"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Metrics of this worker in the Prometheus text format"""
+
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
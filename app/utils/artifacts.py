@@ -0,0 +1,153 @@
+import hashlib
+import os
+import threading
+from collections import Counter
+
+from app.config.logger_config import logger
+from app.config.metrics import metrics
+from app.config.setting import get_settings
+from app.utils.jobs import JobStatus
+
+settings = get_settings()
+
+pdf_render_seconds = metrics.histogram(
+    "pdf_render_seconds",
+    "Time WeasyPrint took to lay out and write one collection PDF",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+pdf_merge_seconds = metrics.histogram(
+    "pdf_merge_seconds",
+    "Time to merge collection PDFs into one export",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+
+class ArtifactCache:
+    """Rendered files on disk, addressed by a key and a content version
+
+    A new version of a key supersedes the older ones, which are removed as
+    soon as it is stored. Past max_bytes the least recently used files go
+    first, a hit refreshes the mtime of its file to mark it as used. Pinned
+    files are never removed, a queued job still has to read them.
+    """
+
+    def __init__(self, folder: str, max_bytes: int, suffix: str = ""):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._pins: Counter[str] = Counter()
+
+    def path_for(self, key: str, version: str) -> str:
+        return os.path.join(
+            self.folder, f"{self._digest(key)}.{self._digest(version)}{self.suffix}"
+        )
+
+    def get(self, key: str, version: str) -> str | None:
+        path = self.path_for(key, version)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def acquire(self, key: str, version: str) -> str | None:
+        """Like get, and pin the file until release is called with its path"""
+
+        path = self.path_for(key, version)
+        with self._lock:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                return None
+            self._pins[path] += 1
+        return path
+
+    def pin(self, path: str):
+        """Keep path, e.g. the output of a job still running, from eviction"""
+
+        with self._lock:
+            self._pins[path] += 1
+
+    def release(self, paths: list[str]):
+        with self._lock:
+            self._pins.subtract(paths)
+            for path in paths:
+                if self._pins[path] <= 0:
+                    del self._pins[path]
+
+    def store_when_done(self, key: str, version: str, release: list[str] = ()):
+        """Job callback recording the artifact a finished job rendered
+
+        Args:
+            release (list[str]): Pinned paths the job read, released once
+                it finished whatever its outcome
+        """
+
+        def callback(job):
+            if job.status == JobStatus.done:
+                self.stored(key, version)
+            if release:
+                self.release(release)
+
+        return callback
+
+    def stored(self, key: str, version: str):
+        """Drop the older versions of key, then evict down to max_bytes"""
+
+        current = self.path_for(key, version)
+        prefix = f"{self._digest(key)}."
+        with self._lock:
+            try:
+                entries = [
+                    entry
+                    for entry in os.scandir(self.folder)
+                    if entry.is_file() and entry.name.endswith(self.suffix)
+                ]
+            except FileNotFoundError:
+                return
+
+            files = []
+            for entry in entries:
+                if entry.path in self._pins:
+                    continue
+                if entry.name.startswith(prefix) and entry.path != current:
+                    self._remove(entry.path)
+                    continue
+                try:
+                    stat_result = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat_result.st_mtime, stat_result.st_size, entry.path))
+
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                if path == current:
+                    continue
+                self._remove(path)
+                total -= size
+
+    @staticmethod
+    def _digest(value: str) -> str:
+        return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Could not remove cached artifact {path}: {e}")
+
+
+pdf_artifacts = ArtifactCache(
+    settings.EXPORT_CACHE_FOLDER, settings.EXPORT_CACHE_MAX_BYTES, suffix=".pdf"
+)
+pdf_images = ArtifactCache(
+    os.path.join(settings.EXPORT_CACHE_FOLDER, "images"),
+    settings.PDF_IMAGE_CACHE_MAX_BYTES,
+    suffix=".jpg",
+)
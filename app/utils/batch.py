@@ -0,0 +1,111 @@
+from typing import Any
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.apis.utils.schema import BatchRequest
+from app.config.setting import get_settings
+from app.utils.search import apply_search
+
+settings = get_settings()
+
+
+async def batch_update(
+    model: Any,
+    data: BatchRequest,
+    values: dict,
+    session: AsyncSession,
+    columns: tuple = (),
+) -> tuple[dict, list]:
+    """Set values on the records picked by uuids or by a filter
+
+    Records are selected and updated BATCH_UPDATE_CHUNK_SIZE at a time with
+    one UPDATE ... WHERE id IN (...) each, in a single transaction the
+    caller commits. Deleted records are never touched. A filter needs at
+    least one of search_by, created_after and created_before, so an empty
+    request cannot update a whole table.
+
+    Args:
+        model (Any): Model with the CommonModel columns
+        data (BatchRequest): The uuids, or the filter
+        values (dict): Column values to set
+        session (AsyncSession): Session of the request, not committed here
+        columns (tuple): Extra columns to return for each updated record
+
+    Returns:
+        tuple[dict, list]: Counts and the uuids not found, and the updated
+            records as (id, uuid, *columns) rows
+    """
+
+    conditions = [model.is_delete == False]
+    if data.created_after:
+        conditions.append(model.created_at >= data.created_after)
+    if data.created_before:
+        conditions.append(model.created_at < data.created_before)
+    has_filter = len(conditions) > 1 or data.search_by
+
+    if data.uuids and has_filter:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Send either uuids or a filter, not both",
+        )
+    if not data.uuids and not has_filter:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Send the uuids or a filter of the records to change",
+        )
+    if data.search_by and not hasattr(model, "__search_columns__"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{model.__name__} records cannot be filtered by search_by",
+        )
+
+    query = select(model.id, model.uuid, *columns).filter(*conditions)
+    chunk_size = settings.BATCH_UPDATE_CHUNK_SIZE
+    updated, not_found = [], []
+
+    if data.uuids:
+        uuids = list(dict.fromkeys(data.uuids))
+        for start in range(0, len(uuids), chunk_size):
+            chunk = uuids[start : start + chunk_size]
+            rows = (await session.execute(query.filter(model.uuid.in_(chunk)))).all()
+            found = {row.uuid for row in rows}
+            not_found.extend(uuid for uuid in chunk if uuid not in found)
+            updated.extend(await _update_rows(model, rows, values, session))
+        requested = len(uuids)
+    else:
+        if data.search_by:
+            query, _ = await apply_search(query, model, data.search_by)
+        last_id = 0
+        while True:
+            rows = (
+                await session.execute(
+                    query.filter(model.id > last_id)
+                    .order_by(model.id)
+                    .limit(chunk_size)
+                )
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            updated.extend(await _update_rows(model, rows, values, session))
+        requested = len(updated)
+
+    return {
+        "requested": requested,
+        "updated": len(updated),
+        "not_found": not_found,
+    }, updated
+
+
+async def _update_rows(model: Any, rows: list, values: dict, session: AsyncSession):
+    if not rows:
+        return []
+    await session.execute(
+        update(model)
+        .where(model.id.in_([row.id for row in rows]), model.is_delete == False)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    return rows
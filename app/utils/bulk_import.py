@@ -0,0 +1,253 @@
+import asyncio
+import csv
+import io
+import os
+import zipfile
+from itertools import islice
+from typing import Any, AsyncIterator, Iterator
+
+from fastapi import HTTPException, UploadFile, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.logger_config import logger
+from app.utils.utility import uuid_id_cache
+
+
+class ImportReport:
+    """Counts of a bulk import and the errors of each rejected row"""
+
+    def __init__(self):
+        self.total_rows = 0
+        self.created = 0
+        self.errors: dict[int, list[str]] = {}
+
+    def fail(self, row_number: int, *messages: str):
+        self.errors.setdefault(row_number, []).extend(messages)
+
+    def as_dict(self) -> dict:
+        return {
+            "total_rows": self.total_rows,
+            "created": self.created,
+            "failed": len(self.errors),
+            "errors": [
+                {"row": row_number, "errors": messages}
+                for row_number, messages in sorted(self.errors.items())
+            ],
+        }
+
+
+async def iter_row_batches(
+    upload_file: UploadFile, batch_size: int
+) -> AsyncIterator[list[tuple[int, dict]]]:
+    """Read an uploaded CSV or XLSX file a batch of rows at a time
+
+    The file is parsed incrementally on a worker thread, so only one batch
+    is held in memory and the event loop never blocks on parsing. Header
+    names are lower cased with spaces turned into underscores, empty cells
+    become None.
+
+    Yields:
+        list[tuple[int, dict]]: Row number as shown in a spreadsheet, and
+            the row keyed by column name
+    """
+
+    extension = os.path.splitext(upload_file.filename or "")[1].lower()
+    if extension == ".csv":
+        rows = _iter_csv(upload_file.file)
+    elif extension == ".xlsx":
+        rows = _iter_xlsx(upload_file.file)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only .csv and .xlsx files can be imported",
+        )
+
+    last_row = 1
+    try:
+        while True:
+            try:
+                batch = await asyncio.to_thread(lambda: list(islice(rows, batch_size)))
+            except (UnicodeDecodeError, csv.Error, ValueError) as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Could not read the file after row {last_row}: {e}",
+                )
+            if not batch:
+                return
+            last_row = batch[-1][0]
+            yield batch
+    finally:
+        rows.close()
+
+
+def validate_row(model: type[BaseModel], row: dict) -> tuple[Any, list[str]]:
+    """Validate a row against a request schema
+
+    Returns:
+        tuple[BaseModel | None, list[str]]: The parsed row, or None and the
+            error messages
+    """
+
+    try:
+        return model(**{name: row.get(name) for name in model.model_fields}), []
+    except ValidationError as e:
+        return None, [
+            "{}: {}".format(
+                ".".join(str(part) for part in error["loc"]),
+                "Field required" if error["input"] is None else error["msg"],
+            )
+            for error in e.errors()
+        ]
+
+
+async def resolve_ids(
+    model: Any, uuids, ids: dict[str, int | None], session: AsyncSession
+):
+    """Add the ids of uuids not resolved yet to ids
+
+    ids is kept for the whole import, so a uuid repeated across batches is
+    looked up once. Unknown or deleted uuids map to None.
+    """
+
+    new_uuids = {uuid for uuid in uuids if uuid and uuid not in ids}
+    if new_uuids:
+        ids.update(await uuid_id_cache.resolve(model, new_uuids, session))
+
+
+async def insert_rows(
+    model: Any,
+    rows: list[tuple[int, dict]],
+    report: ImportReport,
+    session: AsyncSession,
+) -> list[int]:
+    """Insert rows with one multi-row INSERT, the caller commits
+
+    Should another request insert a conflicting row in the meantime, the
+    rows are inserted one by one instead, and the ones the database rejects
+    are reported. Both run in a savepoint, so rows inserted earlier in the
+    transaction are kept.
+
+    Returns:
+        list[int]: Row numbers the database rejected
+    """
+
+    if not rows:
+        return []
+    # A multi-row VALUES takes its columns from the first row, so every row
+    # needs the same keys
+    columns = dict.fromkeys(key for _, values in rows for key in values)
+    rows = [
+        (row_number, {column: values.get(column) for column in columns})
+        for row_number, values in rows
+    ]
+    rejected = []
+    try:
+        async with session.begin_nested():
+            await session.execute(insert(model).values([values for _, values in rows]))
+        report.created += len(rows)
+    except IntegrityError:
+        for row_number, values in rows:
+            try:
+                async with session.begin_nested():
+                    await session.execute(insert(model).values(values))
+            except IntegrityError as e:
+                logger.info(f"Import row {row_number} rejected: {e.orig}")
+                report.fail(row_number, "Conflicts with an existing record")
+                rejected.append(row_number)
+                continue
+            report.created += 1
+    return rejected
+
+
+class ImageArchive:
+    """Images of a bulk import, uploaded together as a zip file
+
+    Rows name their image by file name, matched case insensitively against
+    the file names in the archive whatever folder they are in.
+    """
+
+    def __init__(self, upload_file: UploadFile):
+        try:
+            self.archive = zipfile.ZipFile(upload_file.file)
+        except (zipfile.BadZipFile, OSError) as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Images must be uploaded as a valid zip file ({e})",
+            )
+        self.members = {
+            os.path.basename(info.filename).lower(): info
+            for info in self.archive.infolist()
+            if not info.is_dir() and not os.path.basename(info.filename).startswith(".")
+        }
+
+    def __contains__(self, filename: str) -> bool:
+        return os.path.basename(filename).lower() in self.members
+
+    def open(self, filename: str) -> UploadFile:
+        """The image as an UploadFile, for save_file"""
+
+        info = self.members[os.path.basename(filename).lower()]
+        return UploadFile(
+            self.archive.open(info),
+            size=info.file_size,
+            filename=os.path.basename(info.filename),
+        )
+
+    def close(self):
+        self.archive.close()
+
+
+def _iter_csv(file) -> Iterator[tuple[int, dict]]:
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.reader(text)
+        header = _normalize_header(next(reader, []))
+        for row_number, values in enumerate(reader, start=2):
+            yield from _to_row(row_number, header, values)
+    finally:
+        # Leave the upload file open, FastAPI closes it
+        text.detach()
+
+
+def _iter_xlsx(file) -> Iterator[tuple[int, dict]]:
+    from openpyxl import load_workbook
+
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except Exception as e:
+        raise ValueError(f"Not a valid XLSX file ({e})")
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = _normalize_header(next(rows, ()))
+        for row_number, values in enumerate(rows, start=2):
+            yield from _to_row(row_number, header, [_cell_text(v) for v in values])
+    finally:
+        workbook.close()
+
+
+def _normalize_header(header) -> list[str]:
+    return [
+        str(name or "").strip().lower().replace(" ", "_").replace("-", "_")
+        for name in header
+    ]
+
+
+def _to_row(row_number: int, header: list[str], values: list) -> Iterator:
+    row = {
+        name: value.strip() or None
+        for name, value in zip(header, values)
+        if name and value is not None
+    }
+    if any(value is not None for value in row.values()):
+        yield row_number, row
+
+
+def _cell_text(value) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
@@ -0,0 +1,105 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any
+
+from fastapi import Request, Response, status
+from sqlalchemy import Select
+
+from app.utils.utility import convert_to_indian_timezone
+
+# Suffix of the columns with_modified_at adds to a select
+MODIFIED_AT = "_modified_at"
+
+
+def with_modified_at(query: Select, *models) -> Select:
+    """Add the modified_at of each model to a select, for get_validators"""
+
+    return query.add_columns(
+        *(
+            model.modified_at.label(f"{model.__tablename__}{MODIFIED_AT}")
+            for model in models
+        )
+    )
+
+
+def get_validators(rows: Any, signature: str) -> tuple[str, str | None]:
+    """Weak ETag and Last-Modified of a result set
+
+    Both come from the latest modified_at among the rows, over every joined
+    table, and the number of rows, so no second query is needed. A soft
+    delete takes its row out of the set and changes the count. The ETag
+    keeps the full precision, HTTP dates only have whole seconds and two
+    edits within one second would otherwise share it.
+
+    Args:
+        rows (Any): Rows, or a single row, of a select with_modified_at
+        signature (str): request_signature, so other pages or filters with
+            the same rows never share an ETag
+
+    Returns:
+        tuple[str, str | None]: ETag, and Last-Modified as an HTTP date
+    """
+
+    rows = rows if isinstance(rows, list) else [rows]
+    modified = [
+        value
+        for row in rows
+        for name, value in row._mapping.items()
+        if name.endswith(MODIFIED_AT) and isinstance(value, datetime)
+    ]
+    last_modified = max(map(_to_utc, modified), default=None)
+
+    payload = f"{signature}:{last_modified and last_modified.isoformat()}:{len(rows)}"
+    etag = f'W/"{hashlib.sha256(payload.encode()).hexdigest()[:32]}"'
+    if last_modified is None:
+        return etag, None
+    return etag, format_datetime(last_modified.replace(microsecond=0), usegmt=True)
+
+
+def conditional_response(
+    request: Request,
+    response: Response,
+    body: Any,
+    etag: str,
+    last_modified: str | None,
+    next_cursor: str | None = None,
+):
+    """Return body with its validators, or an empty 304 when the client has it
+
+    If-None-Match wins over If-Modified-Since, as in RFC 9110.
+    """
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+
+    if _is_not_modified(request, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return body
+
+
+def _is_not_modified(request: Request, etag: str, last_modified: str | None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, W/ prefixes are ignored
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(
+            if_modified_since
+        )
+    except (TypeError, ValueError):
+        return False
+
+
+def _to_utc(value: datetime) -> datetime:
+    # Stored without a zone in Indian time
+    return convert_to_indian_timezone(value).astimezone(timezone.utc)
@@ -0,0 +1,270 @@
+import hashlib
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+from sqlalchemy import Select, event, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+
+from app.config.database import SessionLocal
+from app.config.logger_config import logger
+from app.config.setting import get_settings
+from app.utils.storage import get_object_path
+
+settings = get_settings()
+
+THUMBNAIL = "thumbnail"
+MEDIUM = "medium"
+
+# Largest first, so each rendition is resized from the previous one
+RENDITIONS = {
+    MEDIUM: settings.MEDIUM_IMAGE_SIZE,
+    THUMBNAIL: settings.THUMBNAIL_SIZE,
+}
+
+RENDITION_EXTENSIONS = {"WEBP": ".webp", "JPEG": ".jpg"}
+
+
+def schedule_derivatives(session, document_id: int):
+    """Generate the renditions of a document once the session commits"""
+
+    session.info.setdefault("pending_derivatives", []).append(document_id)
+
+
+def outerjoin_rendition(query: Select, image_id_column, rendition: str = THUMBNAIL):
+    """Add the file_path of an image rendition to a select as <rendition>_url
+
+    Its modified_at comes along as <rendition>_document_modified_at.
+
+    Args:
+        query (Select): Select holding image_id_column
+        image_id_column (Column): DocumentMaster id of the original image
+        rendition (str): THUMBNAIL or MEDIUM
+
+    Returns:
+        Select: Select with the extra column, None until the worker made it
+    """
+
+    from app.apis.utils.models import DocumentMaster
+
+    derived = aliased(DocumentMaster, name=f"{rendition}_document")
+    return query.outerjoin(
+        derived,
+        (derived.parent_id == image_id_column)
+        & (derived.rendition == rendition)
+        & (derived.is_delete == False),
+    ).add_columns(
+        derived.file_path.label(f"{rendition}_url"),
+        # A rendition made after the response was cached changes its ETag
+        derived.modified_at.label(f"{rendition}_document_modified_at"),
+    )
+
+
+class DerivativeWorker:
+    """Renders image renditions on a small thread pool after uploads commit
+
+    Pillow releases the GIL while decoding, resizing and encoding, so a few
+    threads keep up with uploads without touching the event loop. Each
+    rendition is stored through the blob store, and a document whose
+    content was rendered before reuses the existing rendition blobs.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._in_flight: set[int] = set()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="derivatives"
+        )
+
+    def submit(self, document_ids: list[int]):
+        for document_id in document_ids:
+            with self._lock:
+                if document_id in self._in_flight:
+                    continue
+                self._in_flight.add(document_id)
+            self._executor.submit(self._run, document_id)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, document_id: int):
+        try:
+            with SessionLocal() as session:
+                generate_derivatives(document_id, session)
+        except Exception as e:
+            logger.error(f"Derivatives of document {document_id} failed: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(document_id)
+
+
+derivative_worker = DerivativeWorker(settings.DERIVATIVE_WORKERS)
+
+
+def generate_derivatives(document_id: int, session: Session):
+    """Create the missing renditions of an image document
+
+    Args:
+        document_id (int): DocumentMaster id of the original upload
+        session (Session): Sync session, committed here
+    """
+
+    from app.apis.utils.models import DocumentMaster
+
+    document = session.get(DocumentMaster, document_id)
+    if document is None or document.is_delete or document.parent_id is not None:
+        return
+
+    existing = set(
+        session.scalars(
+            select(DocumentMaster.rendition).filter(
+                DocumentMaster.parent_id == document.id
+            )
+        )
+    )
+    missing = [name for name in RENDITIONS if name not in existing]
+    if not missing:
+        return
+
+    image = None
+    try:
+        for name in missing:
+            blob = _reference_existing_rendition(document, name, session)
+            if blob is None:
+                if image is None:
+                    image = _open_image(document.actual_path)
+                    if image is None:
+                        return
+                image.thumbnail((RENDITIONS[name], RENDITIONS[name]))
+                blob = _store_rendition(image, session)
+
+            stem = os.path.splitext(document.document_name or "image")[0]
+            session.add(
+                DocumentMaster(
+                    document_name=f"{stem}-{name}{os.path.splitext(blob.storage_path)[1]}",
+                    file_path=blob.storage_path,
+                    entity_type=f"{document.entity_type}-{name.upper()}",
+                    actual_path=os.path.abspath(blob.storage_path),
+                    checksum=blob.checksum,
+                    file_size=blob.file_size,
+                    blob_id=blob.id,
+                    parent_id=document.id,
+                    rendition=name,
+                )
+            )
+        session.commit()
+        logger.info(f"Renditions {missing} created for document {document.id}")
+
+    except IntegrityError:
+        # Another worker created them in the meantime
+        session.rollback()
+
+    finally:
+        if image is not None:
+            image.close()
+
+
+def _open_image(path: str) -> Image.Image | None:
+    try:
+        with Image.open(path) as source:
+            image = ImageOps.exif_transpose(source)
+    except (OSError, UnidentifiedImageError) as e:
+        logger.info(f"No renditions for {path}: {e}")
+        return None
+
+    if settings.RENDITION_FORMAT == "JPEG" and image.mode != "RGB":
+        return image.convert("RGB")
+    if image.mode not in ("RGB", "RGBA"):
+        return image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    return image
+
+
+def _reference_existing_rendition(document, name: str, session: Session):
+    """Reuse the rendition of another document with the same content"""
+
+    from app.apis.utils.models import DocumentBlob, DocumentMaster
+
+    if document.blob_id is None:
+        return None
+
+    original = aliased(DocumentMaster)
+    blob_id = session.scalar(
+        select(DocumentMaster.blob_id)
+        .join(original, original.id == DocumentMaster.parent_id)
+        .filter(
+            original.blob_id == document.blob_id,
+            DocumentMaster.rendition == name,
+            DocumentMaster.is_delete == False,
+        )
+        .limit(1)
+    )
+    if blob_id is None:
+        return None
+    return _increment_blob(DocumentBlob.id == blob_id, session)
+
+
+def _store_rendition(image: Image.Image, session: Session):
+    from app.apis.utils.models import DocumentBlob
+
+    buffer = BytesIO()
+    image.save(
+        buffer,
+        format=settings.RENDITION_FORMAT,
+        quality=settings.RENDITION_QUALITY,
+    )
+    data = buffer.getvalue()
+    checksum = hashlib.sha256(data).hexdigest()
+
+    blob = _increment_blob(DocumentBlob.checksum == checksum, session)
+    if blob is None:
+        blob = DocumentBlob(
+            checksum=checksum,
+            storage_path=get_object_path(
+                checksum, RENDITION_EXTENSIONS.get(settings.RENDITION_FORMAT, "")
+            ),
+            file_size=len(data),
+            ref_count=1,
+        )
+        session.add(blob)
+        session.flush([blob])
+
+    if not os.path.exists(blob.storage_path):
+        os.makedirs(os.path.dirname(blob.storage_path), exist_ok=True)
+        temp_path = f"{blob.storage_path}.{uuid.uuid4().hex}.part"
+        with open(temp_path, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, blob.storage_path)
+    return blob
+
+
+def _increment_blob(criterion, session: Session):
+    from app.apis.utils.models import DocumentBlob
+
+    result = session.execute(
+        update(DocumentBlob)
+        .where(criterion)
+        .values(ref_count=DocumentBlob.ref_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if not result.rowcount:
+        return None
+    return session.scalar(
+        select(DocumentBlob).filter(criterion).execution_options(populate_existing=True)
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _submit_derivatives(session):
+    document_ids = session.info.pop("pending_derivatives", None)
+    if document_ids:
+        derivative_worker.submit(document_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_derivatives(session):
+    session.info.pop("pending_derivatives", None)
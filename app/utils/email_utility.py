@@ -1,9 +1,9 @@
 from email.mime.application import MIMEApplication
-from pathlib import Path
 from fastapi_mail import ConnectionConfig, FastMail, MessageSchema, MessageType
 from pydantic import BaseModel, EmailStr
 
 from app.config.setting import get_settings
+from app.config.templates import TEMPLATE_FOLDER, templates
 
 
 settings = get_settings()
@@ -17,7 +17,7 @@ EMAIL_CONFIF = ConnectionConfig(
     MAIL_SERVER=settings.MAIL_SERVER,
     MAIL_STARTTLS=settings.MAIL_STARTTLS,
     MAIL_SSL_TLS=settings.MAIL_SSL_TLS,
-    TEMPLATE_FOLDER=Path(__file__).resolve().parent.parent.parent / 'templates'
+    TEMPLATE_FOLDER=TEMPLATE_FOLDER
 )
 
 
@@ -45,15 +45,18 @@ async def send_email(email_request: EmailRequest):
     fm = FastMail(EMAIL_CONFIF)
 
     if email_request.template_body:
+        # Rendered through the shared environment, FastMail would build a
+        # new one and parse the template again on every send
         message = MessageSchema(
             subject=email_request.subject,
             recipients=[email_request.to_email],
-            template_body=email_request.template_body,
+            body=templates.render(
+                email_request.template_name, **email_request.template_body),
             subtype=MessageType.html,
             attachments=attachments
         )
         try:
-            await fm.send_message(message, template_name=email_request.template_name)
+            await fm.send_message(message)
         except Exception as e:
             raise e
     else:
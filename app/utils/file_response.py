@@ -0,0 +1,86 @@
+import os
+
+import aiofiles
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.config.setting import get_settings
+
+settings = get_settings()
+
+
+class RangeFileResponse(Response):
+    """Send a byte range of a file, with zero-copy sendfile when available
+
+    Servers implementing the ASGI "http.response.zerocopysend" extension get
+    an open file descriptor and let the kernel copy the bytes to the socket.
+    Elsewhere the range is streamed in UPLOAD_CHUNK_SIZE chunks.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        start: int,
+        end: int,
+        status_code: int = 200,
+        headers: dict | None = None,
+        media_type: str | None = None,
+    ):
+        self.path = path
+        self.start = start
+        self.end = end  # Inclusive, like Content-Range
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.body = b""
+        self.init_headers(headers)
+        self.headers["content-length"] = str(max(end - start + 1, 0))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        count = self.end - self.start + 1
+        if scope["method"].upper() == "HEAD" or count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            fd = os.open(self.path, os.O_RDONLY)
+            try:
+                await send(
+                    {
+                        "type": "http.response.zerocopysend",
+                        "file": fd,
+                        "offset": self.start,
+                        "count": count,
+                    }
+                )
+            finally:
+                os.close(fd)
+            return
+
+        async with aiofiles.open(self.path, "rb") as file:
+            await file.seek(self.start)
+            remaining = count
+            while remaining > 0:
+                chunk = await file.read(min(settings.UPLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    }
+                )
+            if remaining > 0:
+                # The file shrank underneath us, end the response anyway
+                await send(
+                    {"type": "http.response.body", "body": b"", "more_body": False}
+                )
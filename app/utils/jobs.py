@@ -0,0 +1,288 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from enum import Enum
+from logging.handlers import QueueListener
+from typing import Callable
+
+from app.config.logger_config import file_handler, forward_to_parent, logger
+from app.config.metrics import Histogram, metrics
+from app.config.setting import get_settings
+
+settings = get_settings()
+
+export_job_duration_seconds = metrics.histogram(
+    "export_job_duration_seconds",
+    "Time a successful job ran in a pool worker, PDF renders among them",
+    ("function",),
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+export_jobs_total = metrics.counter(
+    "export_jobs_total",
+    "Jobs sent to the process pool, by outcome",
+    ("function", "status"),
+)
+
+
+class JobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+
+@dataclass
+class Job:
+    id: str
+    key: str
+    output_path: str
+    status: JobStatus = JobStatus.queued
+    created_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+    error: str | None = None
+    owns_output: bool = True
+    on_done: Callable[["Job"], None] | None = field(default=None, repr=False)
+    timer: Histogram | None = field(default=None, repr=False)
+    future: Future | None = field(default=None, repr=False)
+    call: tuple | None = field(default=None, repr=False)
+    waiting_on: set[str] = field(default_factory=set, repr=False)
+    dependents: list["Job"] = field(default_factory=list, repr=False)
+
+    def as_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status.value,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+def run_timed(func, *args):
+    """Run func in a pool worker and also return how long it took"""
+
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+class JobQueue:
+    """Runs CPU bound jobs on a process pool and keeps their results on disk
+
+    This is a local stand-in for a real task queue: jobs live in this
+    process only, so the status and download requests of a job have to
+    reach the worker that accepted it. Submitting a key that is already
+    queued or running returns the existing job, so identical requests
+    coalesce onto one render. A job can wait for other jobs, it is only
+    sent to the pool once they are all done. Finished jobs and their files
+    are dropped after job_ttl seconds.
+    """
+
+    def __init__(self, workers: int, output_folder: str, job_ttl: int):
+        self.workers = workers
+        self.output_folder = output_folder
+        self.job_ttl = job_ttl
+        self._lock = threading.Lock()
+        self._jobs: dict[str, Job] = {}
+        self._active: dict[str, str] = {}  # key -> id of the queued/running job
+        self._executor: ProcessPoolExecutor | None = None
+        self._log_queue: multiprocessing.Queue | None = None
+
+    def submit(
+        self,
+        key: str,
+        func,
+        *args,
+        suffix: str = "",
+        output_path: str | None = None,
+        on_done: Callable[[Job], None] | None = None,
+        depends_on: list[Job] | None = None,
+        timer: Histogram | None = None,
+    ) -> Job:
+        """Queue func(*args, output_path) unless the same key is in flight
+
+        Args:
+            key (str): Identifies identical requests
+            func (Callable): Picklable, module level callable
+            suffix (str): Extension of the output file
+            output_path (str | None): Write there instead of output_folder,
+                the file then outlives the job
+            on_done (Callable | None): Called with the job once it finished
+            depends_on (list[Job] | None): Jobs that must be done first, the
+                job fails without running when one of them fails
+            timer (Histogram | None): Also gets the run time of a successful
+                job, next to export_job_duration_seconds
+
+        Returns:
+            Job: The new job, or the one already working on key
+        """
+
+        self._prune()
+        with self._lock:
+            job_id = self._active.get(key)
+            if job_id is not None:
+                return self._jobs[job_id]
+
+            job_id = uuid.uuid4().hex
+            job = Job(
+                id=job_id,
+                key=key,
+                output_path=output_path
+                or os.path.join(self.output_folder, f"{job_id}{suffix}"),
+                owns_output=output_path is None,
+                on_done=on_done,
+                timer=timer,
+            )
+            job.call = (func, args)
+            self._jobs[job_id] = job
+            self._active[key] = job_id
+
+            dependency_failed = False
+            for dependency in depends_on or []:
+                if dependency.finished_at is None:
+                    job.waiting_on.add(dependency.id)
+                    dependency.dependents.append(job)
+                elif dependency.status == JobStatus.failed:
+                    dependency_failed = True
+
+        if dependency_failed:
+            self._complete(job, JobStatus.failed, "A job it depends on failed")
+        elif not job.waiting_on:
+            self._dispatch(job)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        self._prune()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if (
+                job is not None
+                and job.status == JobStatus.queued
+                and job.future is not None
+                and job.future.running()
+            ):
+                job.status = JobStatus.running
+            return job
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Forking a process that runs an event loop and thread pools can
+            # deadlock in the child, spawned workers start clean
+            context = multiprocessing.get_context("spawn")
+            if self._log_queue is None:
+                # Records of the workers are written by this process, on a
+                # daemon thread that lives as long as the app
+                self._log_queue = context.Queue()
+                QueueListener(
+                    self._log_queue, file_handler, respect_handler_level=True
+                ).start()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=forward_to_parent,
+                initargs=(self._log_queue,),
+            )
+        return self._executor
+
+    def _dispatch(self, job: Job):
+        func, args = job.call
+        function = getattr(func, "__name__", "job")
+        try:
+            with self._lock:
+                try:
+                    future = self._get_executor().submit(
+                        run_timed, func, *args, job.output_path
+                    )
+                except BrokenProcessPool:
+                    # A worker died, start a fresh pool for this and later jobs
+                    self._executor = None
+                    future = self._get_executor().submit(
+                        run_timed, func, *args, job.output_path
+                    )
+                job.future = future
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.key}) could not be queued: {e}")
+            self._complete(job, JobStatus.failed, "Could not be queued")
+            return
+
+        # Outside the lock, the callback runs right here if the job is done
+        future.add_done_callback(lambda future: self._finish(job, future, function))
+
+    def _finish(self, job: Job, future: Future, function: str):
+        if future.cancelled():
+            export_jobs_total.inc(function=function, status="cancelled")
+            self._complete(job, JobStatus.failed, "Cancelled")
+        elif future.exception() is not None:
+            export_jobs_total.inc(function=function, status=JobStatus.failed.value)
+            logger.error(f"Job {job.id} ({job.key}) failed: {future.exception()}")
+            self._complete(job, JobStatus.failed, "Rendering failed")
+        else:
+            _, elapsed = future.result()
+            export_jobs_total.inc(function=function, status=JobStatus.done.value)
+            export_job_duration_seconds.observe(elapsed, function=function)
+            if job.timer is not None:
+                job.timer.observe(elapsed)
+            self._complete(job, JobStatus.done)
+
+    def _complete(self, job: Job, status: JobStatus, error: str | None = None):
+        ready, failed = [], []
+        with self._lock:
+            if job.finished_at is not None:
+                return
+            job.status, job.error = status, error
+            job.finished_at = time.time()
+            job.call = None
+            if self._active.get(job.key) == job.id:
+                del self._active[job.key]
+
+            for dependent in job.dependents:
+                dependent.waiting_on.discard(job.id)
+                if dependent.finished_at is not None:
+                    continue
+                if status == JobStatus.failed:
+                    failed.append(dependent)
+                elif not dependent.waiting_on:
+                    ready.append(dependent)
+            job.dependents = []
+
+        if job.on_done is not None:
+            try:
+                job.on_done(job)
+            except Exception as e:
+                logger.error(f"Job {job.id} ({job.key}) callback failed: {e}")
+
+        for dependent in failed:
+            self._complete(dependent, JobStatus.failed, "A job it depends on failed")
+        for dependent in ready:
+            self._dispatch(dependent)
+
+    def _prune(self):
+        expired = []
+        with self._lock:
+            now = time.time()
+            for job_id, job in list(self._jobs.items()):
+                if job.finished_at is not None and now - job.finished_at > self.job_ttl:
+                    expired.append(self._jobs.pop(job_id))
+        for job in expired:
+            if not job.owns_output:
+                continue
+            try:
+                os.remove(job.output_path)
+            except FileNotFoundError:
+                pass
+
+
+export_queue = JobQueue(
+    settings.EXPORT_WORKERS, settings.EXPORT_FOLDER, settings.EXPORT_JOB_TTL
+)
@@ -0,0 +1,370 @@
+import asyncio
+import os
+import random
+import time
+import uuid
+from datetime import timedelta
+from email.message import EmailMessage
+from email.utils import formataddr, formatdate
+
+from aiosmtplib import (
+    SMTP,
+    SMTPAuthenticationError,
+    SMTPException,
+    SMTPRecipientsRefused,
+    SMTPResponseException,
+    SMTPServerDisconnected,
+)
+from fastapi_mail import ConnectionConfig
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config.logger_config import logger
+from app.config.setting import get_settings
+from app.config.templates import templates
+from app.utils.email_utility import EMAIL_CONFIF, EmailRequest
+from app.utils.utility import get_current_indian_time
+
+settings = get_settings()
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+
+async def queue_email(email_request: EmailRequest, session: AsyncSession):
+    """Add an email to the outbox, it is sent after the session commits
+
+    Templates are rendered now, so the outbox holds the final message.
+    """
+
+    from app.apis.utils.models import EmailOutbox
+
+    if email_request.attachments:
+        raise ValueError("The outbox does not store attachments, use send_email")
+
+    if email_request.template_body:
+        body = templates.render(
+            email_request.template_name, **email_request.template_body
+        )
+        is_html = True
+    else:
+        body, is_html = email_request.body, email_request.is_html
+
+    session.add(
+        EmailOutbox(
+            to_email=email_request.to_email,
+            subject=email_request.subject,
+            body=body,
+            is_html=is_html,
+            status=PENDING,
+            attempts=0,
+            next_attempt_at=get_current_indian_time(),
+        )
+    )
+    session.info["outbox_pending"] = True
+
+
+class SMTPTransport:
+    """Sends through a small pool of open, logged in SMTP connections
+
+    A burst of messages shares the same few TLS sessions instead of
+    handshaking once per message. Connections idle for longer than
+    idle_timeout are closed before the server drops them.
+    """
+
+    def __init__(self, config: ConnectionConfig, size: int, idle_timeout: float):
+        self.config = config
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle: list[tuple[SMTP, float]] = []
+        self._slots: asyncio.Semaphore | None = None
+
+    async def send(self, message: EmailMessage):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        async with self._slots:
+            client = await self._acquire()
+            try:
+                try:
+                    await client.send_message(message)
+                except SMTPServerDisconnected:
+                    # The server dropped the pooled connection, reconnect once
+                    await self._quit(client)
+                    client = await self._connect()
+                    await client.send_message(message)
+            except BaseException:
+                await self._quit(client)
+                raise
+            self._idle.append((client, time.monotonic()))
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for client, _ in idle:
+            await self._quit(client)
+
+    async def _acquire(self) -> SMTP:
+        while self._idle:
+            client, last_used = self._idle.pop()
+            if client.is_connected and time.monotonic() - last_used < self.idle_timeout:
+                return client
+            await self._quit(client)
+        return await self._connect()
+
+    async def _connect(self) -> SMTP:
+        credentials = {}
+        if self.config.USE_CREDENTIALS:
+            credentials = {
+                "username": self.config.MAIL_USERNAME,
+                "password": self.config.MAIL_PASSWORD,
+            }
+        client = SMTP(
+            hostname=self.config.MAIL_SERVER,
+            port=self.config.MAIL_PORT,
+            use_tls=self.config.MAIL_SSL_TLS,
+            start_tls=self.config.MAIL_STARTTLS,
+            validate_certs=self.config.VALIDATE_CERTS,
+            timeout=self.config.TIMEOUT,
+            **credentials,
+        )
+        await client.connect()
+        return client
+
+    @staticmethod
+    async def _quit(client: SMTP):
+        try:
+            if client.is_connected:
+                await client.quit()
+        except (SMTPException, OSError):
+            client.close()
+
+
+class FileTransport:
+    """Writes each message as an .eml file, a local stand-in for SMTP"""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+
+    async def send(self, message: EmailMessage):
+        await asyncio.to_thread(self._write, message)
+
+    async def close(self):
+        pass
+
+    def _write(self, message: EmailMessage):
+        os.makedirs(self.folder, exist_ok=True)
+        name = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}.eml"
+        temp_path = os.path.join(self.folder, f".{name}.part")
+        with open(temp_path, "wb") as file:
+            file.write(message.as_bytes())
+        os.replace(temp_path, os.path.join(self.folder, name))
+
+
+class DomainRateLimiter:
+    """Token bucket per recipient domain"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: dict[str, tuple[float, float]] = {}  # tokens, updated at
+
+    def acquire(self, domain: str) -> float:
+        """Take a token for domain
+
+        Returns:
+            float: 0 when a token was taken, else seconds until one is free
+        """
+
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(domain, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        if tokens >= 1:
+            self._buckets[domain] = (tokens - 1, now)
+            return 0
+        self._buckets[domain] = (tokens, now)
+        return (1 - tokens) / self.rate
+
+
+class OutboxWorker:
+    """Delivers the email outbox from a task on the event loop
+
+    Due emails are claimed by stamping a claim_token and moving
+    next_attempt_at forward by the lease, so several API workers can share
+    one outbox and emails claimed by a worker that died are retried once
+    the lease runs out. Failed deliveries back off exponentially, permanent
+    SMTP rejections fail the email right away.
+    """
+
+    def __init__(self, transport, rate_limiter: DomainRateLimiter):
+        self.transport = transport
+        self.rate_limiter = rate_limiter
+        self._task: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="email-outbox")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.transport.close()
+
+    def wake(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                claimed = await self.process_batch()
+            except Exception as e:
+                logger.error(f"Email outbox failed: {e}")
+                claimed = 0
+            if claimed < settings.MAIL_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(
+                        self._wake.wait(), timeout=settings.MAIL_POLL_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+    async def process_batch(self) -> int:
+        """Claim and deliver one batch of due emails
+
+        Returns:
+            int: Number of emails claimed
+        """
+
+        from app.config.database import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as session:
+            emails = await self._claim(session)
+            if emails:
+                await asyncio.gather(*(self._deliver(email) for email in emails))
+                await session.commit()
+            return len(emails)
+
+    async def _claim(self, session: AsyncSession) -> list:
+        from app.apis.utils.models import EmailOutbox
+
+        now = get_current_indian_time()
+        due = (
+            EmailOutbox.status == PENDING,
+            EmailOutbox.next_attempt_at <= now,
+        )
+        email_ids = (
+            await session.scalars(
+                select(EmailOutbox.id)
+                .filter(*due)
+                .order_by(EmailOutbox.next_attempt_at)
+                .limit(settings.MAIL_BATCH_SIZE)
+            )
+        ).all()
+        if not email_ids:
+            return []
+
+        # Re-checking the due condition lets only one worker claim each row
+        claim_token = uuid.uuid4().hex
+        await session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(email_ids), *due)
+            .values(
+                claim_token=claim_token,
+                next_attempt_at=now + timedelta(seconds=settings.MAIL_SEND_LEASE),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return (
+            await session.scalars(
+                select(EmailOutbox).filter(EmailOutbox.claim_token == claim_token)
+            )
+        ).all()
+
+    async def _deliver(self, email):
+        now = get_current_indian_time()
+        domain = email.to_email.rpartition("@")[2].lower()
+        wait = self.rate_limiter.acquire(domain)
+        if wait:
+            # Over the rate of its domain, not a failed attempt
+            email.next_attempt_at = now + timedelta(seconds=wait)
+            email.claim_token = None
+            return
+
+        try:
+            await self.transport.send(self._build_message(email))
+        except Exception as e:
+            email.attempts += 1
+            email.claim_token = None
+            email.last_error = str(e)[:1000]
+            if self._is_permanent(e) or email.attempts >= settings.MAIL_MAX_ATTEMPTS:
+                email.status = FAILED
+                logger.error(f"Email {email.uuid} to {email.to_email} failed: {e}")
+            else:
+                delay = settings.MAIL_RETRY_BASE_SECONDS * 2 ** (email.attempts - 1)
+                delay = min(delay, 60 * 60) * random.uniform(0.8, 1.2)
+                email.next_attempt_at = now + timedelta(seconds=delay)
+            return
+
+        email.attempts += 1
+        email.status = SENT
+        email.sent_at = now
+        email.claim_token = None
+        email.last_error = None
+
+    @staticmethod
+    def _build_message(email) -> EmailMessage:
+        sender = EMAIL_CONFIF.MAIL_FROM
+        message = EmailMessage()
+        message["From"] = formataddr((EMAIL_CONFIF.MAIL_FROM_NAME or "", sender))
+        message["To"] = email.to_email
+        message["Subject"] = email.subject
+        message["Date"] = formatdate(localtime=True)
+        # Stable across retries, so receivers can drop duplicates
+        message["Message-ID"] = f"<{email.uuid}@{sender.rpartition('@')[2]}>"
+        message.set_content(email.body, subtype="html" if email.is_html else "plain")
+        return message
+
+    @staticmethod
+    def _is_permanent(error: Exception) -> bool:
+        if isinstance(error, SMTPRecipientsRefused):
+            return all(500 <= recipient.code < 600 for recipient in error.recipients)
+        if isinstance(error, SMTPAuthenticationError):
+            # Fixed by correcting the credentials, keep the email until then
+            return False
+        return isinstance(error, SMTPResponseException) and 500 <= error.code < 600
+
+
+def _get_transport():
+    if settings.MAIL_BACKEND == "file":
+        return FileTransport(settings.MAIL_SPOOL_FOLDER)
+    return SMTPTransport(
+        EMAIL_CONFIF, settings.MAIL_POOL_SIZE, settings.MAIL_POOL_IDLE_TIMEOUT
+    )
+
+
+outbox_worker = OutboxWorker(
+    _get_transport(),
+    DomainRateLimiter(settings.MAIL_DOMAIN_RATE, settings.MAIL_DOMAIN_BURST),
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_outbox(session):
+    if session.info.pop("outbox_pending", None):
+        outbox_worker.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_outbox(session):
+    session.info.pop("outbox_pending", None)
@@ -0,0 +1,178 @@
+import base64
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any
+
+from fastapi import HTTPException, status
+from sqlalchemy import DateTime, Select, and_, asc, desc, false, or_
+
+CURSOR_LABEL_PREFIX = "cursor_"
+
+
+def get_sort_keys(model: Any, sort_by: list[Enum] | None) -> list[tuple[str, Any, bool]]:
+    """Build the ordered sort keys for a model, with id as the final tiebreaker
+
+    Args:
+        model (Any): SQLAlchemy model the sort fields belong to
+        sort_by (list[Enum]): Sort enums, a "-" prefix means descending
+
+    Returns:
+        list[tuple[str, Any, bool]]: (name, column, is_descending) tuples
+    """
+
+    keys = []
+    for sort in sort_by or []:
+        field_name = sort.value.lstrip("-")
+        try:
+            field = getattr(model, field_name)
+        except AttributeError:
+            raise ValueError(f"Invalid sort field: {field_name}")
+        if any(name == field_name for name, _, _ in keys):
+            continue
+        keys.append((field_name, field, sort.value.startswith("-")))
+
+    if not any(name == "id" for name, _, _ in keys):
+        # Same direction as the last key so a composite index can be walked backwards
+        keys.append(("id", model.id, keys[-1][2] if keys else False))
+    return keys
+
+
+def encode_cursor(sort_keys: list[tuple[str, Any, bool]], row: Any) -> str:
+    """Encode the sort key values of the last row of a page into an opaque cursor"""
+
+    values = []
+    for name, _, _ in sort_keys:
+        value = getattr(row, f"{CURSOR_LABEL_PREFIX}{name}")
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, Enum):
+            value = value.value
+        values.append(value)
+
+    payload = {"k": [_signature(key) for key in sort_keys], "v": values}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_keys: list[tuple[str, Any, bool]]) -> list:
+    """Decode a cursor produced by encode_cursor for the same sort keys"""
+
+    invalid_cursor = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+    )
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        signature, values = payload["k"], payload["v"]
+    except Exception:
+        raise invalid_cursor
+
+    if signature != [_signature(key) for key in sort_keys] or len(values) != len(
+        sort_keys
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor does not match the requested sort order",
+        )
+
+    decoded = []
+    for (_, field, _), value in zip(sort_keys, values):
+        if value is not None and isinstance(getattr(field, "type", None), DateTime):
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise invalid_cursor
+        decoded.append(value)
+    return decoded
+
+
+def paginate(
+    query: Select,
+    sort_keys: list[tuple[str, Any, bool]],
+    page: int,
+    per_page: int,
+    cursor: str | None = None,
+):
+    """Order and page a query
+
+    Adds the sort key columns to the selected row (labelled with the cursor
+    prefix) so the next cursor can be built from the last row of the page.
+    With a cursor the page is located with a keyset predicate instead of an
+    OFFSET, so deep pages cost the same as the first one.
+
+    Args:
+        query (Select): Select to paginate
+        sort_keys (list): Keys returned by get_sort_keys
+        page (int): Page number, only used without a cursor
+        per_page (int): Page size
+        cursor (str | None): Cursor returned for the previous page
+
+    Returns:
+        Select: The ordered and limited select
+    """
+
+    query = query.add_columns(
+        *(
+            field.label(f"{CURSOR_LABEL_PREFIX}{name}")
+            for name, field, _ in sort_keys
+        )
+    )
+    query = query.order_by(
+        *(desc(field) if is_desc else asc(field) for _, field, is_desc in sort_keys)
+    )
+
+    if cursor:
+        values = decode_cursor(cursor, sort_keys)
+        query = query.filter(_keyset_predicate(sort_keys, values))
+    else:
+        query = query.offset((page - 1) * per_page)
+
+    return query.limit(per_page)
+
+
+def get_next_cursor(
+    rows: list, sort_keys: list[tuple[str, Any, bool]], per_page: int
+) -> str | None:
+    """Return the cursor of the page after rows, None when rows is the last page"""
+
+    if len(rows) < per_page:
+        return None
+    return encode_cursor(sort_keys, rows[-1])
+
+
+def _signature(sort_key: tuple[str, Any, bool]) -> str:
+    name, _, is_desc = sort_key
+    return f"-{name}" if is_desc else name
+
+
+def _keyset_predicate(sort_keys: list[tuple[str, Any, bool]], values: list):
+    """(k1 > v1) OR (k1 = v1 AND k2 > v2) OR ... with per key direction
+
+    NULLs sort first in ascending order on MySQL and SQLite, which is what the
+    comparisons below assume.
+    """
+
+    clauses = []
+    for index, (_, field, is_desc) in enumerate(sort_keys):
+        equals = [
+            _equal(prev_field, prev_value)
+            for (_, prev_field, _), prev_value in zip(
+                sort_keys[:index], values[:index]
+            )
+        ]
+        clauses.append(and_(*equals, _after(field, values[index], is_desc)))
+    return or_(*clauses)
+
+
+def _equal(field, value):
+    return field.is_(None) if value is None else field == value
+
+
+def _after(field, value, is_desc: bool):
+    if value is None:
+        # Ascending: everything non-null comes after NULL, descending: nothing does
+        return false() if is_desc else field.is_not(None)
+    if is_desc:
+        return or_(field < value, field.is_(None))
+    return field > value
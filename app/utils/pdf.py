@@ -0,0 +1,235 @@
+import os
+import uuid
+
+from app.config.setting import get_settings
+
+settings = get_settings()
+
+# Largest box an image takes in collection_pdf.html: an A4 page without
+# the default page margins and the body margins, in inches
+PRINT_BOX_INCHES = (6.0, 9.0)
+PRINT_IMAGE_SIZE = tuple(
+    round(inches * settings.PDF_IMAGE_DPI) for inches in PRINT_BOX_INCHES
+)
+PRINT_IMAGE_VERSION = (
+    f"{PRINT_IMAGE_SIZE[0]}x{PRINT_IMAGE_SIZE[1]}-q{settings.PDF_IMAGE_QUALITY}"
+)
+
+
+def render_pdf(html_content: str, output_path: str) -> str:
+    """Lay out an HTML document into a PDF file
+
+    Runs inside the export process pool, so everything it needs comes in
+    through plain, picklable arguments and no database access happens here.
+
+    Args:
+        html_content (str): Rendered template
+        output_path (str): Where the PDF is written, atomically
+
+    Returns:
+        str: output_path
+    """
+
+    # Imported here so only the worker processes pay for WeasyPrint
+    from weasyprint import HTML
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    temp_path = f"{output_path}.{uuid.uuid4().hex}.part"
+    try:
+        HTML(string=html_content).write_pdf(temp_path)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return output_path
+
+
+def merge_pdfs(paths: list[str], output_path: str) -> str:
+    """Concatenate the pages of PDF files into one file
+
+    Pages are streamed to the output one input file at a time: the objects
+    of a file are renumbered, written and dropped before the next file is
+    opened. Peak memory is bounded by the largest input file, plus a file
+    offset per written object and a reference per page. It does not
+    depend on the number of files merged.
+
+    Args:
+        paths (list[str]): PDFs to merge, in order
+        output_path (str): Where the merged PDF is written, atomically
+
+    Returns:
+        str: output_path
+    """
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    temp_path = f"{output_path}.{uuid.uuid4().hex}.part"
+    try:
+        with open(temp_path, "wb") as file:
+            writer = _StreamingPdfWriter(file)
+            for path in paths:
+                writer.append(path)
+            writer.close()
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return output_path
+
+
+class _StreamingPdfWriter:
+    """Writes the pages of PDF files to a stream as soon as they are read
+
+    Object 1 is the catalog and object 2 the page tree, both written last.
+    Everything a page references is copied with new object numbers, once
+    per input file, so resources shared by the pages of a file stay shared.
+    Document level data of the inputs (outlines, named destinations) is
+    not carried over.
+    """
+
+    CATALOG_ID, PAGES_ID = 1, 2
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.offsets: dict[int, int] = {}
+        self.page_ids: list[int] = []
+        self.next_id = 3
+        stream.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def append(self, path: str):
+        from pypdf import PdfReader
+        from pypdf.generic import (
+            ArrayObject,
+            DictionaryObject,
+            IndirectObject,
+            NameObject,
+        )
+
+        reader = PdfReader(path)
+        new_ids: dict[tuple[int, int], int] = {}
+        pending: list[tuple[IndirectObject, int]] = []
+
+        def renumber(obj):
+            if isinstance(obj, IndirectObject):
+                key = (obj.idnum, obj.generation)
+                if key not in new_ids:
+                    new_ids[key] = self._reserve_id()
+                    pending.append((obj, new_ids[key]))
+                return IndirectObject(new_ids[key], 0, None)
+            if isinstance(obj, DictionaryObject):
+                for name, value in list(obj.items()):
+                    obj[name] = renumber(value)
+            elif isinstance(obj, ArrayObject):
+                for position, value in enumerate(obj):
+                    obj[position] = renumber(value)
+            return obj
+
+        # reader.pages has the inherited attributes (MediaBox, Resources...)
+        # copied onto each page, so those copies are written in place of the
+        # raw page dicts and the input page tree is never needed
+        pages = {}
+        for page in reader.pages:
+            # Dropped before renumbering so the old page tree is not copied
+            del page[NameObject("/Parent")]
+            reference = page.indirect_reference
+            pages[(reference.idnum, reference.generation)] = page
+
+        for page in reader.pages:
+            self.page_ids.append(renumber(page.indirect_reference).idnum)
+            while pending:
+                reference, object_id = pending.pop()
+                obj = pages.get((reference.idnum, reference.generation))
+                if obj is None:
+                    obj = renumber(reference.get_object())
+                else:
+                    obj = renumber(obj)
+                    obj[NameObject("/Parent")] = IndirectObject(self.PAGES_ID, 0, None)
+                self._write_object(object_id, obj)
+
+    def close(self):
+        from pypdf.generic import (
+            ArrayObject,
+            DictionaryObject,
+            IndirectObject,
+            NameObject,
+            NumberObject,
+        )
+
+        pages = DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Pages"),
+                NameObject("/Kids"): ArrayObject(
+                    IndirectObject(page_id, 0, None) for page_id in self.page_ids
+                ),
+                NameObject("/Count"): NumberObject(len(self.page_ids)),
+            }
+        )
+        self._write_object(self.PAGES_ID, pages)
+        catalog = DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Catalog"),
+                NameObject("/Pages"): IndirectObject(self.PAGES_ID, 0, None),
+            }
+        )
+        self._write_object(self.CATALOG_ID, catalog)
+
+        xref_offset = self.stream.tell()
+        self.stream.write(f"xref\n0 {self.next_id}\n0000000000 65535 f \n".encode())
+        for object_id in range(1, self.next_id):
+            self.stream.write(f"{self.offsets[object_id]:010d} 00000 n \n".encode())
+        self.stream.write(
+            f"trailer\n<< /Size {self.next_id} /Root {self.CATALOG_ID} 0 R >>\n"
+            f"startxref\n{xref_offset}\n%%EOF\n".encode()
+        )
+
+    def _reserve_id(self) -> int:
+        object_id = self.next_id
+        self.next_id += 1
+        return object_id
+
+    def _write_object(self, object_id: int, obj):
+        self.offsets[object_id] = self.stream.tell()
+        self.stream.write(f"{object_id} 0 obj\n".encode())
+        obj.write_to_stream(self.stream)
+        self.stream.write(b"\nendobj\n")
+
+
+def scale_image(
+    source_path: str, size: tuple[int, int], output_path: str
+) -> str | None:
+    """Downscale an image to fit size and save it as a JPEG
+
+    WeasyPrint embeds JPEG data as is, so a JPEG already sized for print
+    keeps both the render and the PDF small. Images are never upscaled.
+
+    Returns:
+        str | None: output_path, None when the source is not a readable image
+    """
+
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(source_path) as source:
+            # Lets JPEG decoding skip detail, square as EXIF may rotate it
+            source.draft("RGB", (max(size), max(size)))
+            image = ImageOps.exif_transpose(source)
+            image.thumbnail(size)
+    except (OSError, UnidentifiedImageError):
+        return None
+
+    if image.mode != "RGB":
+        background = Image.new("RGB", image.size, "white")
+        image = image.convert("RGBA")
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    temp_path = f"{output_path}.{uuid.uuid4().hex}.part"
+    try:
+        image.save(
+            temp_path, format="JPEG", quality=settings.PDF_IMAGE_QUALITY, optimize=True
+        )
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return output_path
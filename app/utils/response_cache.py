@@ -0,0 +1,161 @@
+import hashlib
+import json
+import uuid
+from enum import Enum
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config.cache import get_cache
+from app.config.security import Principal
+from app.config.setting import get_settings
+
+settings = get_settings()
+
+
+class ResponseCache:
+    """Cached bodies of the catalogue read endpoints
+
+    An entry is keyed by the request_signature of the request and the
+    current generation of every table the response reads. Writing to one
+    of those tables moves its generation on, so every response built from
+    it stops matching at once and ages out of the LRU.
+
+    Generations live in the same kind of backend as the entries, so with
+    CACHE_BACKEND "sqlite" a write done by one worker is seen by the others.
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None):
+        self.entries = get_cache("response", maxsize, ttl)
+        self.generations = get_cache("response_generation", 1024)
+
+    def key(self, signature: str, models: tuple) -> str:
+        """Cache key of a request reading the tables of models
+
+        Args:
+            signature (str): request_signature of the request
+            models (tuple): Models whose tables the response reads
+        """
+
+        generations = sorted(
+            (model.__tablename__, self._generation(model.__tablename__))
+            for model in models
+        )
+        payload = json.dumps([signature, generations])
+        return f"response:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+    def get(self, key: str) -> dict | None:
+        """The cached entry: body, next_cursor, etag and last_modified"""
+
+        return self.entries.get(key)
+
+    def set(
+        self,
+        key: str,
+        body: Any,
+        next_cursor: str | None = None,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ):
+        if isinstance(body, list):
+            body = [row._asdict() if hasattr(row, "_asdict") else row for row in body]
+        elif hasattr(body, "_asdict"):
+            body = body._asdict()
+        self.entries.set(
+            key,
+            {
+                "body": jsonable_encoder(body),
+                "next_cursor": next_cursor,
+                "etag": etag,
+                "last_modified": last_modified,
+            },
+        )
+
+    def invalidate(self, *tables: str):
+        for table in tables:
+            self.generations.set(table, uuid.uuid4().hex)
+
+    def _generation(self, table: str) -> str:
+        generation = self.generations.get(table)
+        if generation is None:
+            # Unknown or evicted, a fresh generation can't match an old entry
+            generation = uuid.uuid4().hex
+            self.generations.set(table, generation)
+        return generation
+
+
+def request_signature(endpoint: str, current_user: Principal, **params) -> str:
+    """Digest of an endpoint, its normalized parameters and the caller's visibility
+
+    Admins also see inactive records, so they get responses of their own.
+    """
+
+    for name, value in params.items():
+        if hasattr(value, "model_dump"):
+            params[name] = value.model_dump(mode="json")
+    filters = params.get("filters")
+    if isinstance(filters, dict) and filters.get("search_by"):
+        # Search is case insensitive on every backend
+        filters["search_by"] = " ".join(filters["search_by"].lower().split())
+    payload = json.dumps(
+        {
+            "endpoint": endpoint,
+            "params": _normalize(params),
+            "visibility": "admin" if current_user.is_admin else "public",
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _normalize(value: Any) -> Any:
+    """Drop unset parameters and replace enums by their values"""
+
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items() if v not in (None, "")}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+response_cache = ResponseCache(
+    settings.RESPONSE_CACHE_SIZE, settings.RESPONSE_CACHE_TTL
+)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_tables(session, flush_context):
+    tables = session.info.setdefault("response_cache_tables", set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(type(instance), "__tablename__", None)
+        if table:
+            tables.add(table)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_executed_tables(orm_execute_state):
+    # Bulk INSERT and UPDATE statements bypass the flush
+    if orm_execute_state.is_select or orm_execute_state.bind_mapper is None:
+        return
+    table = getattr(orm_execute_state.bind_mapper.class_, "__tablename__", None)
+    if table:
+        orm_execute_state.session.info.setdefault("response_cache_tables", set()).add(
+            table
+        )
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_tables(session):
+    tables = session.info.pop("response_cache_tables", None)
+    if tables:
+        response_cache.invalidate(*tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_tables(session):
+    session.info.pop("response_cache_tables", None)
@@ -0,0 +1,276 @@
+import asyncio
+import re
+import threading
+from collections import Counter
+from typing import Any
+
+from sqlalchemy import Select, bindparam, case, event, false, literal
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import Session
+
+from app.config.database import SessionLocal, async_engine
+from app.config.logger_config import logger
+from app.config.setting import get_settings
+
+settings = get_settings()
+
+# Shortest term the MySQL ngram parser (ngram_token_size=2) can match
+NGRAM_TOKEN_SIZE = 2
+
+_WORD_RE = re.compile(r"\w+")
+_BOOLEAN_OPERATORS_RE = re.compile(r'[+\-<>()~*"@]')
+
+
+def get_trigrams(text: str) -> set[str]:
+    """Split a text into lower cased, space padded word trigrams (pg_trgm style)"""
+
+    trigrams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f"  {word} "
+        trigrams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+class TrigramIndex:
+    """In-process trigram index used when the database has no FULLTEXT support
+
+    Documents are the concatenated search columns of a model row. A document
+    scores the share of the query trigrams it contains, so a partially typed
+    word already matches the rows that start with it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: dict[str, set[int]] = {}
+        self._documents: dict[int, set[str]] = {}
+
+    def add(self, doc_id: int, text: str):
+        with self._lock:
+            self._remove(doc_id)
+            trigrams = get_trigrams(text)
+            self._documents[doc_id] = trigrams
+            for trigram in trigrams:
+                self._postings.setdefault(trigram, set()).add(doc_id)
+
+    def remove(self, doc_id: int):
+        with self._lock:
+            self._remove(doc_id)
+
+    def search(
+        self, term: str, min_similarity: float, limit: int | None = None
+    ) -> list[tuple[int, float]]:
+        """Return up to limit (doc_id, score) pairs, best match first"""
+
+        query_trigrams = get_trigrams(term)
+        if not query_trigrams:
+            return []
+
+        with self._lock:
+            hits = Counter()
+            for trigram in query_trigrams:
+                hits.update(self._postings.get(trigram, ()))
+
+        scored = [
+            (doc_id, round(count / len(query_trigrams), 4))
+            for doc_id, count in hits.items()
+            if count / len(query_trigrams) >= min_similarity
+        ]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:limit]
+
+    def _remove(self, doc_id: int):
+        for trigram in self._documents.pop(doc_id, ()):
+            postings = self._postings.get(trigram)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self._postings[trigram]
+
+
+_indexes: dict[Any, TrigramIndex] = {}
+_indexes_lock = threading.Lock()  # held for a whole load
+# Changes committed while an index loads, replayed onto it once it is read
+_pending_changes: dict[Any, list[tuple[int, str | None]]] = {}
+_pending_lock = threading.Lock()
+_reset_while_loading: set = set()  # loads to drop, a bulk write outdated them
+
+
+def get_search_text(instance: Any) -> str:
+    """Concatenate the __search_columns__ values of a model instance"""
+
+    columns = type(instance).__search_columns__
+    return " ".join(str(getattr(instance, column) or "") for column in columns)
+
+
+async def get_trigram_index(model: Any) -> TrigramIndex:
+    """Return the trigram index of a model, loading it from the database once
+
+    The load reads the whole table through the sync engine, so it runs on a
+    worker thread and the event loop keeps serving other requests.
+    """
+
+    index = _indexes.get(model)
+    if index is not None:
+        return index
+    return await asyncio.to_thread(_load_trigram_index, model)
+
+
+async def build_search_indexes(*models):
+    """Load the trigram indexes at startup, unless MySQL FULLTEXT is used"""
+
+    if async_engine.dialect.name != "mysql":
+        for model in models:
+            await get_trigram_index(model)
+
+
+def _load_trigram_index(model: Any) -> TrigramIndex:
+    with _indexes_lock:
+        index = _indexes.get(model)
+        if index is None:
+            index = TrigramIndex()
+            with _pending_lock:
+                _pending_changes[model] = []
+            columns = [getattr(model, column) for column in model.__search_columns__]
+            try:
+                with SessionLocal() as session:
+                    rows = session.query(model.id, *columns).filter(
+                        model.is_delete == False
+                    )
+                    for doc_id, *values in rows.yield_per(1000):
+                        index.add(
+                            doc_id, " ".join(str(value or "") for value in values)
+                        )
+            except Exception:
+                with _pending_lock:
+                    _pending_changes.pop(model, None)
+                    _reset_while_loading.discard(model)
+                raise
+            logger.info(
+                f"Trigram index built for {model.__tablename__}: "
+                f"{len(index._documents)} documents"
+            )
+            with _pending_lock:
+                for doc_id, text in _pending_changes.pop(model):
+                    _apply_change(index, doc_id, text)
+                if model in _reset_while_loading:
+                    # Serves the search that loaded it, the next one reloads
+                    _reset_while_loading.discard(model)
+                else:
+                    _indexes[model] = index
+    return index
+
+
+async def apply_search(query: Select, model: Any, term: str):
+    """Filter a query by a search term and return it with a relevance expression
+
+    MySQL uses the ngram FULLTEXT index on the model's __search_columns__,
+    other databases (SQLite in local and test setups) use an in-process
+    trigram index. Terms too short for either index fall back to a prefix
+    LIKE on the first search column, which can still use its B-tree index.
+
+    Args:
+        query (Select): Select from model
+        model (Any): Model with a __search_columns__ attribute
+        term (str): Search term typed by the user
+
+    Returns:
+        tuple[Select, ColumnElement]: Filtered select and its relevance score
+    """
+
+    columns = [getattr(model, column) for column in model.__search_columns__]
+    words = _BOOLEAN_OPERATORS_RE.sub(" ", term).split()
+
+    if async_engine.dialect.name == "mysql":
+        words = [word for word in words if len(word) >= NGRAM_TOKEN_SIZE]
+        if words:
+            # Every word has to appear, as an ngram phrase, in one of the columns
+            against = " ".join(f'+"{word}"' for word in words)
+            relevance = match(*columns, against=against).in_boolean_mode()
+            return query.filter(relevance > 0), relevance
+    elif len("".join(words)) >= 3:
+        index = await get_trigram_index(model)
+        scored = index.search(" ".join(words), settings.SEARCH_MIN_SIMILARITY)
+        if not scored:
+            return query.filter(false()), literal(0.0)
+        # Every match is kept, so filters, pagination and batch updates see
+        # them all, only the best SEARCH_MAX_CANDIDATES are ranked. Ids are
+        # rendered inline, a bound parameter each would hit SQLite's limit
+        doc_ids = bindparam(
+            "search_doc_ids",
+            [doc_id for doc_id, _ in scored],
+            expanding=True,
+            literal_execute=True,
+        )
+        relevance = case(
+            dict(scored[: settings.SEARCH_MAX_CANDIDATES]), value=model.id, else_=0.0
+        )
+        return query.filter(model.id.in_(doc_ids)), relevance
+
+    prefix_match = columns[0].startswith(term.strip(), autoescape=True)
+    return query.filter(prefix_match), literal(0.0)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_search_changes(session, flush_context):
+    """Remember the search text of flushed rows until the transaction commits
+
+    Attributes are expired on commit, so the text is captured here while it
+    is still loaded.
+    """
+
+    pending = session.info.setdefault("search_index_changes", {})
+    for instance in (*session.new, *session.dirty):
+        if hasattr(type(instance), "__search_columns__"):
+            key = (type(instance), instance.id)
+            pending[key] = None if instance.is_delete else get_search_text(instance)
+    for instance in session.deleted:
+        if hasattr(type(instance), "__search_columns__"):
+            pending[(type(instance), instance.id)] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_search_changes(session):
+    changes = session.info.pop("search_index_changes", {})
+    if not changes:
+        return
+    with _pending_lock:
+        for (model, doc_id), text in changes.items():
+            index = _indexes.get(model)
+            if index is not None:
+                _apply_change(index, doc_id, text)
+            elif model in _pending_changes:
+                # Being loaded, the load may have read the row before this commit
+                _pending_changes[model].append((doc_id, text))
+            # Otherwise not loaded yet, it will be read fresh from the database
+
+
+def _apply_change(index: TrigramIndex, doc_id: int, text: str | None):
+    if text is None:
+        index.remove(doc_id)
+    else:
+        index.add(doc_id, text)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_search_changes(session):
+    session.info.pop("search_index_changes", None)
+
+
+def reset_search_index(model: Any):
+    """Drop the trigram index of a model, e.g. after a bulk UPDATE bypassed the ORM"""
+
+    with _pending_lock:
+        _indexes.pop(model, None)
+        if model in _pending_changes:
+            _reset_while_loading.add(model)
+
+
+def discard_from_search_index(session, model: Any, doc_ids):
+    """Drop rows from the trigram index once the session commits
+
+    For soft deletes done with a bulk UPDATE, which bypasses the flush hooks.
+    """
+
+    pending = session.info.setdefault("search_index_changes", {})
+    for doc_id in doc_ids:
+        pending[(model, doc_id)] = None
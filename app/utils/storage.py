@@ -0,0 +1,252 @@
+import hashlib
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile, status
+from sqlalchemy import event, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from werkzeug.utils import secure_filename
+
+from app.config.database import SessionLocal
+from app.config.logger_config import logger
+from app.config.metrics import metrics
+from app.config.setting import get_settings
+
+settings = get_settings()
+
+# Content addressed files live in UPLOAD_FOLDER/objects/<first 2 hex>/<sha256>
+OBJECTS_FOLDER = "objects"
+
+upload_bytes_total = metrics.counter(
+    "upload_bytes_total", "Bytes of uploads written to disk"
+)
+uploads_total = metrics.counter("uploads_total", "Uploads written to disk")
+
+# Unlinks blob files after commit, it queries through the sync engine
+blob_cleanup = ThreadPoolExecutor(max_workers=1, thread_name_prefix="blob-cleanup")
+
+
+def get_object_path(checksum: str, extension: str = "") -> str:
+    return os.path.join(
+        settings.UPLOAD_FOLDER, OBJECTS_FOLDER, checksum[:2], f"{checksum}{extension}"
+    )
+
+
+async def write_upload(upload_file: UploadFile, file_path: str) -> tuple[str, int]:
+    """Stream an upload to disk in chunks, hashing it on the way
+
+    Args:
+        upload_file (UploadFile): File to be written
+        file_path (str): Where to write it, a private temporary path
+
+    Raises:
+        HTTPException: 413 once the upload exceeds UPLOAD_MAX_BYTES
+
+    Returns:
+        tuple[str, int]: SHA-256 hex digest and size in bytes
+    """
+
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File is larger than {settings.UPLOAD_MAX_BYTES} bytes",
+    )
+    if upload_file.size is not None and upload_file.size > settings.UPLOAD_MAX_BYTES:
+        raise too_large
+
+    digest = hashlib.sha256()
+    file_size = 0
+    async with aiofiles.open(file_path, "wb") as buffer:
+        while chunk := await upload_file.read(settings.UPLOAD_CHUNK_SIZE):
+            file_size += len(chunk)
+            if file_size > settings.UPLOAD_MAX_BYTES:
+                raise too_large
+            digest.update(chunk)
+            await buffer.write(chunk)
+
+    upload_bytes_total.inc(file_size)
+    uploads_total.inc()
+    return digest.hexdigest(), file_size
+
+
+async def store_blob(upload_file: UploadFile, session: AsyncSession):
+    """Store the content of an upload once and take a reference on it
+
+    The upload is streamed to a temporary file while it is hashed. When a
+    blob with the same checksum exists, its reference count is incremented
+    and the temporary file is dropped. Otherwise the file is moved into the
+    object store and a new blob is created. A file moved in here is removed
+    again if the transaction rolls back and nothing else references it.
+
+    Args:
+        upload_file (UploadFile): File to be stored
+        session (AsyncSession): Session of the request, not committed here
+
+    Returns:
+        DocumentBlob: The blob holding the content
+    """
+
+    from app.apis.utils.models import DocumentBlob
+
+    temp_folder = os.path.join(settings.UPLOAD_FOLDER, OBJECTS_FOLDER, "tmp")
+    await aiofiles.os.makedirs(temp_folder, exist_ok=True)
+    temp_path = os.path.join(temp_folder, f"{uuid.uuid4().hex}.part")
+
+    try:
+        checksum, file_size = await write_upload(upload_file, temp_path)
+
+        blob = await _reference_blob(checksum, session)
+        if blob is None:
+            extension = os.path.splitext(secure_filename(upload_file.filename or ""))[1]
+            blob = DocumentBlob(
+                checksum=checksum,
+                storage_path=get_object_path(checksum, extension.lower()),
+                file_size=file_size,
+                ref_count=1,
+            )
+            try:
+                async with session.begin_nested():
+                    session.add(blob)
+            except IntegrityError:
+                # A concurrent upload of the same content created it first
+                blob = await _reference_blob(checksum, session)
+        else:
+            logger.info(f"Upload deduplicated against blob {blob.id}")
+
+        # Also restores the file of a blob whose last reference was released
+        if not await aiofiles.os.path.exists(blob.storage_path):
+            await aiofiles.os.makedirs(
+                os.path.dirname(blob.storage_path), exist_ok=True
+            )
+            await aiofiles.os.replace(temp_path, blob.storage_path)
+            session.info.setdefault("stored_blob_files", set()).add(
+                (blob.checksum, blob.storage_path)
+            )
+
+        return blob
+
+    finally:
+        if await aiofiles.os.path.exists(temp_path):
+            await aiofiles.os.remove(temp_path)
+
+
+async def _reference_blob(checksum: str, session: AsyncSession):
+    from app.apis.utils.models import DocumentBlob
+
+    # Incrementing in SQL locks the row, so concurrent references add up
+    result = await session.execute(
+        update(DocumentBlob)
+        .where(DocumentBlob.checksum == checksum)
+        .values(ref_count=DocumentBlob.ref_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if not result.rowcount:
+        return None
+    return await session.scalar(
+        select(DocumentBlob)
+        .filter(DocumentBlob.checksum == checksum)
+        .execution_options(populate_existing=True)
+    )
+
+
+async def release_document(document_id: int | None, session: AsyncSession):
+    """Soft delete a replaced document with its renditions and release its blob
+
+    The blob file is removed after the transaction commits if no document
+    references it anymore by then. Documents saved before the object store have no
+    blob and only get soft deleted.
+
+    Args:
+        document_id (int | None): DocumentMaster id, nothing happens when None
+        session (AsyncSession): Session of the request, not committed here
+    """
+
+    from app.apis.utils.models import DocumentBlob, DocumentMaster
+
+    if not document_id:
+        return
+
+    document = await session.get(DocumentMaster, document_id)
+    if document is None or document.is_delete:
+        return
+    document.is_delete = True
+
+    renditions = await session.scalars(
+        select(DocumentMaster.id).filter(
+            DocumentMaster.parent_id == document.id, DocumentMaster.is_delete == False
+        )
+    )
+    for rendition_id in renditions.all():
+        await release_document(rendition_id, session)
+
+    if document.blob_id is None:
+        return
+
+    await session.execute(
+        update(DocumentBlob)
+        .where(DocumentBlob.id == document.blob_id)
+        .values(ref_count=DocumentBlob.ref_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+    blob = await session.scalar(
+        select(DocumentBlob)
+        .filter(DocumentBlob.id == document.blob_id)
+        .execution_options(populate_existing=True)
+    )
+    if blob.ref_count <= 0:
+        session.info.setdefault("orphaned_blob_files", set()).add(
+            (blob.checksum, blob.storage_path)
+        )
+
+
+def remove_unreferenced_blob_files(blob_files: set[tuple[str, str]]):
+    """Unlink blob files whose blob is gone or has no reference left
+
+    The reference count is read again with the blob row locked, and the
+    file is unlinked while the lock is held: an upload of the same content
+    either took its reference first and the file stays, or waits for the
+    lock and finds the file missing, so it writes it again.
+
+    Args:
+        blob_files (set[tuple[str, str]]): (checksum, storage_path) pairs
+    """
+
+    from app.apis.utils.models import DocumentBlob
+
+    for checksum, path in blob_files:
+        try:
+            with SessionLocal() as session, session.begin():
+                ref_count = session.scalar(
+                    select(DocumentBlob.ref_count)
+                    .filter(DocumentBlob.checksum == checksum)
+                    .with_for_update()
+                )
+                if ref_count is not None and ref_count > 0:
+                    continue
+                os.remove(path)
+                logger.info(f"Removed unreferenced blob file: {path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Could not remove blob file {path}: {e}")
+
+
+@event.listens_for(Session, "after_commit")
+def _remove_orphaned_blobs(session):
+    session.info.pop("stored_blob_files", None)
+    blob_files = session.info.pop("orphaned_blob_files", None)
+    if blob_files:
+        blob_cleanup.submit(remove_unreferenced_blob_files, blob_files)
+
+
+@event.listens_for(Session, "after_rollback")
+def _remove_rolled_back_blobs(session):
+    session.info.pop("orphaned_blob_files", None)
+    blob_files = session.info.pop("stored_blob_files", None)
+    if blob_files:
+        # Moved in by the rolled back transaction, unless another references it
+        blob_cleanup.submit(remove_unreferenced_blob_files, blob_files)
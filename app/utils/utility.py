@@ -1,17 +1,23 @@
 import os
-import shutil
+import threading
 from datetime import datetime
 from typing import Any
 
 import pytz
 from fastapi import Depends, HTTPException, UploadFile
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from werkzeug.utils import secure_filename
 
-from app.config.database import get_session
+from app.config.cache import get_cache
 from app.config.logger_config import logger
-from app.config.security import get_current_user, verify_password
+from app.config.metrics import metrics
+from app.config.permissions import RoleMatrix
+from app.config.security import Principal, get_current_principal, password_hasher
 from app.config.setting import get_settings
+from app.utils.derivatives import schedule_derivatives
+from app.utils.storage import store_blob
 
 setting = get_settings()
 
@@ -33,14 +39,16 @@ def convert_to_indian_timezone(dt: datetime) -> datetime:
     return dt.astimezone(INDIAN_TZ)
 
 
-def save_file(
-    upload_file: UploadFile, folder_name: str, entity_type: str, session: Session
+async def save_file(
+    upload_file: UploadFile, entity_type: str, session: AsyncSession
 ) -> int:
     """Save File to Server
 
+    The content goes to the content addressed object store, so identical
+    bytes are written once and a re-upload only adds a DocumentMaster row.
+
     Args:
         upload_file (UploadFile): File to be uploaded
-        folder_name (str): Folder name or Module name
         entity_type (str): It's Entity Type ex.images/jpg,
 
     Returns:
@@ -51,37 +59,28 @@ def save_file(
         from app.apis.utils.models import DocumentMaster
 
         logger.info(
-            f"Attempting to save file: {upload_file.filename}, folder: {folder_name}, entity_type: {entity_type}"
+            f"Attempting to save file: {upload_file.filename}, entity_type: {entity_type}"
         )
 
-        # Ensure the folder exists
-        module_directory = os.path.join(setting.UPLOAD_FOLDER, folder_name)
-        if not os.path.exists(module_directory):
-            os.makedirs(module_directory, exist_ok=True)
-        logger.info(f"Directory created or exists: {module_directory}")
-
-        # Prepare file paths
         filename = secure_filename(upload_file.filename)
-        file_path = os.path.join(module_directory, filename)
-        absolute_file_path = os.path.abspath(file_path)
-        logger.info(f"Saving file to: {file_path}")
-
-        # Save the file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(upload_file.file, buffer)
-        logger.info(f"File saved successfully: {filename}")
+        blob = await store_blob(upload_file, session)
+        logger.info(f"File stored: {filename} -> {blob.storage_path}")
 
         # Create a document
         document = DocumentMaster(
             document_name=filename,
-            file_path=file_path,
+            file_path=blob.storage_path,
             entity_type=entity_type,
-            actual_path=absolute_file_path,
+            actual_path=os.path.abspath(blob.storage_path),
+            checksum=blob.checksum,
+            file_size=blob.file_size,
+            blob_id=blob.id,
         )
 
         session.add(document)
-        session.flush([document])
+        await session.flush([document])
         logger.info(f"Document saved to database with ID: {document.id}")
+        schedule_derivatives(session, document.id)
 
         return document.id
 
@@ -90,49 +89,141 @@ def save_file(
         raise e
 
 
-def authenticate_user(session: Session, email: str, password: str):
+async def authenticate_user(session: AsyncSession, email: str, password: str):
     from app.apis.user.models import User
 
-    user = (
-        session.query(User)
-        .filter(User.email == email, User.is_active == True, User.is_delete == False)
-        .first()
+    user = await session.scalar(
+        select(User).filter(
+            User.email == email, User.is_active == True, User.is_delete == False
+        )
     )
     if not user:
         return False
-    if not verify_password(password, user._password):
+    if not await password_hasher.verify(password, user._password):
         return False
     return user
 
 
 def has_role(required_roles: list[str]):
-    from app.apis.user.models import Role, User
-
-    def role_checker(
-        db: Session = Depends(get_session),
-        current_user: User = Depends(get_current_user),
-    ):
-        required_roles_from_db = (
-            db.query(Role.name).filter(Role.name.in_(required_roles)).all()
-        )
-        required_role_names = {role.name for role in required_roles_from_db}
-        for role in current_user.roles:
-            if role.name in required_role_names:
-                return current_user
+    """Dependency allowing principals holding any of required_roles
+
+    Answered from the cached principal and the in-memory role registry,
+    without touching the database.
+    """
+
+    matrix = RoleMatrix(required_roles)
+
+    async def role_checker(current_user: Principal = Depends(get_current_principal)):
+        if matrix.permits(current_user.roles):
+            return current_user
         raise HTTPException(status_code=403, detail="Access forbidden: Role not found")
 
     return role_checker
 
 
-def get_id_by_uuid(uuid, model, model_id_field, session):
+uuid_cache_hits_total = metrics.counter(
+    "uuid_cache_hits_total", "uuid lookups answered by the uuid -> id cache", ("table",)
+)
+uuid_cache_misses_total = metrics.counter(
+    "uuid_cache_misses_total", "uuid lookups that went to the database", ("table",)
+)
+
+
+class UuidIdCache:
+    """uuid -> id of live records, one bounded LRU cache per model
+
+    The id behind a uuid never changes, so an entry only goes stale when
+    its record is soft deleted, which drops it once the session commits.
+    Unknown uuids are not cached.
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._caches: dict[str, Any] = {}
+
+    def _cache(self, model: Any):
+        table = model.__tablename__
+        with self._lock:
+            cache = self._caches.get(table)
+            if cache is None:
+                cache = get_cache(f"uuid_id:{table}", self.maxsize, self.ttl)
+                self._caches[table] = cache
+            return cache
+
+    async def resolve(
+        self, model: Any, uuids, session: AsyncSession
+    ) -> dict[str, int | None]:
+        """Resolve many uuids at once, with one IN query for the cache misses
+
+        Returns:
+            dict[str, int | None]: id of each uuid, None when not found
+        """
+
+        cache = self._cache(model)
+        ids, missing = {}, set()
+        for uuid in uuids:
+            if not uuid or uuid in ids:
+                continue
+            ids[uuid] = cache.get(uuid)
+            if ids[uuid] is None:
+                missing.add(uuid)
+
+        uuid_cache_hits_total.inc(len(ids) - len(missing), table=model.__tablename__)
+        uuid_cache_misses_total.inc(len(missing), table=model.__tablename__)
+
+        if missing:
+            rows = await session.execute(
+                select(model.uuid, model.id).filter(
+                    model.uuid.in_(missing), model.is_delete == False
+                )
+            )
+            for uuid, id in rows:
+                ids[uuid] = id
+                cache.set(uuid, id)
+        return ids
+
+    def invalidate(self, model: Any, uuids):
+        cache = self._cache(model)
+        for uuid in uuids:
+            cache.delete(uuid)
+
+
+uuid_id_cache = UuidIdCache(setting.UUID_CACHE_SIZE, setting.UUID_CACHE_TTL)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_deleted_uuids(session, flush_context):
+    pending = session.info.setdefault("deleted_uuids", [])
+    for instance in session.dirty:
+        if getattr(instance, "is_delete", False) and hasattr(instance, "uuid"):
+            pending.append((type(instance), instance.uuid))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_deleted_uuids(session):
+    for model, uuid in session.info.pop("deleted_uuids", ()):
+        uuid_id_cache.invalidate(model, [uuid])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_deleted_uuids(session):
+    session.info.pop("deleted_uuids", None)
+
+
+async def get_id_by_uuid(uuid, model, model_id_field, session):
     """A utility function that retrieves the id of a record based on its uuid from a given model"""
     try:
-        # Query to fetch the id using the uuid
-        id = (
-            session.query(model_id_field)
-            .filter(model.uuid == uuid, model.is_delete == False)
-            .scalar()
-        )
+        if model_id_field is model.id:
+            id = (await uuid_id_cache.resolve(model, [uuid], session)).get(uuid)
+        else:
+            # Query to fetch the id using the uuid
+            id = await session.scalar(
+                select(model_id_field).filter(
+                    model.uuid == uuid, model.is_delete == False
+                )
+            )
 
         # If the ID is not found, return an error message
         if not id:
@@ -147,17 +238,17 @@ def get_id_by_uuid(uuid, model, model_id_field, session):
         return {"error": str(e)}, 500
 
 
-def set_id_if_exists_in_dict(
+async def set_id_if_exists_in_dict(
     uuid: str,
     model: Any,
     model_id_field: Any,
     data_dict: dict,
     data_dict_field: str,
-    session: Session,
+    session: AsyncSession,
 ):
     """Retrieve the ID from a UUID and update the provided dictionary with the result."""
 
-    id_result = get_id_by_uuid(uuid, model, model_id_field, session)
+    id_result = await get_id_by_uuid(uuid, model, model_id_field, session)
 
     # Check if id is int, if it's not then it is error and return False
     if isinstance(id_result, int):
@@ -0,0 +1,123 @@
+"""Latency of non-auth endpoints during a login storm
+
+Serves a small app with uvicorn: GET /ping stands in for a regular sync
+endpoint (it runs on the shared anyio threadpool like every `def` route), and
+two login endpoints that only check a bcrypt hash:
+
+- /login-sync: the old path, verify_password inside a sync route
+- /login-async: the new path, awaiting app.config.security.password_hasher
+
+For each mode a burst of concurrent logins is fired while /ping is polled at a
+steady rate, and the p50/p99 of /ping is reported.
+
+    python -m benchmarks.login_storm --logins 400 --concurrency 200
+"""
+
+import argparse
+import asyncio
+import socket
+import statistics
+import threading
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+from app.config.security import hash_password, password_hasher, verify_password
+
+PASSWORD = "benchmark-password"
+PASSWORD_HASH = hash_password(PASSWORD)
+
+bench_app = FastAPI()
+
+
+@bench_app.get("/ping")
+def ping():
+    return {"ok": True}
+
+
+@bench_app.post("/login-sync")
+def login_sync():
+    return {"ok": verify_password(PASSWORD, PASSWORD_HASH)}
+
+
+@bench_app.post("/login-async")
+async def login_async():
+    return {"ok": await password_hasher.verify(PASSWORD, PASSWORD_HASH)}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def storm(base_url: str, mode: str, logins: int, concurrency: int):
+    limits = httpx.Limits(max_connections=concurrency + 10)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+        done = asyncio.Event()
+
+        async def login():
+            async with semaphore:
+                await client.post(f"/login-{mode}")
+
+        async def poll_ping(latencies: list[float]):
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/ping")
+                latencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.01)
+
+        latencies: list[float] = []
+        poller = asyncio.create_task(poll_ping(latencies))
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await poller
+    return latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+
+    port = free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(bench_app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    base_url = f"http://127.0.0.1:{port}"
+    print(f"{args.logins} logins, {args.concurrency} concurrent")
+    print(f"{'mode':<8}{'pings':>7}{'p50 ms':>10}{'p99 ms':>10}{'logins/s':>10}")
+    for mode in ("sync", "async"):
+        latencies, elapsed = asyncio.run(
+            storm(base_url, mode, args.logins, args.concurrency)
+        )
+        print(
+            f"{mode:<8}{len(latencies):>7}"
+            f"{statistics.median(latencies):>10.1f}"
+            f"{percentile(latencies, 99):>10.1f}"
+            f"{args.logins / elapsed:>10.1f}"
+        )
+
+    server.should_exit = True
+    thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""add created_at indexes for keyset pagination
+
+Revision ID: 188445f689d4
+Revises: bcf135218ed2
+Create Date: 2026-10-18 10:12:31.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '188445f689d4'
+down_revision: Union[str, None] = 'bcf135218ed2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('document_master', 'roles', 'collections', 'users', 'hangers', 'sample')
+
+
+def upgrade() -> None:
+    # InnoDB appends the primary key to secondary indexes, so these also
+    # cover the (created_at, id) keyset used by cursor pagination
+    for table in TABLES:
+        op.create_index(op.f(f'ix_{table}_created_at'), table, ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    for table in reversed(TABLES):
+        op.drop_index(op.f(f'ix_{table}_created_at'), table_name=table)
@@ -0,0 +1,46 @@
+"""add fulltext search indexes
+
+Revision ID: 5c1e7a9d3f20
+Revises: 188445f689d4
+Create Date: 2026-10-18 11:40:05.118342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e7a9d3f20'
+down_revision: Union[str, None] = '188445f689d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Column order has to match the MATCH() column list in app.utils.search
+SEARCH_INDEXES = {
+    'hangers': ['name', 'code', 'mill_reference_number', 'composition', 'construction'],
+    'sample': ['name', 'mill_reference_number', 'composition', 'construction'],
+    'collections': ['name'],
+}
+
+
+def upgrade() -> None:
+    # Other databases search through the in-process trigram index instead
+    if op.get_bind().dialect.name != 'mysql':
+        return
+    for table, columns in SEARCH_INDEXES.items():
+        op.create_index(
+            f'ft_{table}_search',
+            table,
+            columns,
+            mysql_prefix='FULLTEXT',
+            mysql_with_parser='ngram',
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'mysql':
+        return
+    for table in SEARCH_INDEXES:
+        op.drop_index(f'ft_{table}_search', table_name=table)